@@ -0,0 +1,324 @@
+"""
+Offline AgentManager load test
+
+Drives process_message for --sessions simulated users, each sending
+--messages messages with a think time between receiving a reply and sending
+the next one. Sessions, WebSocket delivery and MCP servers are in-memory
+stand-ins and LLM agents call an in-process mock provider, so the run needs
+no network, database or Redis and measures AgentManager itself.
+
+Reports throughput, queue-wait and end-to-end latency percentiles (overall
+and per agent), and memory growth. The JSON results file is meant to be
+diffed between versions; --compare prints the change against an earlier one.
+
+Usage (from backend/):
+    python -m benchmarks.agent_load --sessions 200 --messages 20 --think-ms 200 \\
+        --mix general_assistant=0.6,data_analyst=0.2,browser_specialist=0.2 --output load.json
+    python -m benchmarks.agent_load --compare load.json --output load-new.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from core.agent_manager import AgentManager
+from core.autoscaler import AutoscalePolicy
+from core.latency import LatencyHistogram
+from core.llm_providers import ProviderConfig, ProviderRegistry
+from core.mcp_integration import MCPTool
+
+QUANTILES = (50, 90, 99, 99.9)
+
+
+class InMemorySessions:
+    """SessionManager stand-in keeping conversations in dicts"""
+
+    db = None
+    redis = None
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.conversations: Dict[str, List[Dict[str, Any]]] = {}
+
+    async def create_session(self, user_id: Optional[str] = None) -> str:
+        session_id = f"session-{len(self.conversations)}"
+        self.conversations[session_id] = []
+        return session_id
+
+    async def add_message(self, session_id: str, role: str, content: str, metadata: Optional[Dict] = None) -> int:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        history = self.conversations.setdefault(session_id, [])
+        history.append({"role": role, "content": content, "metadata": metadata or {}, "timestamp": time.time()})
+        return len(history)
+
+    async def get_conversation_history(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.conversations.get(session_id, [])[-limit:]
+
+
+class InMemorySockets:
+    """WebSocketManager stand-in that timestamps each delivered agent message"""
+
+    def __init__(self):
+        self.delivered: Dict[str, float] = {}
+        self.waiters: Dict[str, asyncio.Future] = {}
+        self.messages = 0
+
+    async def send_message(self, session_id: str, message: Dict[str, Any]):
+        self.messages += 1
+        request_id = message.get("request_id")
+        if request_id is None:
+            return
+        self.delivered[request_id] = time.perf_counter()
+        waiter = self.waiters.pop(request_id, None)
+        if waiter and not waiter.done():
+            waiter.set_result(message)
+
+    async def wait(self, request_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        future = self.waiters[request_id] = asyncio.get_event_loop().create_future()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.waiters.pop(request_id, None)
+            return None
+
+
+class InMemoryMCP:
+    """MCPServerManager stand-in exposing a few tools that answer after a fixed delay"""
+
+    def __init__(self, tools: int, latency: float):
+        self.latency = latency
+        self.tools_version = 1
+        self.tools = {
+            f"lookup_{index}": MCPTool(
+                name=f"lookup_{index}",
+                description="Look something up",
+                input_schema={"type": "object", "properties": {"query": {"type": "string"}}},
+                server_name="bench"
+            )
+            for index in range(tools)
+        }
+        self.calls = 0
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return {"content": [{"type": "text", "text": f"{tool_name}: {arguments.get('query')}"}]}
+
+
+def _mock_llm(rng: random.Random, median: float, sigma: float) -> httpx.MockTransport:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(rng.lognormvariate(0.0, sigma) * median if median else 0)
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "ok"}}],
+            "usage": {"prompt_tokens": 50, "completion_tokens": 10}
+        })
+    return httpx.MockTransport(handler)
+
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        agent_id, _, weight = item.partition("=")
+        mix[agent_id.strip()] = float(weight or 1)
+    return mix
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _rss_mb() -> float:
+    """Peak resident set size so far (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _summary(histogram: LatencyHistogram) -> Dict[str, float]:
+    return {key: round(value, 6) for key, value in histogram.summary(QUANTILES).items()}
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    sessions, sockets = InMemorySessions(args.session_ms / 1000.0), InMemorySockets()
+    mcp = InMemoryMCP(args.tools, args.tool_ms / 1000.0)
+    providers = ProviderRegistry(default="mock")
+    providers.add(
+        ProviderConfig(name="mock", base_url="http://llm.mock/v1", max_retries=0),
+        transport=_mock_llm(random.Random(args.seed + 1), args.llm_ms / 1000.0, args.llm_sigma)
+    )
+    policy = AutoscalePolicy(max_workers=args.max_workers) if args.max_workers > 1 else None
+    manager = AgentManager(
+        sessions, None, mcp, sockets, cpu_executor=None, autoscale_policy=policy, llm_providers=providers
+    )
+    await manager.initialize()
+
+    mix = _parse_mix(args.mix)
+    unknown = set(mix) - set(manager.agents)
+    if unknown:
+        raise SystemExit(f"Unknown agents in --mix: {', '.join(sorted(unknown))}")
+    agent_ids, weights = list(mix), list(mix.values())
+    tool_names = list(mcp.tools)
+
+    end_to_end = LatencyHistogram()
+    queue_wait = LatencyHistogram()
+    per_agent = {agent_id: LatencyHistogram() for agent_id in agent_ids}
+    outcomes: Dict[str, int] = {}
+
+    async def user(index: int):
+        session_id = await sessions.create_session()
+        for turn in range(args.messages):
+            agent_id = rng.choices(agent_ids, weights)[0]
+            context = {}
+            if args.tool_calls and manager.agents[agent_id].type.value == "llm_agent":
+                context["tool_calls"] = [
+                    {"call_id": f"c{call}", "tool": rng.choice(tool_names), "arguments": {"query": f"q{turn}"}}
+                    for call in range(args.tool_calls)
+                ]
+
+            start = time.perf_counter()
+            queued = await manager.process_message(
+                f"user {index} message {turn}", session_id=session_id, agent_id=agent_id, context=context
+            )
+            delivered = await sockets.wait(queued.request_id, args.timeout)
+            record = manager.results.get(queued.request_id) or {}
+            if delivered is None:
+                status = record.get("status", "lost")
+            else:
+                status = "completed" if delivered["type"] == "agent_response" else "failed"
+            outcomes[status] = outcomes.get(status, 0) + 1
+            if status == "completed":
+                seconds = sockets.delivered.pop(queued.request_id) - start
+                end_to_end.record(seconds)
+                per_agent[agent_id].record(seconds)
+                queue_wait.record(delivered["timings"]["stages"].get("queue_wait", 0.0))
+
+            if args.think_ms:
+                await asyncio.sleep(rng.expovariate(1000.0 / args.think_ms))
+
+    gc.collect()
+    if args.trace_memory:
+        tracemalloc.start()
+    rss_before = _rss_mb()
+    objects_before = len(gc.get_objects())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(index) for index in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    memory = {
+        "peak_rss_mb_before": rss_before,
+        "peak_rss_mb_after": _rss_mb(),
+        "gc_objects_growth": len(gc.get_objects()) - objects_before,
+        # State the manager still holds once every request has finished
+        "retained_results": len(manager.results),
+        "retained_instances": len(manager.instances),
+    }
+    if args.trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory.update(traced_current_mb=round(current / 2 ** 20, 2), traced_peak_mb=round(peak / 2 ** 20, 2))
+
+    stage_breakdown = {
+        agent_id: {
+            stage: round(summary["p50"], 6) for stage, summary in manager.metrics[agent_id].latency.summary().items()
+            if summary["count"]
+        }
+        for agent_id in agent_ids if agent_id in manager.metrics
+    }
+    await manager.cleanup()
+
+    completed = outcomes.get("completed", 0)
+    return {
+        "version": _git_revision(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in sorted(vars(args).items()) if key not in ("output", "compare")},
+        "results": {
+            "messages": args.sessions * args.messages,
+            "outcomes": outcomes,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_msg_s": round(completed / elapsed, 2) if elapsed else 0.0,
+            "end_to_end": _summary(end_to_end),
+            "queue_wait": _summary(queue_wait),
+            "end_to_end_p50_by_agent": {
+                agent_id: round(histogram.percentile(50), 6) for agent_id, histogram in per_agent.items()
+            },
+            "stage_p50_by_agent": stage_breakdown,
+            "memory": memory,
+            "tool_calls": mcp.calls,
+        }
+    }
+
+
+def _flatten(data: Any, prefix: str = "") -> Dict[str, float]:
+    if isinstance(data, dict):
+        flat = {}
+        for key, value in data.items():
+            flat.update(_flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    return {prefix: data} if isinstance(data, (int, float)) and not isinstance(data, bool) else {}
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Per-metric change between two results files"""
+    before, after = _flatten(previous["results"]), _flatten(current["results"])
+    changes = {}
+    for key in sorted(set(before) & set(after)):
+        old, new = before[key], after[key]
+        if old != new:
+            changes[key] = {"before": old, "after": new, "change_pct": round((new - old) / old * 100, 1) if old else None}
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100, help="simulated users, all active at once")
+    parser.add_argument("--messages", type=int, default=10, help="messages per session")
+    parser.add_argument("--think-ms", type=float, default=100.0, help="mean (exponential) pause between turns")
+    parser.add_argument("--mix", default="general_assistant=0.6,data_analyst=0.2,browser_specialist=0.2",
+                        help="agent_id=weight pairs requests are spread over")
+    parser.add_argument("--tool-calls", type=int, default=1, help="MCP tool calls per LLM agent message")
+    parser.add_argument("--tools", type=int, default=4, help="tools exposed by the stand-in MCP server")
+    parser.add_argument("--tool-ms", type=float, default=20.0, help="stand-in MCP tool latency")
+    parser.add_argument("--llm-ms", type=float, default=100.0, help="median mock model latency")
+    parser.add_argument("--llm-sigma", type=float, default=0.5, help="lognormal spread of the model latency")
+    parser.add_argument("--session-ms", type=float, default=1.0, help="stand-in session store latency per call")
+    parser.add_argument("--max-workers", type=int, default=8, help="autoscaler bound per agent (1 disables it)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for each reply")
+    parser.add_argument("--trace-memory", action="store_true", help="also report tracemalloc (slows the run)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.compare:
+        with open(args.compare) as f:
+            results["compared_to"] = {"file": args.compare, "changes": compare(json.load(f), results)}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Worker autoscaling burst benchmark
+
+Sends a burst of requests to one agent, much faster than a single worker
+can serve them, first with the fixed single-worker pool and then with the
+autoscaler enabled. Sessions and WebSocket delivery are in-memory stand-ins,
+and agent execution is the simulated LLM step (a fixed sleep), so the
+numbers isolate queueing behaviour.
+
+Usage (from backend/):
+    python -m benchmarks.autoscale_burst --requests 400 --rate 100 --work-ms 100
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from core.agent_manager import AgentManager
+from core.autoscaler import AutoscalePolicy
+from core.latency import LatencyHistogram
+
+
+class _Sessions:
+    async def create_session(self, user_id=None):
+        return "bench"
+
+    async def add_message(self, session_id, role, content, metadata=None):
+        pass
+
+    async def get_conversation_history(self, session_id, limit=50):
+        return []
+
+
+class _Sockets:
+    async def send_message(self, session_id, message):
+        pass
+
+
+async def _run(label: str, args: argparse.Namespace, policy):
+    manager = AgentManager(_Sessions(), None, None, _Sockets(), cpu_executor=None, autoscale_policy=policy)
+
+    async def simulated_llm(context):
+        await asyncio.sleep(args.work_ms / 1000.0)
+        return "ok"
+    manager._execute_llm_agent = simulated_llm
+
+    await manager.initialize()
+    queue_wait = LatencyHistogram()
+    peak_workers = 0
+
+    async def watch():
+        nonlocal peak_workers
+        while True:
+            peak_workers = max(peak_workers, manager.worker_count("general_assistant"))
+            await asyncio.sleep(0.05)
+    watcher = asyncio.create_task(watch())
+
+    start = time.perf_counter()
+    request_ids = []
+    for _ in range(args.requests):
+        queued = await manager.process_message("hello", session_id="bench")
+        request_ids.append(queued.request_id)
+        await asyncio.sleep(1.0 / args.rate)
+
+    for request_id in request_ids:
+        await manager.wait_for_result(request_id, 120)
+    elapsed = time.perf_counter() - start
+
+    # Per-request queue wait from the agent's 60s histogram window (the run fits inside it)
+    for slot in manager.metrics["general_assistant"].latency.queue_wait.slots:
+        queue_wait.merge(slot)
+
+    watcher.cancel()
+    await manager.cleanup()
+
+    result = {
+        "mode": label,
+        "requests": args.requests,
+        "elapsed_s": round(elapsed, 3),
+        "peak_workers": peak_workers,
+        "queue_wait": queue_wait.summary((50, 95, 99)),
+    }
+    print(json.dumps(result, indent=2))
+    return result
+
+
+async def main(args: argparse.Namespace):
+    policy = AutoscalePolicy(min_workers=1, max_workers=args.max_workers, interval=args.interval)
+    results = [
+        await _run("fixed_single_worker", args, None),
+        await _run("autoscaled", args, policy),
+    ]
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--rate", type=float, default=100.0, help="requests per second during the burst")
+    parser.add_argument("--work-ms", type=float, default=100.0, help="simulated agent execution time")
+    parser.add_argument("--max-workers", type=int, default=16)
+    parser.add_argument("--interval", type=float, default=0.25, help="autoscaler sampling interval")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    asyncio.run(main(parser.parse_args()))
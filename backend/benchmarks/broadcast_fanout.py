@@ -0,0 +1,127 @@
+"""
+WebSocket broadcast fan-out benchmark
+
+Broadcasts bursts of --burst agent-sized messages to --connections
+in-memory WebSockets: first with the previous sequential loop (json.dumps
+and an awaited send per recipient), then with
+WebSocketManager.broadcast_message queueing for per-connection writers, and
+then with every connection opted in to batched frames. Each send yields to
+the event loop once, and --slow of the connections take --slow-ms per
+send, standing in for clients with a full TCP window.
+
+Reports how long the producer was held per burst, the time until the burst
+was sent to (or evicted from) every connection, CPU per burst, frames sent
+and how many connections were evicted as slow consumers.
+
+Usage (from backend/):
+    python -m benchmarks.broadcast_fanout --connections 10000 --broadcasts 20 --burst 5 --slow 10
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict
+
+from core.latency import LatencyHistogram
+from core.websocket_manager import WebSocketManager
+
+
+class _Socket:
+    __slots__ = ("delay", "bytes_sent", "frames")
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.bytes_sent = 0
+        self.frames = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.delay)
+        self.bytes_sent += len(text)
+        self.frames += 1
+
+    async def close(self, code: int = 1000, reason: str = None):
+        pass
+
+
+async def _sequential_broadcast(manager: WebSocketManager, message: Dict[str, Any]):
+    """The broadcast loop before fan-out: one encode and one awaited send per recipient"""
+    for connection in list(manager.connections.values()):
+        await connection.websocket.send_text(json.dumps(message))
+
+
+def _message() -> Dict[str, Any]:
+    return {
+        "type": "agent_response",
+        "response": "The quarterly figures show steady growth across all regions. " * 20,
+        "agent_id": "general_assistant",
+        "instance_id": "general_assistant_0",
+        "response_time": 1.234,
+        "timings": {"stages": {"queue_wait": 0.001, "generation": 1.1, "execution": 1.2}, "tool_calls": []},
+        "session_id": "broadcast"
+    }
+
+
+async def _run(label: str, args: argparse.Namespace) -> Dict[str, Any]:
+    manager = WebSocketManager()
+    manager.send_timeout = args.send_timeout
+    sockets = []
+    for index in range(args.connections):
+        socket = _Socket(0.0)
+        await manager.connect(socket, f"session-{index}", batch=label == "batched")
+        sockets.append(socket)
+    await manager.flush()
+    for index, socket in enumerate(sockets):
+        socket.delay = args.slow_ms / 1000.0 if index < args.slow else 0.0
+        socket.frames = 0
+
+    message = _message()
+    producer, delivered = LatencyHistogram(), LatencyHistogram()
+    cpu = 0.0
+    for _ in range(args.broadcasts):
+        start, cpu_start = time.perf_counter(), time.process_time()
+        for _ in range(args.burst):
+            if label == "sequential":
+                await _sequential_broadcast(manager, message)
+            else:
+                await manager.broadcast_message(message)
+        producer.record(time.perf_counter() - start)
+        await manager.flush()
+        delivered.record(time.perf_counter() - start)
+        cpu += time.process_time() - cpu_start
+    await manager.stop()
+
+    return {
+        "mode": label,
+        "connections": args.connections,
+        "broadcasts": args.broadcasts,
+        "burst": args.burst,
+        "producer_latency": producer.summary((50, 99)),
+        "delivered_latency": delivered.summary((50, 99)),
+        "cpu_ms_per_burst": round(cpu / args.broadcasts * 1000, 2),
+        "frames_per_connection": round(sum(socket.frames for socket in sockets) / args.connections, 2),
+        "evicted": args.connections - manager.get_connection_count()
+    }
+
+
+async def main(args: argparse.Namespace):
+    results = [await _run(label, args) for label in ("sequential", "queued", "batched")]
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--broadcasts", type=int, default=20)
+    parser.add_argument("--burst", type=int, default=5, help="messages broadcast back to back per round")
+    parser.add_argument("--slow", type=int, default=10, help="connections whose sends are slow")
+    parser.add_argument("--slow-ms", type=float, default=200.0, help="send time of a slow connection")
+    parser.add_argument("--send-timeout", type=float, default=0.1, help="WebSocketManager.send_timeout")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    asyncio.run(main(parser.parse_args()))
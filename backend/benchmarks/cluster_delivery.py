@@ -0,0 +1,133 @@
+"""
+Cross-replica WebSocket delivery check and benchmark
+
+Runs several backend-like processes against one local redis-server, each
+with its own WebSocketManager relaying through ClusterDelivery and
+--sessions in-memory WebSocket connections. Every process then sends
+messages to sessions picked at random across all processes, the way agent
+workers on any replica answer whichever session they processed. Each
+message must arrive exactly once, whichever replica holds its connection.
+
+Reports delivered, missing and duplicated messages, and delivery latency
+for sessions on the sending replica and on other replicas.
+
+Usage (from backend/):
+    python -m benchmarks.cluster_delivery --processes 3 --sessions 200 --messages 3000
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+import uuid
+
+from core.cluster_delivery import ClusterDelivery
+from core.latency import LatencyHistogram
+from core.websocket_manager import WebSocketManager
+
+
+class _Socket:
+    __slots__ = ("received",)
+
+    def __init__(self, received: list):
+        self.received = received
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        message = json.loads(text)
+        if message.get("type") == "bench":
+            self.received.append((message["id"], message["origin"], time.time() - message["sent_at"]))
+
+    async def close(self, code: int = 1000, reason: str = None):
+        pass
+
+
+async def _run_process(index: int, args: argparse.Namespace, barrier, results: multiprocessing.Queue):
+    import redis.asyncio as redis_asyncio
+
+    client = redis_asyncio.from_url(args.redis_url, decode_responses=True)
+    manager = WebSocketManager(cluster=ClusterDelivery(client, prefix=f"{args.prefix}:"))
+    await manager.start()
+    received = []
+    for session in range(args.sessions):
+        await manager.connect(_Socket(received), f"p{index}-s{session}")
+
+    # Let the subscriptions settle, then start sending on every process at once
+    await asyncio.sleep(1.0)
+    await asyncio.get_event_loop().run_in_executor(None, barrier.wait)
+
+    sent = []
+    rng = random.Random(index)
+    for number in range(args.messages // args.processes):
+        target = f"p{rng.randrange(args.processes)}-s{rng.randrange(args.sessions)}"
+        message_id = f"{index}-{number}"
+        await manager.send_message(target, {
+            "type": "bench", "id": message_id, "origin": index, "sent_at": time.time()
+        })
+        sent.append(message_id)
+        if args.rate:
+            await asyncio.sleep(args.processes / args.rate)
+
+    await asyncio.sleep(args.drain)
+    await manager.stop()
+    await client.close()
+    results.put({"index": index, "sent": sent, "received": received})
+
+
+def _process_main(index: int, args: argparse.Namespace, barrier, results: multiprocessing.Queue):
+    asyncio.run(_run_process(index, args, barrier, results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="redis://localhost:6379")
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--sessions", type=int, default=200, help="WebSocket sessions connected to each process")
+    parser.add_argument("--messages", type=int, default=3000, help="total messages across processes")
+    parser.add_argument("--rate", type=float, default=1000.0, help="total messages per second (0: unthrottled)")
+    parser.add_argument("--drain", type=float, default=2.0, help="seconds to wait for deliveries after sending")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+    args.prefix = f"bench-{uuid.uuid4().hex[:8]}"
+
+    barrier = multiprocessing.Barrier(args.processes)
+    results: multiprocessing.Queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_process_main, args=(index, args, barrier, results))
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    sent = {message_id for report in reports for message_id in report["sent"]}
+    delivered = [message_id for report in reports for message_id, _, _ in report["received"]]
+    local, remote = LatencyHistogram(), LatencyHistogram()
+    for report in reports:
+        for _, origin, latency in report["received"]:
+            (local if origin == report["index"] else remote).record(latency)
+
+    summary = {
+        "processes": args.processes,
+        "sessions_per_process": args.sessions,
+        "sent": len(sent),
+        "delivered": len(set(delivered)),
+        "missing": len(sent - set(delivered)),
+        "duplicates": len(delivered) - len(set(delivered)),
+        "local_latency": local.summary((50, 99)),
+        "remote_latency": remote.summary((50, 99)),
+    }
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
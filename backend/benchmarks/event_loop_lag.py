@@ -0,0 +1,88 @@
+"""
+Event-loop lag benchmark for CPU-bound agent steps
+
+Runs a batch of CPU-heavy steps (HTML extraction and table parsing) twice:
+inline on the event loop, as agent logic used to, and through CPUExecutor.
+A probe task sleeps in short intervals and records how late it wakes up,
+which is the delay every WebSocket and HTTP request in the process would see.
+
+Usage (from backend/):
+    python -m benchmarks.event_loop_lag --tasks 16 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from core.cpu_offload import CPUExecutor
+from core.cpu_tasks import html_to_text, summarize_table
+from core.latency import LatencyHistogram
+
+
+def _make_payloads(rows: int):
+    html = ("<html><head><script>var x = 1;</script></head><body>"
+            + "".join(f"<div><h2>Item {i}</h2><p>Paragraph {i} with some text.</p></div>" for i in range(rows))
+            + "</body></html>").encode()
+    table = ("id,price,quantity,name\n"
+             + "".join(f"{i},{i * 1.5},{i % 7},item-{i}\n" for i in range(rows * 4))).encode()
+    return html, table
+
+
+async def _probe(lag: LatencyHistogram, stop: asyncio.Event, interval: float = 0.005):
+    loop = asyncio.get_event_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag.record(max(loop.time() - expected, 0.0))
+
+
+async def _measure(label: str, run_step, tasks: int, html: bytes, table: bytes):
+    lag = LatencyHistogram()
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(lag, stop))
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_step(html_to_text if index % 2 == 0 else summarize_table, html if index % 2 == 0 else table)
+        for index in range(tasks)
+    ))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    result = {"mode": label, "elapsed_s": elapsed, "loop_lag": lag.summary((50, 99, 99.9))}
+    print(json.dumps(result, indent=2))
+    return result
+
+
+async def main(args: argparse.Namespace):
+    html, table = _make_payloads(args.rows)
+
+    async def inline(func, payload):
+        # Yield once so the probe gets scheduled between steps, as real handlers would
+        await asyncio.sleep(0)
+        return func(payload)
+
+    executor = CPUExecutor(max_workers=args.workers, max_pending=args.tasks)
+    await executor.start()
+
+    results = [
+        await _measure("inline", inline, args.tasks, html, table),
+        await _measure("process_pool", executor.run, args.tasks, html, table),
+    ]
+    await executor.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=20000, help="size of the generated HTML/CSV payloads")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,111 @@
+"""
+Hedged model call benchmark with heavy-tailed provider latency
+
+Two in-process mock providers answer after a Pareto-distributed delay (the
+same shape as mockserver's "pareto" latency). The same request stream is run
+without hedging and with hedging at the primary's observed p90, and the
+resulting latency percentiles and hedge rate are compared.
+
+Usage (from backend/):
+    python -m benchmarks.hedging_tail --requests 2000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from core.hedging import HedgePolicy, Hedger
+from core.latency import LatencyHistogram
+from core.llm_providers import CompletionRequest, ProviderConfig, ProviderRegistry
+
+
+def _mock_transport(rng: random.Random, scale: float, alpha: float) -> httpx.MockTransport:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(scale * rng.paretovariate(alpha))
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "ok"}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 1}
+        })
+    return httpx.MockTransport(handler)
+
+
+def _registry(args: argparse.Namespace, hedge: bool) -> ProviderRegistry:
+    rng = random.Random(args.seed)
+    registry = ProviderRegistry(default="primary")
+    hedging = dict(hedge_provider="secondary") if hedge else {}
+    registry.add(
+        ProviderConfig(name="primary", base_url="http://primary.mock/v1", max_retries=0, **hedging),
+        transport=_mock_transport(rng, args.scale, args.alpha)
+    )
+    registry.add(
+        ProviderConfig(name="secondary", base_url="http://secondary.mock/v1", max_retries=0),
+        transport=_mock_transport(rng, args.scale, args.alpha)
+    )
+    if hedge:
+        registry.hedger = Hedger(HedgePolicy(quantile=args.quantile, max_hedge_ratio=args.max_hedge_ratio))
+    return registry
+
+
+async def _run(label: str, args: argparse.Namespace, hedge: bool):
+    registry = _registry(args, hedge)
+    request = CompletionRequest(model="mock", messages=[{"role": "user", "content": "hi"}])
+    histogram = LatencyHistogram()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def call():
+        async with semaphore:
+            start = time.perf_counter()
+            await registry.complete(request)
+            histogram.record(time.perf_counter() - start)
+
+    # Warm the latency histogram the hedge delay is derived from
+    for _ in range(args.warmup):
+        await call()
+    histogram.reset()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    await registry.close()
+
+    hedger = registry.hedger
+    hedge_rate = round(hedger.hedges / hedger.requests, 4) if hedger else 0.0
+    return {
+        "mode": label,
+        "requests": args.requests,
+        "elapsed_s": round(elapsed, 3),
+        "hedge_rate": hedge_rate,
+        "latency": histogram.summary((50, 90, 99, 99.9)),
+    }
+
+
+async def _main(args: argparse.Namespace):
+    return [await _run("no_hedging", args, hedge=False), await _run("hedged_p90", args, hedge=True)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--scale", type=float, default=0.02, help="Pareto scale (minimum latency) in seconds")
+    parser.add_argument("--alpha", type=float, default=1.5, help="Pareto shape; lower is heavier-tailed")
+    parser.add_argument("--quantile", type=float, default=90.0)
+    parser.add_argument("--max-hedge-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(_main(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
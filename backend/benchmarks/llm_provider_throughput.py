@@ -0,0 +1,96 @@
+"""
+Model provider throughput benchmark against the mock LLM server
+
+Sends concurrent completions to mockserver/main.py (started separately, e.g.
+MOCK_LLM_LATENCY="lognormal:median=0.05,sigma=0.5" python mockserver/main.py)
+in two modes: through one shared, pooled provider client, and with a fresh
+client per call the way ad-hoc integrations tend to do it. Reports requests
+per second and latency percentiles for each.
+
+Usage (from backend/):
+    python -m benchmarks.llm_provider_throughput --url http://localhost:3001/v1 --requests 2000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from core.latency import LatencyHistogram
+from core.llm_providers import CompletionRequest, OpenAIProvider, ProviderConfig
+
+
+def _config(args: argparse.Namespace) -> ProviderConfig:
+    return ProviderConfig(
+        name="mock",
+        base_url=args.url,
+        http2=not args.http1,
+        max_connections=args.max_connections,
+        max_keepalive_connections=args.max_connections,
+        max_retries=0
+    )
+
+
+async def _run(label: str, args: argparse.Namespace, shared: bool):
+    request = CompletionRequest(model="mock", messages=[{"role": "user", "content": "Benchmark prompt " * 20}])
+    histogram = LatencyHistogram()
+    provider = OpenAIProvider(_config(args)) if shared else None
+    semaphore = asyncio.Semaphore(args.concurrency)
+    errors = 0
+
+    async def call():
+        nonlocal errors
+        async with semaphore:
+            client = provider or OpenAIProvider(_config(args))
+            start = time.perf_counter()
+            try:
+                await client.complete(request)
+                histogram.record(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+            finally:
+                if not shared:
+                    await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    if provider:
+        await provider.close()
+
+    return {
+        "mode": label,
+        "requests": args.requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(args.requests / elapsed, 1),
+        "latency": histogram.summary(),
+    }
+
+
+async def _main(args: argparse.Namespace):
+    return [
+        await _run("shared_pooled_client", args, shared=True),
+        await _run("client_per_call", args, shared=False),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:3001/v1")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--http1", action="store_true", help="disable HTTP/2 on the shared client")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(_main(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
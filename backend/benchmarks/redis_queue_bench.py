@@ -0,0 +1,124 @@
+"""
+Redis Streams agent queue benchmark
+
+Runs several backend-like processes against one local redis-server. Every
+process both enqueues and consumes on the same agent stream, the way replicas
+behind nginx would. Optionally one process "crashes" after taking some
+entries without acking them, to show that the survivors reclaim them.
+
+Usage (from backend/):
+    python -m benchmarks.redis_queue_bench --processes 4 --messages 5000 --kill-one
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import uuid
+
+from core.agent_queue import RedisStreamQueue
+from core.latency import LatencyHistogram
+
+
+async def _run_process(index: int, args: argparse.Namespace, results: multiprocessing.Queue):
+    import redis.asyncio as redis_asyncio
+
+    client = redis_asyncio.from_url(args.redis_url, decode_responses=True)
+    queue = RedisStreamQueue(
+        client, args.agent_id, consumer=f"bench-{index}-{os.getpid()}",
+        claim_idle_ms=args.claim_idle_ms, block_ms=200
+    )
+    await queue.start()
+
+    crash_after = args.messages // (args.processes * 4) if args.kill_one and index == 0 else None
+    processed = []
+    latencies = []
+    stop = asyncio.Event()
+
+    async def produce():
+        for _ in range(args.messages // args.processes):
+            await queue.put({"request_id": uuid.uuid4().hex, "enqueued_at": time.time()})
+
+    async def consume():
+        while not stop.is_set():
+            try:
+                request_data, receipt = await asyncio.wait_for(queue.get(), timeout=args.idle_exit)
+            except asyncio.TimeoutError:
+                stop.set()
+                return
+            if crash_after is not None and len(processed) >= crash_after:
+                # Simulate a crash: stop without acking what we hold
+                stop.set()
+                return
+            await asyncio.sleep(args.work_ms / 1000.0)
+            await queue.ack(receipt)
+            processed.append(request_data["request_id"])
+            latencies.append(time.time() - request_data["enqueued_at"])
+
+    start = time.perf_counter()
+    await asyncio.gather(produce(), *(consume() for _ in range(args.workers)))
+    elapsed = time.perf_counter() - start
+
+    await queue.close()
+    await client.close()
+    results.put({"index": index, "processed": processed, "latencies": latencies, "elapsed": elapsed})
+
+
+def _process_main(index: int, args: argparse.Namespace, results: multiprocessing.Queue):
+    asyncio.run(_run_process(index, args, results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default="redis://localhost:6379")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=4, help="consumer coroutines per process")
+    parser.add_argument("--messages", type=int, default=4000, help="total messages across processes")
+    parser.add_argument("--work-ms", type=float, default=1.0, help="simulated processing time per message")
+    parser.add_argument("--claim-idle-ms", type=int, default=2000)
+    parser.add_argument("--idle-exit", type=float, default=5.0, help="seconds without messages before a process exits")
+    parser.add_argument("--kill-one", action="store_true", help="crash one process mid-run without acking")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+    args.agent_id = f"bench-{uuid.uuid4().hex[:8]}"
+
+    results: multiprocessing.Queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_process_main, args=(index, args, results))
+        for index in range(args.processes)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    wall = time.perf_counter() - start - args.idle_exit
+
+    histogram = LatencyHistogram()
+    processed = []
+    for report in reports:
+        processed.extend(report["processed"])
+        for latency in report["latencies"]:
+            histogram.record(latency)
+
+    summary = {
+        "processes": args.processes,
+        "workers_per_process": args.workers,
+        "messages": args.messages // args.processes * args.processes,
+        "processed": len(processed),
+        "unique_processed": len(set(processed)),
+        "per_process": {report["index"]: len(report["processed"]) for report in reports},
+        "throughput_per_s": len(processed) / wall if wall > 0 else None,
+        "end_to_end_latency": histogram.summary(),
+    }
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Warm agent context benchmark
+
+Runs the same conversation turns through AgentManager._execute_agent_logic
+with and without a session's warm context. Cold turns re-read the history
+from the session store (JSON-decoded, as from the Redis cache) and rebuild
+the agent context and model request. Warm turns append the new message to
+the instance's window and reuse the rest. The model call is stubbed out
+after the CompletionRequest is built, so only context handling is measured.
+
+Reports CPU time per turn and the peak memory allocated while a turn runs.
+
+Usage (from backend/):
+    python -m benchmarks.warm_context --sessions 50 --turns 40 --tools 30
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from benchmarks.agent_load import InMemoryMCP, InMemorySessions, InMemorySockets
+from core.agent_manager import AgentManager
+
+
+class SerializedSessions(InMemorySessions):
+    """Session stand-in that stores history as JSON, so each read pays the decode a cache read would"""
+
+    async def add_message(self, session_id: str, role: str, content: str, metadata: Optional[Dict] = None) -> int:
+        stored = self.conversations.get(session_id)
+        history = json.loads(stored) if stored else []
+        history.append({"role": role, "content": content, "metadata": metadata or {}, "timestamp": time.time()})
+        self.conversations[session_id] = json.dumps(history)
+        return len(history)
+
+    async def get_conversation_history(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        stored = self.conversations.get(session_id)
+        return json.loads(stored)[-limit:] if stored else []
+
+
+async def _run(label: str, args: argparse.Namespace, warm: bool, trace: bool) -> Dict[str, Any]:
+    sessions = SerializedSessions()
+    manager = AgentManager(sessions, None, InMemoryMCP(args.tools, 0.0), InMemorySockets(), cpu_executor=None)
+    await manager.initialize()
+
+    async def model_call(context):
+        return manager._completion_request(context).messages[-1]["content"]
+    manager._execute_llm_agent = model_call
+
+    config = manager.agents["general_assistant"]
+    session_ids = [f"session-{index}" for index in range(args.sessions)]
+    instance_ids = {
+        session_id: await manager._get_or_create_instance(config.agent_id, session_id) for session_id in session_ids
+    }
+    # Conversations already have some history before the measured turns
+    for session_id in session_ids:
+        for turn in range(args.history):
+            await sessions.add_message(session_id, "user", f"earlier message {turn} " * 8)
+
+    cpu = 0.0
+    peaks = []
+    for turn in range(args.turns):
+        for session_id in session_ids:
+            message = f"message {turn} from {session_id} " * 8
+            length = await sessions.add_message(session_id, "user", message)
+            if trace:
+                # Frees of objects allocated before this point are then not counted against the turn
+                tracemalloc.clear_traces()
+            start = time.process_time()
+            await manager._execute_agent_logic(
+                config, message, session_id, {},
+                instance_id=instance_ids[session_id] if warm else None,
+                history_length=length
+            )
+            cpu += time.process_time() - start
+            if trace:
+                peaks.append(tracemalloc.get_traced_memory()[1])
+
+    await manager.cleanup()
+    turns = args.turns * args.sessions
+    result = {"mode": label, "turns": turns, "cpu_us_per_turn": round(cpu / turns * 1e6, 1)}
+    if trace:
+        peaks.sort()
+        result["peak_alloc_bytes_per_turn"] = {"p50": peaks[len(peaks) // 2], "max": peaks[-1]}
+    return result
+
+
+async def _main(args: argparse.Namespace):
+    results = []
+    for label, warm in (("cold", False), ("warm", True)):
+        # CPU is timed without tracemalloc, which would dominate it
+        result = await _run(label, args, warm, trace=False)
+        tracemalloc.start()
+        result.update({k: v for k, v in (await _run(label, args, warm, trace=True)).items() if k.startswith("peak")})
+        tracemalloc.stop()
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=40, help="measured turns per session")
+    parser.add_argument("--history", type=int, default=30, help="messages per session before the measured turns")
+    parser.add_argument("--tools", type=int, default=30, help="MCP tools exposed to the agent")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(_main(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
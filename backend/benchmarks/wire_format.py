@@ -0,0 +1,138 @@
+"""
+WebSocket wire format benchmark
+
+Encodes typical agent, browser and screenshot messages the way each
+WebSocket encoding sends them: JSON with the screenshot as a hex string
+(the previous format), JSON with bytes as {"$base64": ...}, and msgpack
+with bytes as raw bin data. Each encoded message is then compressed as
+permessage-deflate would (raw deflate, sync flush, no context takeover).
+
+Reports bytes on the wire with and without permessage-deflate, and encode
+and deflate CPU per message.
+
+Usage (from backend/):
+    python -m benchmarks.wire_format --iterations 200 --screenshot-kb 300
+"""
+
+import argparse
+import json
+import random
+import time
+import zlib
+from typing import Any, Callable, Dict, Union
+
+from core.wire_format import dumps, packb
+
+
+def _agent_message() -> Dict[str, Any]:
+    return {
+        "type": "agent_response",
+        "response": "The quarterly figures show steady growth across all regions. " * 20,
+        "agent_id": "general_assistant",
+        "instance_id": "general_assistant_0",
+        "response_time": 1.234,
+        "timings": {"stages": {"queue_wait": 0.001, "generation": 1.1, "execution": 1.2}, "tool_calls": []},
+        "session_id": "s1"
+    }
+
+
+def _browser_message(rng: random.Random) -> Dict[str, Any]:
+    """An _extract_data result for a large page: headings, links and a table"""
+    words = ["product", "pricing", "docs", "support", "release", "notes", "account", "team", "blog", "careers"]
+
+    def phrase(count: int) -> str:
+        return " ".join(rng.choice(words) for _ in range(count))
+
+    return {
+        "type": "browser_response",
+        "task_id": "t1",
+        "result": {
+            "title": phrase(6),
+            "description": phrase(30),
+            "headings": [{"tag": f"h{rng.randint(1, 3)}", "text": phrase(5)} for _ in range(300)],
+            "links": [
+                {"href": f"https://example.com/{phrase(3).replace(' ', '/')}?id={index}", "text": phrase(4)}
+                for index in range(3000)
+            ],
+            "table": [[phrase(2), rng.randint(0, 10 ** 6), round(rng.random() * 100, 2)] for _ in range(2000)]
+        }
+    }
+
+
+def _screenshot(rng: random.Random, size_kb: int) -> bytes:
+    """PNG-like bytes: a signature and deflated image rows, as incompressible as a real screenshot"""
+    rows = bytearray()
+    while len(rows) < size_kb * 1024 * 3:
+        base = rng.randrange(256)
+        rows.extend(min(255, base + rng.randrange(48)) for _ in range(4096))
+    return b"\x89PNG\r\n\x1a\n" + zlib.compress(bytes(rows), 9)[:size_kb * 1024]
+
+
+def _screenshot_message(screenshot: Union[bytes, str]) -> Dict[str, Any]:
+    return {
+        "type": "browser_response",
+        "task_id": "t2",
+        "result": {"screenshot": screenshot, "path": None, "size": len(screenshot)}
+    }
+
+
+def _deflate(data: bytes) -> bytes:
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    # permessage-deflate drops the 00 00 ff ff tail of the sync flush
+    return compressed[:-4]
+
+
+def _measure(encode: Callable[[], Union[str, bytes]], iterations: int) -> Dict[str, Any]:
+    start = time.process_time()
+    for _ in range(iterations):
+        frame = encode()
+    encode_cpu = (time.process_time() - start) / iterations
+    data = frame.encode() if isinstance(frame, str) else frame
+
+    start = time.process_time()
+    for _ in range(iterations):
+        compressed = _deflate(data)
+    deflate_cpu = (time.process_time() - start) / iterations
+    return {
+        "bytes": len(data),
+        "deflated_bytes": len(compressed),
+        "encode_us": round(encode_cpu * 1e6, 1),
+        "deflate_us": round(deflate_cpu * 1e6, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--screenshot-kb", type=int, default=300, help="size of the PNG screenshot")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    screenshot = _screenshot(rng, args.screenshot_kb)
+    payloads = {
+        "agent": _agent_message(),
+        "browser": _browser_message(rng),
+        "screenshot": _screenshot_message(screenshot)
+    }
+    hex_screenshot = _screenshot_message(screenshot.hex())
+
+    results = []
+    for name, message in payloads.items():
+        encoders = {
+            "json+hex": (lambda: json.dumps(hex_screenshot)) if name == "screenshot" else (lambda: json.dumps(message)),
+            "json": lambda: dumps(message),
+            "msgpack": lambda: packb(message)
+        }
+        for encoding, encode in encoders.items():
+            results.append({"payload": name, "encoding": encoding, **_measure(encode, args.iterations)})
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Agent Prompt Material
+Static per-agent context compiled once and reused until its inputs change
+"""
+
+import json
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class AgentPromptMaterial:
+    """The parts of an agent's context that do not change between requests.
+
+    Shared by every request for the agent, so the fields are tuples and must
+    not be mutated by consumers.
+    """
+
+    __slots__ = ("agent_id", "instructions", "capabilities", "tools", "config_updated_at", "tools_version",
+                 "system_prompt", "tool_schemas", "tool_schemas_json")
+
+    def __init__(
+        self,
+        agent_id: str,
+        instructions: str,
+        capabilities: Tuple[Dict[str, Any], ...],
+        tools: Tuple[str, ...],
+        config_updated_at: datetime,
+        tools_version: int,
+        tool_schemas: Tuple[Dict[str, Any], ...] = ()
+    ):
+        self.agent_id = agent_id
+        self.instructions = instructions
+        self.capabilities = capabilities
+        self.tools = tools
+        self.config_updated_at = config_updated_at
+        self.tools_version = tools_version
+        # Provider payload parts derived from the above
+        self.system_prompt = compile_system_prompt(instructions, capabilities)
+        self.tool_schemas = tool_schemas
+        self.tool_schemas_json = json.dumps(tool_schemas, separators=(",", ":"))
+
+
+def compile_system_prompt(instructions: str, capabilities: Tuple[Dict[str, Any], ...]) -> str:
+    """The static system prompt prefix: instructions followed by the agent's capabilities"""
+    if not capabilities:
+        return instructions
+    lines = [instructions, "", "Capabilities:"]
+    lines.extend(f"- {capability['name']}: {capability['description']}" for capability in capabilities)
+    return "\n".join(lines)
+
+
+def _tool_schema(tool: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Function-calling schema for a tool name or an MCP tool description"""
+    if isinstance(tool, str):
+        return {"name": tool, "description": "", "parameters": {"type": "object", "properties": {}}}
+    return {
+        "name": tool["name"],
+        "description": tool.get("description", ""),
+        "parameters": tool.get("input_schema") or {"type": "object", "properties": {}}
+    }
+
+
+class PromptMaterialCache:
+    """Compiled prompt material per agent, keyed by config and tool registry version.
+
+    An entry is rebuilt when the agent's config object is replaced, its
+    updated_at changes, or the MCP tool registry version moves on. Code that
+    edits a config in place must bump updated_at or call invalidate().
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Any, AgentPromptMaterial]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self,
+        agent_config: Any,
+        tools_version: int,
+        mcp_tools: Callable[[], List[Union[str, Dict[str, Any]]]]
+    ) -> AgentPromptMaterial:
+        """Return the agent's material, compiling it if missing or stale.
+        
+        mcp_tools lists the agent's MCP tools as names or as dicts with name,
+        description and input_schema.
+        """
+        entry = self._entries.get(agent_config.agent_id)
+        if entry:
+            config, material = entry
+            if (
+                config is agent_config
+                and material.config_updated_at == agent_config.updated_at
+                and material.tools_version == tools_version
+            ):
+                self.hits += 1
+                return material
+
+        self.misses += 1
+        tools = list(agent_config.tools) + list(mcp_tools())
+        material = AgentPromptMaterial(
+            agent_id=agent_config.agent_id,
+            instructions=agent_config.instructions,
+            capabilities=tuple(cap.dict() for cap in agent_config.capabilities),
+            tools=tuple(tool if isinstance(tool, str) else tool["name"] for tool in tools),
+            config_updated_at=agent_config.updated_at,
+            tools_version=tools_version,
+            tool_schemas=tuple(_tool_schema(tool) for tool in tools)
+        )
+        self._entries[agent_config.agent_id] = (agent_config, material)
+        logger.debug(f"Compiled prompt material for {agent_config.agent_id} (tools v{tools_version})")
+        return material
+
+    def invalidate(self, agent_id: Optional[str] = None):
+        """Drop one agent's material, or all of it"""
+        if agent_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(agent_id, None)
+
+
+class WarmContext:
+    """One session's agent context, kept on its AgentInstance and reused across turns.
+
+    Holds the entries that only change with the agent's compiled material,
+    and a window over the conversation (both as stored and as provider
+    messages) that each turn extends instead of re-reading the session.
+    """
+
+    __slots__ = ("material", "base", "history", "messages", "history_length", "size")
+
+    # Rough per-entry and fixed overheads used by the size estimate, in bytes
+    ENTRY_OVERHEAD = 400
+    BASE_OVERHEAD = 2048
+
+    def __init__(self, material: AgentPromptMaterial, agent_config: Any, session_id: str, window: int):
+        self.material = material
+        self.base: Dict[str, Any] = {
+            "tools": material.tools,
+            "instructions": material.instructions,
+            "system_prompt": material.system_prompt,
+            "tool_schemas": material.tool_schemas,
+            "model": agent_config.model,
+            "max_tokens": agent_config.max_tokens,
+            "temperature": agent_config.temperature,
+            "capabilities": material.capabilities,
+            "session_id": session_id
+        }
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=window)
+        self.messages: Deque[Dict[str, str]] = deque(maxlen=window)
+        # Number of messages in the session that the window is current with (None until seeded)
+        self.history_length: Optional[int] = None
+        self.size = self.BASE_OVERHEAD
+
+    def extends(self, history_length: Optional[int]) -> bool:
+        """Whether a turn whose message made the session history_length long follows directly on this window"""
+        return (
+            history_length is not None
+            and self.history_length is not None
+            and history_length == self.history_length + 1
+        )
+
+    def reset(self, history: List[Dict[str, Any]], history_length: Optional[int]):
+        """Reseed the window from the session's stored history"""
+        self.history.clear()
+        self.messages.clear()
+        for entry in history[-self.history.maxlen:]:
+            self._push(entry)
+        self.history_length = history_length
+        self._resize()
+
+    def append(self, entry: Dict[str, Any]):
+        """Add this turn's message to the window"""
+        self._push(entry)
+        if self.history_length is not None:
+            self.history_length += 1
+        self._resize()
+
+    def _push(self, entry: Dict[str, Any]):
+        self.history.append(entry)
+        role = "user" if entry.get("role") == "user" else "assistant"
+        self.messages.append({"role": role, "content": entry.get("content", "")})
+
+    def _resize(self):
+        self.size = self.BASE_OVERHEAD + sum(
+            self.ENTRY_OVERHEAD + 2 * len(message["content"]) for message in self.messages
+        )
+
+    def build(self, message: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """The agent context for one turn"""
+        agent_context = dict(self.base)
+        agent_context["message"] = message
+        agent_context["history"] = list(self.history)
+        agent_context["messages"] = list(self.messages)
+        agent_context.update(context)
+        return agent_context
+
+
+class WarmContextPool:
+    """Least-recently-used accounting of warm contexts within a memory budget.
+
+    The pool only tracks sizes; on_evict is called with the key of each
+    context that has to go so its owner can drop it.
+    """
+
+    def __init__(self, max_bytes: int, on_evict: Callable[[str], None]):
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._sizes
+
+    def touch(self, key: str, size: int):
+        """Mark a context as just used with its current size, evicting the coldest ones over budget"""
+        self.total_bytes += size - self._sizes.pop(key, 0)
+        self._sizes[key] = size
+        while self.total_bytes > self.max_bytes and len(self._sizes) > 1:
+            cold, cold_size = self._sizes.popitem(last=False)
+            self.total_bytes -= cold_size
+            self.evictions += 1
+            self.on_evict(cold)
+
+    def discard(self, key: str):
+        """Stop tracking a context its owner dropped"""
+        self.total_bytes -= self._sizes.pop(key, 0)
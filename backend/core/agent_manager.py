@@ -4,9 +4,12 @@ Handles AI agent lifecycle, routing, and coordination with ADK integration
 """
 
 import asyncio
+import hashlib
+import json
 import logging
+import time
 import uuid
-from typing import Dict, List, Optional, Any, Union
+from typing import Callable, Dict, List, Optional, Any, Set, Tuple, Union
 from datetime import datetime, timedelta
 from enum import Enum
 
@@ -16,9 +19,35 @@ from .session_manager import SessionManager
 from .websocket_manager import WebSocketManager
 from .mcp_integration import MCPServerManager
 from .mcp_tools_wrapper import MCPToolsetManager
+from .agent_queue import AgentQueue, LocalAgentQueue
+from .agent_context import AgentPromptMaterial, PromptMaterialCache, WarmContext, WarmContextPool
+from .agent_registry import CustomAgentRegistry
+from .autoscaler import AutoscalePolicy, WorkerAutoscaler
+from .cpu_offload import CPUExecutor, is_cpu_bound
+from .deadline import DeadlineExceeded, check_deadline, deadline_scope, with_deadline
+from .cpu_tasks import html_to_text, summarize_table
+from .latency import StageLatency
+from .llm_providers import CompletionRequest, ProviderRegistry
+from .result_relay import ResultRelay
+from .spans import RequestTimings, current_timings, span, timed, timings_scope
+from .tool_executor import ToolExecutionReport, ToolExecutor, ToolInvocation, ToolRunner
+from .workflow_engine import WorkflowEngine, plan_workflow
+from .metrics import REGISTRY, MetricFamily, add_latency_summary, summary_family
+from .timer_heap import TimerHeap
 
 logger = logging.getLogger(__name__)
 
+AGENT_DEADLINE_EXCEEDED = REGISTRY.counter(
+    "agent_deadline_exceeded_total",
+    "Agent requests that ran out of time, by where the deadline hit",
+    ["agent_id", "stage"]
+)
+AGENT_DEDUPLICATED = REGISTRY.counter(
+    "agent_requests_deduplicated_total",
+    "Submissions attached to an identical request already in flight instead of being queued",
+    ["agent_id", "match"]
+)
+
 
 class AgentType(str, Enum):
     """Agent type enumeration"""
@@ -77,6 +106,11 @@ class AgentInstance(BaseModel):
     message_count: int = 0
     error_count: int = 0
     metadata: Dict[str, Any] = {}
+    # Context reused across this session's turns; dropped under memory pressure
+    warm: Optional[WarmContext] = Field(default=None, exclude=True)
+    
+    class Config:
+        arbitrary_types_allowed = True
 
 
 class AgentResponse(BaseModel):
@@ -86,6 +120,7 @@ class AgentResponse(BaseModel):
     agent_id: str
     instance_id: str
     response_time: float
+    request_id: Optional[str] = None
     tokens_used: int = 0
     tools_called: List[str] = []
     metadata: Dict[str, Any] = {}
@@ -102,40 +137,112 @@ class AgentMetrics(BaseModel):
     total_tokens_used: int = 0
     uptime_seconds: float = 0.0
     last_reset: datetime = Field(default_factory=datetime.utcnow)
+    # Sliding-window histograms for queue wait, execution and send time
+    latency: StageLatency = Field(default_factory=StageLatency, exclude=True)
+    
+    class Config:
+        arbitrary_types_allowed = True
 
 
 class AgentManager:
     """Advanced AI agent management system"""
     
+    # Idle instances are dropped after this many seconds without activity
+    instance_ttl: float = 3600
+    # BUSY instances are considered stuck after this many seconds
+    stuck_task_timeout: float = 300
+    # Tool calls allowed in flight at once within one agent turn
+    tool_concurrency: int = 4
+    # Finished request results stay available for long-polling this long
+    result_ttl: float = 300
+    # Custom agents with no requests for this long are unloaded along with their workers
+    custom_agent_idle_timeout: float = 600
+    # Conversation messages in an agent turn's context
+    history_window: int = 10
+    # Memory budget for warm per-session contexts; the least recently used are dropped beyond it
+    warm_context_budget: int = 64 * 1024 * 1024
+    # Identical messages to a session within this many seconds are treated as one request
+    dedup_window: float = 5.0
+    
     def __init__(
         self,
         session_manager: SessionManager,
         browser_service: Any,
         mcp_manager: MCPServerManager,
-        websocket_manager: WebSocketManager
+        websocket_manager: WebSocketManager,
+        queue_factory: Optional[Callable[[str], AgentQueue]] = None,
+        cpu_executor: Optional[CPUExecutor] = None,
+        autoscale_policy: Optional[AutoscalePolicy] = None,
+        llm_providers: Optional[ProviderRegistry] = None,
+        result_relay: Optional[ResultRelay] = None
     ):
         self.session_manager = session_manager
         self.browser_service = browser_service
         self.mcp_manager = mcp_manager
         self.websocket_manager = websocket_manager
         
+        # Builds the request queue for an agent (in-process unless configured otherwise)
+        self.queue_factory = queue_factory or (lambda agent_id: LocalAgentQueue())
+        
+        # Process pool for steps declared @cpu_bound (run inline when absent)
+        self.cpu_executor = cpu_executor
+        
+        # Model providers with pooled clients (LLM agents answer with a canned reply when absent)
+        self.llm_providers = llm_providers
+        
         # Agent registry and instances
         self.agents: Dict[str, AgentConfig] = {}
         self.instances: Dict[str, AgentInstance] = {}
         self.metrics: Dict[str, AgentMetrics] = {}
         
+        # Custom agents currently loaded in this process; the rest stay in the registry
+        self.custom_agents: Set[str] = set()
+        self.agent_registry = CustomAgentRegistry(session_manager, self._on_agent_config_change)
+        
         # Session to agent mapping
         self.session_agents: Dict[str, str] = {}  # session_id -> instance_id
         
         # MCP toolset manager
         self.mcp_toolset_manager: Optional[MCPToolsetManager] = None
         
+        # Static prompt material per agent (instructions, capabilities, tool names)
+        self.prompt_cache = PromptMaterialCache()
+        # Size accounting of the warm contexts held by instances
+        self.warm_contexts = WarmContextPool(self.warm_context_budget, self._evict_warm_context)
+        
         # Agent routing and load balancing
-        self.agent_queues: Dict[str, asyncio.Queue] = {}
-        self.worker_tasks: Dict[str, asyncio.Task] = {}
+        self.agent_queues: Dict[str, AgentQueue] = {}
+        self.worker_tasks: Dict[str, List[asyncio.Task]] = {}
+        self.busy_workers: Dict[str, int] = {}
+        self._busy_tasks: Set[asyncio.Task] = set()
+        # Busy workers asked to exit once their current request is done
+        self._retiring: Dict[str, int] = {}
+        
+        # Resizes worker pools with load (fixed single worker per agent when absent)
+        self.autoscaler = WorkerAutoscaler(self, autoscale_policy) if autoscale_policy else None
+        
+        # Futures for requests whose caller awaits the response (request_id -> future)
+        self._pending_results: Dict[str, asyncio.Future] = {}
+        # Outcome records of client requests for synchronous waits and long-polling
+        self.results: Dict[str, Dict[str, Any]] = {}
+        # Brings back outcomes of requests accepted here but processed on other replicas
+        self.result_relay = result_relay
+        # Submissions in flight by idempotency key, resolving to their queued response
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # request_id -> (idempotency key, submission future), to release the key when it finishes
+        self._dedup_requests: Dict[str, Tuple[str, asyncio.Future]] = {}
+        
+        # Runs orchestrator DAGs on the other agents' queues
+        self.workflow_engine = WorkflowEngine(self.dispatch_request, session_manager, websocket_manager)
+        
+        # Per-instance expiry and stuck-task timers
+        self.timers = TimerHeap("agent_instances")
+        self.monitor_task: Optional[asyncio.Task] = None
         
         # Setup default agents
         self._setup_default_agents()
+        
+        REGISTRY.register_collector("agent_manager", self.collect_metrics)
     
     def _setup_default_agents(self):
         """Setup default agent configurations with enhanced capabilities"""
@@ -253,7 +360,7 @@ class AgentManager:
         for agent in default_agents:
             self.agents[agent.agent_id] = agent
             self.metrics[agent.agent_id] = AgentMetrics(agent_id=agent.agent_id)
-            self.agent_queues[agent.agent_id] = asyncio.Queue()
+            self.agent_queues[agent.agent_id] = self.queue_factory(agent.agent_id)
     
     async def initialize(self):
         """Initialize the agent manager with enhanced capabilities"""
@@ -265,15 +372,27 @@ class AgentManager:
                 self.mcp_toolset_manager = MCPToolsetManager(self.mcp_manager)
                 await self.mcp_toolset_manager.initialize()
             
+            # Warm up the CPU offload pool before taking traffic
+            if self.cpu_executor:
+                await self.cpu_executor.start()
+            if self.llm_providers:
+                await self.llm_providers.start()
+            
+            # Listen for outcomes of our requests before workers anywhere can finish them
+            if self.result_relay:
+                await self.result_relay.start(self._apply_remote_outcome)
+            
             # Start worker tasks for each agent
             await self._start_agent_workers()
+            if self.autoscaler:
+                self.autoscaler.start()
             
             # Load custom agents from database
             await self._load_custom_agents()
             
-            # Start monitoring tasks
-            asyncio.create_task(self._monitor_agents())
-            asyncio.create_task(self._cleanup_expired_instances())
+            # Start instance timers and monitoring
+            self.timers.start()
+            self.monitor_task = asyncio.create_task(self._monitor_agents())
             
             logger.info(f"Advanced Agent Manager initialized with {len(self.agents)} agents")
             
@@ -283,151 +402,461 @@ class AgentManager:
     
     async def _start_agent_workers(self):
         """Start worker tasks for processing agent requests"""
+        initial = self.autoscaler.policy.min_workers if self.autoscaler else 1
         for agent_id in self.agents.keys():
-            worker_task = asyncio.create_task(self._agent_worker(agent_id))
-            self.worker_tasks[agent_id] = worker_task
+            await self.agent_queues[agent_id].start()
+            self.scale_workers(agent_id, initial)
+    
+    def worker_count(self, agent_id: str) -> int:
+        """Number of live worker tasks for an agent, excluding ones about to retire"""
+        alive = sum(1 for task in self.worker_tasks.get(agent_id, []) if not task.done())
+        return alive - self._retiring.get(agent_id, 0)
+    
+    def scale_workers(self, agent_id: str, target: int):
+        """Grow or shrink an agent's worker pool to target workers.
+        
+        Idle workers (waiting on the queue) are cancelled right away; busy
+        ones are asked to exit after finishing their current request.
+        """
+        pool = self.worker_tasks.setdefault(agent_id, [])
+        pool[:] = [task for task in pool if not task.done()]
+        
+        # Growing first cancels pending retirements
+        retiring = self._retiring.get(agent_id, 0)
+        active = len(pool) - retiring
+        if target > active:
+            revived = min(retiring, target - active)
+            retiring -= revived
+            active += revived
+            for _ in range(target - active):
+                pool.append(asyncio.create_task(self._agent_worker(agent_id)))
+        elif target < active:
+            excess = active - target
+            for task in [task for task in pool if task not in self._busy_tasks][:excess]:
+                task.cancel()
+                pool.remove(task)
+                excess -= 1
+            retiring += excess
+        self._retiring[agent_id] = retiring
     
     async def _agent_worker(self, agent_id: str):
         """Worker task for processing agent requests"""
         queue = self.agent_queues[agent_id]
+        this_task = asyncio.current_task()
         
         while True:
             try:
+                # While the model's quota is exhausted, leave requests queued
+                # instead of holding them in a worker that would only wait
+                await self._wait_for_quota(agent_id)
+                
                 # Get next request from queue
-                request_data = await queue.get()
+                request_data, receipt = await queue.get()
                 
-                # Process the request
-                await self._process_agent_request(agent_id, request_data)
+                # Process the request; scale-down never cancels a worker before it acks
+                self._busy_tasks.add(this_task)
+                try:
+                    self.busy_workers[agent_id] = self.busy_workers.get(agent_id, 0) + 1
+                    try:
+                        await self._process_agent_request(agent_id, request_data)
+                    finally:
+                        self.busy_workers[agent_id] -= 1
+                    
+                    # Mark task as done
+                    await queue.ack(receipt)
+                finally:
+                    self._busy_tasks.discard(this_task)
+                self._touch_custom_agent(agent_id)
                 
-                # Mark task as done
-                queue.task_done()
+                # Leave the pool if it was scaled down while we were busy
+                if self._retiring.get(agent_id):
+                    self._retiring[agent_id] -= 1
+                    self.worker_tasks[agent_id].remove(this_task)
+                    return
                 
             except Exception as e:
                 logger.error(f"Error in agent worker {agent_id}: {e}")
                 await asyncio.sleep(1)  # Brief pause before continuing
     
+    def _provider_model(self, agent_id: str) -> Optional[str]:
+        """The model an agent calls through llm_providers, if it calls one"""
+        config = self.agents.get(agent_id)
+        if not self.llm_providers or config is None or config.type in (
+            AgentType.BROWSER_AGENT, AgentType.DATA_AGENT, AgentType.WORKFLOW_AGENT
+        ):
+            return None
+        return config.model if self.llm_providers.for_model(config.model) else None
+    
+    def is_rate_limited(self, agent_id: str) -> bool:
+        """Whether an agent's model calls are queued for provider quota"""
+        model = self._provider_model(agent_id)
+        return model is not None and self.llm_providers.is_saturated(model)
+    
+    async def _wait_for_quota(self, agent_id: str):
+        model = self._provider_model(agent_id)
+        if model is not None:
+            await self.llm_providers.wait_for_quota(model)
+    
     async def _process_agent_request(self, agent_id: str, request_data: Dict[str, Any]):
         """Process an individual agent request"""
-        try:
-            instance_id = request_data["instance_id"]
-            message = request_data["message"]
-            session_id = request_data["session_id"]
-            context = request_data.get("context", {})
-            
-            # Update instance status
-            if instance_id in self.instances:
-                self.instances[instance_id].status = AgentStatus.BUSY
-                self.instances[instance_id].current_task = message[:100]
-                self.instances[instance_id].last_activity = datetime.utcnow()
-            
-            # Get agent configuration
-            agent_config = self.agents[agent_id]
-            
-            # Process with agent
-            start_time = asyncio.get_event_loop().time()
-            response_text = await self._execute_agent_logic(
-                agent_config, message, session_id, context
-            )
-            end_time = asyncio.get_event_loop().time()
-            response_time = end_time - start_time
-            
-            # Update metrics
-            await self._update_metrics(agent_id, response_time, success=True)
-            
-            # Update instance
-            if instance_id in self.instances:
-                self.instances[instance_id].status = AgentStatus.IDLE
-                self.instances[instance_id].current_task = None
-                self.instances[instance_id].message_count += 1
-                self.instances[instance_id].last_activity = datetime.utcnow()
-            
-            # Send response via WebSocket
-            await self.websocket_manager.send_message(session_id, {
-                "type": "agent_response",
-                "response": response_text,
-                "agent_id": agent_id,
-                "instance_id": instance_id,
-                "response_time": response_time,
-                "session_id": session_id
-            })
-            
-        except Exception as e:
-            logger.error(f"Error processing agent request for {agent_id}: {e}")
-            
-            # Update metrics for failure
-            await self._update_metrics(agent_id, 0, success=False)
+        loop = asyncio.get_event_loop()
+        started_at = loop.time()
+        latency = self._get_metrics(agent_id).latency
+        timings = RequestTimings()
+        
+        # Record how long the request sat in the queue
+        enqueued_at = request_data.get("enqueued_at")
+        if enqueued_at is not None:
+            queue_wait = max(time.time() - enqueued_at, 0.0)
+            latency.queue_wait.record(queue_wait)
+            timings.add("queue_wait", queue_wait)
+        
+        instance_id = request_data.get("instance_id")
+        with deadline_scope(request_data.get("deadline")), timings_scope(timings):
+            try:
+                message = request_data["message"]
+                session_id = request_data["session_id"]
+                context = request_data.get("context", {})
+                
+                # Drop requests whose caller already gave up while they were queued
+                try:
+                    check_deadline()
+                except DeadlineExceeded:
+                    AGENT_DEADLINE_EXCEEDED.labels(agent_id, "queued").inc()
+                    raise
+                
+                # Update instance status
+                self._mark_instance_busy(instance_id, message)
+                await self._mark_running(request_data)
+                
+                # Get agent configuration
+                agent_config = self.agents[agent_id]
+                
+                # Process with agent; internal (delegated) requests surface errors to their caller.
+                # Work still running at the deadline is cancelled so the worker is freed.
+                start_time = loop.time()
+                try:
+                    response_text = await with_deadline(self._execute_agent_logic(
+                        agent_config, message, session_id, context,
+                        raise_errors=request_data.get("internal", False),
+                        instance_id=instance_id,
+                        history_length=request_data.get("history_length")
+                    ))
+                except DeadlineExceeded:
+                    AGENT_DEADLINE_EXCEEDED.labels(agent_id, "running").inc()
+                    raise
+                end_time = loop.time()
+                response_time = end_time - start_time
+                timings.add("execution", response_time)
+                
+                # Update metrics
+                await self._update_metrics(agent_id, response_time, success=True)
+                
+                # Update instance
+                self._mark_instance_idle(instance_id)
+                
+                # Hand the result to an awaiting caller
+                await self._settle(
+                    request_data, "completed",
+                    result=response_text, response_time=response_time, timings=timings.as_dict()
+                )
+                if request_data.get("internal"):
+                    return
+                
+                # Send response via WebSocket; the payload cannot include its own delivery time
+                send_start = loop.time()
+                await self.websocket_manager.send_message(session_id, {
+                    "type": "agent_response",
+                    "response": response_text,
+                    "request_id": request_data.get("request_id"),
+                    "agent_id": agent_id,
+                    "instance_id": instance_id,
+                    "response_time": response_time,
+                    "timings": timings.as_dict(),
+                    "session_id": session_id
+                })
+                delivery = loop.time() - send_start
+                latency.delivery.record(delivery)
+                timings.add("delivery", delivery)
+                record = self.results.get(request_data.get("request_id"))
+                if record is not None:
+                    record["timings"] = timings.as_dict()
+                
+            except DeadlineExceeded as e:
+                logger.warning(f"Request for {agent_id} exceeded its deadline")
+                
+                await self._update_metrics(agent_id, loop.time() - started_at, success=False)
+                await self._settle(request_data, "expired", error=e, timings=timings.as_dict())
+                
+                # The instance is healthy; only this request ran out of time
+                self._mark_instance_idle(instance_id)
+                if not request_data.get("internal"):
+                    await self.websocket_manager.send_message(request_data["session_id"], {
+                        "type": "agent_error",
+                        "error": "Request deadline exceeded",
+                        "request_id": request_data.get("request_id"),
+                        "agent_id": agent_id,
+                        "instance_id": instance_id,
+                        "session_id": request_data["session_id"]
+                    })
+                
+            except Exception as e:
+                logger.error(f"Error processing agent request for {agent_id}: {e}")
+                
+                # Update metrics for failure with the time actually spent
+                await self._update_metrics(agent_id, loop.time() - started_at, success=False)
+                await self._settle(request_data, "failed", error=e, timings=timings.as_dict())
+                
+                # Update instance status
+                if instance_id in self.instances:
+                    self.timers.cancel(("stuck", instance_id))
+                    self.instances[instance_id].status = AgentStatus.ERROR
+                    self.instances[instance_id].error_count += 1
             
-            # Update instance status
-            if instance_id in self.instances:
-                self.instances[instance_id].status = AgentStatus.ERROR
-                self.instances[instance_id].error_count += 1
+            finally:
+                self._record_timings(latency, timings)
+    
+    @staticmethod
+    def _record_timings(latency: StageLatency, timings: RequestTimings):
+        """Fold a request's inner stages and tool calls into the agent's histograms.
+        
+        queue_wait, execution and delivery are recorded where they are measured.
+        Only tool calls that reached a handler are recorded, so clients cannot
+        create a histogram per made-up tool name.
+        """
+        for stage in ("history_fetch", "tool_resolution", "tool_calls", "generation"):
+            seconds = timings.stages.get(stage)
+            if seconds is not None:
+                getattr(latency, stage).record(seconds)
+        for call in timings.tool_calls:
+            if call["status"] not in ("skipped", "unavailable"):
+                latency.record_tool(call["tool"], call["duration"])
     
     async def _execute_agent_logic(
         self,
         agent_config: AgentConfig,
         message: str,
         session_id: str,
-        context: Dict[str, Any]
+        context: Dict[str, Any],
+        raise_errors: bool = False,
+        instance_id: Optional[str] = None,
+        history_length: Optional[int] = None
     ) -> str:
-        """Execute agent-specific logic based on agent type"""
+        """Execute agent-specific logic based on agent type.
+        
+        With an instance_id the session's warm context is reused: when
+        history_length shows this turn's message directly follows the ones
+        already in its window, the message is appended instead of the
+        history being read again.
+        """
         
         try:
-            # Get conversation history
-            conversation_history = await self.session_manager.get_conversation_history(session_id)
+            # Static material is compiled once per config and tool registry version
+            with span("tool_resolution"):
+                material = await self._get_prompt_material(agent_config)
+            warm = self._warm_context(instance_id, agent_config, material, session_id)
             
-            # Get appropriate tools for the agent
-            available_tools = await self._get_agent_tools(agent_config)
+            # Fetch history, if needed, while this turn's tool calls run
+            history_task = None
+            if warm.extends(history_length):
+                warm.append({
+                    "role": "user",
+                    "content": message,
+                    "timestamp": datetime.utcnow(),
+                    "metadata": {"agent_id": agent_config.agent_id, "instance_id": instance_id}
+                })
+            else:
+                history_task = asyncio.ensure_future(
+                    timed("history_fetch", self.session_manager.get_conversation_history(session_id))
+                )
+            try:
+                report = None
+                if context.get("tool_calls"):
+                    with span("tool_calls"):
+                        report = await self.execute_tools(context["tool_calls"])
+                if history_task is not None:
+                    warm.reset(await history_task, history_length)
+            finally:
+                if history_task is not None:
+                    history_task.cancel()
+            if instance_id in self.instances:
+                self.warm_contexts.touch(instance_id, warm.size)
             
             # Build agent context
-            agent_context = {
-                "message": message,
-                "history": conversation_history[-10:],  # Last 10 messages
-                "tools": available_tools,
-                "instructions": agent_config.instructions,
-                "capabilities": [cap.dict() for cap in agent_config.capabilities],
-                "session_id": session_id,
-                **context
-            }
+            agent_context = warm.build(message, context)
+            if report:
+                agent_context["tool_results"] = {
+                    call_id: result.dict() for call_id, result in report.results.items()
+                }
             
             # Execute based on agent type
-            if agent_config.type == AgentType.BROWSER_AGENT:
-                return await self._execute_browser_agent(agent_context)
-            elif agent_config.type == AgentType.DATA_AGENT:
-                return await self._execute_data_agent(agent_context)
-            elif agent_config.type == AgentType.WORKFLOW_AGENT:
-                return await self._execute_workflow_agent(agent_context)
-            else:
-                return await self._execute_llm_agent(agent_context)
+            with span("generation"):
+                if agent_config.type == AgentType.BROWSER_AGENT:
+                    return await self._execute_browser_agent(agent_context)
+                elif agent_config.type == AgentType.DATA_AGENT:
+                    return await self._execute_data_agent(agent_context)
+                elif agent_config.type == AgentType.WORKFLOW_AGENT:
+                    return await self._execute_workflow_agent(agent_context)
+                else:
+                    return await self._execute_llm_agent(agent_context)
                 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error executing agent logic: {e}")
+            if raise_errors:
+                raise
             return f"I apologize, but I encountered an error while processing your request: {str(e)}"
     
-    async def _get_agent_tools(self, agent_config: AgentConfig) -> List[str]:
-        """Get available tools for an agent"""
-        tools = agent_config.tools.copy()
+    def _warm_context(
+        self, instance_id: Optional[str], agent_config: AgentConfig, material: AgentPromptMaterial, session_id: str
+    ) -> WarmContext:
+        """Get the session's warm context, replacing it if the agent's material changed"""
+        instance = self.instances.get(instance_id) if instance_id else None
+        if instance is not None and instance.warm is not None and instance.warm.material is material:
+            return instance.warm
+        
+        warm = WarmContext(material, agent_config, session_id, self.history_window)
+        if instance is not None:
+            instance.warm = warm
+        return warm
+    
+    def _evict_warm_context(self, instance_id: str):
+        """Memory pressure: the instance rebuilds its context on its next turn"""
+        instance = self.instances.get(instance_id)
+        if instance is not None:
+            instance.warm = None
+    
+    async def _get_prompt_material(self, agent_config: AgentConfig) -> AgentPromptMaterial:
+        """Get an agent's static prompt material, recompiling it only when stale"""
+        toolsets = self.mcp_toolset_manager
+        if not toolsets:
+            return self.prompt_cache.get(agent_config, -1, list)
+        
+        # Pick up servers added, removed or restarted since the last build
+        await toolsets.sync()
+        return self.prompt_cache.get(
+            agent_config,
+            toolsets.registry_version,
+            lambda: [tool.to_dict() for tool in toolsets.get_tools_for_agent(agent_config.type.value)]
+        )
+    
+    def _resolve_tool(self, invocation: ToolInvocation) -> Optional[ToolRunner]:
+        """Map a tool name to a coroutine function: "browser.<action>" or an MCP tool"""
+        if invocation.tool.startswith("browser."):
+            if not self.browser_service:
+                return None
+            action = invocation.tool.split(".", 1)[1]
+            
+            async def run_browser_action(url=None, selector=None, text=None, options=None):
+                return await self.browser_service.execute_task(
+                    action, url=url, selector=selector, text=text, options=options or {}
+                )
+            return run_browser_action
         
-        # Add MCP tools if available
         if self.mcp_toolset_manager:
-            mcp_tools = self.mcp_toolset_manager.get_tools_for_agent(agent_config.type.value)
-            tools.extend([tool.name for tool in mcp_tools])
+            wrapper = self.mcp_toolset_manager.get_tool(invocation.tool)
+            if wrapper:
+                return wrapper.run_async
+        return None
+    
+    async def execute_tools(
+        self,
+        invocations: List[Union[ToolInvocation, Dict[str, Any]]],
+        max_concurrency: Optional[int] = None
+    ) -> ToolExecutionReport:
+        """Run a turn's tool calls, overlapping the ones that do not depend on each other"""
+        calls = [
+            invocation if isinstance(invocation, ToolInvocation) else ToolInvocation(**invocation)
+            for invocation in invocations
+        ]
+        for call in calls:
+            # Actions on the same browser context share a page, so they must not interleave
+            if call.tool.startswith("browser.") and not call.resource:
+                options = call.arguments.get("options") or {}
+                call.resource = f"browser:{options.get('context', 'default')}"
+        
+        # Tool names come from the request; calls no handler took are reported as unavailable
+        resolved = set()
+        
+        def resolve(invocation: ToolInvocation) -> Optional[ToolRunner]:
+            runner = self._resolve_tool(invocation)
+            if runner is not None:
+                resolved.add(invocation.call_id)
+            return runner
         
-        return tools
+        executor = ToolExecutor(resolve, max_concurrency or self.tool_concurrency)
+        report = await executor.execute(calls)
+        
+        timings = current_timings()
+        if timings is not None:
+            for result in report.results.values():
+                status = result.status
+                if status != "skipped" and result.call_id not in resolved:
+                    status = "unavailable"
+                timings.add_tool_call(result.call_id, result.tool, status, result.duration)
+        
+        if report.failures:
+            logger.warning(f"{len(report.failures)} of {len(calls)} tool calls did not succeed")
+        return report
+    
+    async def run_step(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run an agent step, offloading it to the process pool if declared @cpu_bound"""
+        if self.cpu_executor and is_cpu_bound(func):
+            return await self.cpu_executor.run(func, *args, **kwargs)
+        
+        result = func(*args, **kwargs)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+    
+    def _completion_request(self, context: Dict[str, Any]) -> CompletionRequest:
+        """Build the model call for an agent turn from its context"""
+        messages = context.get("messages")
+        if messages is None:
+            messages = [
+                {"role": "user" if entry.get("role") == "user" else "assistant", "content": entry.get("content", "")}
+                for entry in context["history"]
+            ]
+        # The queued message is normally already the last history entry
+        if not messages or messages[-1] != {"role": "user", "content": context["message"]}:
+            messages.append({"role": "user", "content": context["message"]})
+        return CompletionRequest(
+            model=context["model"],
+            messages=messages,
+            system=context.get("system_prompt", context["instructions"]),
+            max_tokens=context["max_tokens"],
+            temperature=context["temperature"]
+        )
     
     async def _execute_llm_agent(self, context: Dict[str, Any]) -> str:
         """Execute LLM agent logic"""
+        if self.llm_providers and self.llm_providers.for_model(context["model"]):
+            result = await self.llm_providers.complete(self._completion_request(context))
+            return result.text
+        
         # Simulate LLM processing
         await asyncio.sleep(0.1)
         
         message = context["message"]
         tools = context["tools"]
         
+        tool_results = context.get("tool_results")
+        if tool_results:
+            succeeded = sum(1 for result in tool_results.values() if result["status"] == "success")
+            return f"[LLM Agent] I ran {len(tool_results)} tool calls for your request: '{message}' ({succeeded} succeeded)."
+        
         return f"[LLM Agent] I understand your request: '{message}'. I have access to these tools: {', '.join(tools[:5])}{'...' if len(tools) > 5 else ''}. How can I help you further?"
     
     async def _execute_browser_agent(self, context: Dict[str, Any]) -> str:
         """Execute browser agent logic"""
         message = context["message"]
         
+        # Process extracted page HTML off the event loop
+        if context.get("html"):
+            page_text = await self.run_step(html_to_text, context["html"])
+            return f"[Browser Agent] Extracted {len(page_text)} characters of page text for your request: '{message}'. Preview: {page_text[:200]}"
+        
         # Check if this is a browser-related request
         browser_keywords = ["navigate", "click", "screenshot", "scrape", "website", "page"]
         if any(keyword in message.lower() for keyword in browser_keywords):
@@ -439,6 +868,11 @@ class AgentManager:
         """Execute data analysis agent logic"""
         message = context["message"]
         
+        # Parse attached data off the event loop
+        if context.get("data"):
+            summary = await self.run_step(summarize_table, context["data"], context.get("delimiter", ","))
+            return f"[Data Agent] Parsed {summary['rows']} rows across {len(summary['columns'])} columns for your request: '{message}'. Column summary: {summary['columns']}"
+        
         # Check if this is a data-related request
         data_keywords = ["analyze", "data", "chart", "graph", "statistics", "csv", "excel"]
         if any(keyword in message.lower() for keyword in data_keywords):
@@ -450,7 +884,237 @@ class AgentManager:
         """Execute workflow orchestration agent logic"""
         message = context["message"]
         
-        return f"[Workflow Agent] I can help orchestrate complex tasks involving multiple agents. Your request: '{message}'. Let me break this down into manageable steps."
+        # Delegated steps never come back to the orchestrator
+        async def route(step: str) -> str:
+            agent_id = await self._select_optimal_agent("default", [], step)
+            return "general_assistant" if self.agents[agent_id].type == AgentType.WORKFLOW_AGENT else agent_id
+        
+        plan = await plan_workflow(message, context["session_id"], route, context.get("workflow"))
+        for node in plan.nodes:
+            node_agent = await self._ensure_agent(node.agent_id)
+            if not node_agent:
+                raise ValueError(f"Workflow node {node.node_id} targets unknown agent {node.agent_id}")
+            if node_agent.type == AgentType.WORKFLOW_AGENT:
+                # Its worker would wait on itself
+                raise ValueError(f"Workflow node {node.node_id} cannot target workflow agent {node.agent_id}")
+        
+        report = await self.workflow_engine.run(plan, context["session_id"])
+        
+        lines = []
+        for node in plan.nodes:
+            result = report.results[node.node_id]
+            outcome = result.result if result.status == "success" else f"{result.status}: {result.error}"
+            lines.append(f"- {node.node_id} ({node.agent_id}): {outcome}")
+        succeeded = len(plan.nodes) - len(report.failures)
+        return f"[Workflow Agent] Completed {succeeded}/{len(plan.nodes)} steps for your request: '{message}'.\n" + "\n".join(lines)
+    
+    async def dispatch_request(
+        self,
+        agent_id: str,
+        message: str,
+        session_id: str,
+        context: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> str:
+        """Queue an internal request for another agent and wait for its response text.
+        
+        The response is returned to the caller instead of being sent to the
+        session. With a shared queue backend a worker on any replica may
+        take it; the result_relay brings its outcome back to this one.
+        """
+        agent_config = await self._ensure_agent(agent_id)
+        if not agent_config:
+            raise ValueError(f"Agent {agent_id} not found")
+        
+        request_id = str(uuid.uuid4())
+        future = asyncio.get_event_loop().create_future()
+        self._pending_results[request_id] = future
+        try:
+            # The delegated request inherits the caller's deadline if that is sooner
+            with deadline_scope(time.time() + (timeout or agent_config.timeout)) as deadline:
+                request_data = {
+                    "request_id": request_id,
+                    "instance_id": None,
+                    "message": message,
+                    "session_id": session_id,
+                    "context": context or {},
+                    "tools": [],
+                    "internal": True,
+                    "deadline": deadline,
+                    "enqueued_at": time.time()
+                }
+                if self.result_relay:
+                    request_data["reply_to"] = self.result_relay.replica_id
+                await self.agent_queues[agent_id].put(request_data)
+                return await with_deadline(future)
+        finally:
+            self._pending_results.pop(request_id, None)
+    
+    def _resolve_pending(
+        self,
+        request_data: Dict[str, Any],
+        status: str,
+        result: Any = None,
+        error: Optional[Exception] = None,
+        response_time: Optional[float] = None,
+        timings: Optional[Dict[str, Any]] = None
+    ):
+        """Record a request's outcome and complete the future of anyone waiting on it.
+        
+        Internal callers get the response text or the exception; client
+        requests resolve to their result record, which is kept for result_ttl.
+        """
+        request_id = request_data.get("request_id")
+        record = None if request_data.get("internal") else self.results.get(request_id)
+        if record is not None:
+            record.update({
+                "status": status,
+                "response": result,
+                "error": str(error) if error is not None else None,
+                "response_time": response_time,
+                "timings": timings,
+                "completed_at": time.time()
+            })
+            self.timers.schedule(("result", request_id), self.result_ttl, self._expire_result, request_id)
+            result, error = record, None
+            
+            # Retries of a client request id get its result; other duplicates only match while in flight
+            dedup = self._dedup_requests.get(request_id)
+            if dedup and (status != "completed" or not dedup[0].startswith("id:")):
+                self._release_dedup(request_id)
+        
+        future = self._pending_results.pop(request_id, None)
+        if not future or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    async def _mark_running(self, request_data: Dict[str, Any]):
+        """Show a client request as running, on the replica that accepted it"""
+        if request_data.get("internal"):
+            return
+        reply_to = request_data.get("reply_to")
+        if self.result_relay and self.result_relay.is_remote(reply_to):
+            await self.result_relay.publish(reply_to, {"request_id": request_data.get("request_id"), "status": "running"})
+            return
+        record = self.results.get(request_data.get("request_id"))
+        if record and record["status"] == "queued":
+            record["status"] = "running"
+    
+    async def _settle(
+        self,
+        request_data: Dict[str, Any],
+        status: str,
+        result: Any = None,
+        error: Optional[Exception] = None,
+        response_time: Optional[float] = None,
+        timings: Optional[Dict[str, Any]] = None
+    ):
+        """Resolve a request's outcome here, or relay it to the replica that accepted the request"""
+        reply_to = request_data.get("reply_to")
+        if self.result_relay and self.result_relay.is_remote(reply_to):
+            await self.result_relay.publish(reply_to, {
+                "request_id": request_data.get("request_id"),
+                "internal": request_data.get("internal", False),
+                "status": status,
+                "result": result,
+                "error": str(error) if error is not None else None,
+                "response_time": response_time,
+                "timings": timings
+            })
+            return
+        self._resolve_pending(
+            request_data, status, result=result, error=error, response_time=response_time, timings=timings
+        )
+    
+    async def _apply_remote_outcome(self, outcome: Dict[str, Any]):
+        """Apply the outcome of a request accepted here and processed on another replica"""
+        request_data = {"request_id": outcome["request_id"], "internal": outcome.get("internal", False)}
+        if outcome["status"] == "running":
+            await self._mark_running(request_data)
+            return
+        error = None
+        if outcome.get("error") is not None:
+            # Internal callers tell an expired delegation from a failed one by its type
+            error_type = DeadlineExceeded if outcome["status"] == "expired" else RuntimeError
+            error = error_type(outcome["error"])
+        self._resolve_pending(
+            request_data, outcome["status"],
+            result=outcome.get("result"),
+            error=error,
+            response_time=outcome.get("response_time"),
+            timings=outcome.get("timings")
+        )
+    
+    async def wait_for_result(self, request_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait up to timeout seconds for a client request to finish.
+        
+        Returns the request's result record (still "queued" or "running" if
+        the wait timed out), or None for unknown or expired request ids.
+        Records live on the replica that accepted the request; with a shared
+        queue backend the result_relay brings back outcomes of requests
+        processed elsewhere, so poll the replica that returned the request_id.
+        """
+        record = self.results.get(request_id)
+        if record is None or record["status"] not in ("queued", "running"):
+            return record
+        
+        future = self._pending_results.get(request_id)
+        if future is None:
+            future = self._pending_results[request_id] = asyncio.get_event_loop().create_future()
+        try:
+            # Shielded so one waiter timing out does not cancel the others
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return self.results.get(request_id)
+    
+    def _expire_result(self, request_id: str):
+        """Timer callback: drop a result record nobody collected"""
+        self.results.pop(request_id, None)
+        self._release_dedup(request_id)
+        future = self._pending_results.pop(request_id, None)
+        if future and not future.done():
+            future.cancel()
+    
+    def _dedup_key(
+        self,
+        message: str,
+        session_id: Optional[str],
+        agent_type: str,
+        agent_id: Optional[str],
+        tools: Optional[List[str]],
+        context: Optional[Dict],
+        client_request_id: Optional[str]
+    ) -> Optional[str]:
+        """Idempotency key of a submission: the client's request id, else a hash of its content.
+        
+        Only submissions to an existing session are deduplicated: there a
+        resend is a duplicate, while without one a client-chosen id or the
+        same text may well come from an unrelated caller.
+        """
+        if not session_id:
+            return None
+        if client_request_id:
+            return f"id:{session_id}:{client_request_id}"
+        if self.dedup_window <= 0:
+            return None
+        content = json.dumps(
+            [message, agent_type, agent_id, sorted(tools or []), context or {}], sort_keys=True, default=str
+        )
+        return f"hash:{session_id}:{hashlib.sha256(content.encode()).hexdigest()}"
+    
+    def _drop_dedup(self, key: str, submitted: asyncio.Future):
+        """Forget key unless it has since been taken by a newer submission"""
+        if self._inflight.get(key) is submitted:
+            del self._inflight[key]
+        self.timers.cancel(("dedup", key))
+    
+    def _release_dedup(self, request_id: str):
+        dedup = self._dedup_requests.pop(request_id, None)
+        if dedup:
+            self._drop_dedup(*dedup)
     
     async def process_message(
         self,
@@ -458,9 +1122,40 @@ class AgentManager:
         session_id: Optional[str] = None,
         agent_type: str = "default",
         tools: List[str] = None,
-        context: Dict = None
+        context: Dict = None,
+        agent_id: Optional[str] = None,
+        client_request_id: Optional[str] = None
     ) -> AgentResponse:
-        """Process a message with enhanced agent selection and management"""
+        """Process a message with enhanced agent selection and management.
+        
+        agent_id targets a specific (e.g. custom) agent instead of letting
+        the manager pick one of the built-in agents.
+        
+        A submission repeating one still in flight (same client_request_id,
+        or the same content to the same session within dedup_window) is not
+        queued again: it returns the original's queued response, so every
+        caller waits on the one result.
+        """
+        
+        dedup_key = self._dedup_key(message, session_id, agent_type, agent_id, tools, context, client_request_id)
+        submitted = None
+        while dedup_key is not None:
+            original = self._inflight.get(dedup_key)
+            if original is None:
+                submitted = self._inflight[dedup_key] = asyncio.get_event_loop().create_future()
+                break
+            try:
+                # Shielded so a duplicate caller going away does not cancel the original's submission
+                queued = await asyncio.shield(original)
+            except asyncio.CancelledError:
+                if original.cancelled():
+                    # The original caller went away before queueing; submit in its place
+                    continue
+                raise
+            AGENT_DEDUPLICATED.labels(queued.agent_id, dedup_key.split(":", 1)[0]).inc()
+            record = self.results.get(queued.request_id)
+            status = record["status"] if record else queued.metadata["status"]
+            return queued.copy(update={"metadata": {**queued.metadata, "status": status, "deduplicated": True}})
         
         try:
             # Create session if not provided
@@ -468,8 +1163,9 @@ class AgentManager:
                 session_id = await self.session_manager.create_session()
             
             # Select appropriate agent
-            agent_id = await self._select_optimal_agent(agent_type, tools or [], message)
-            agent_config = self.agents.get(agent_id)
+            if not agent_id:
+                agent_id = await self._select_optimal_agent(agent_type, tools or [], message)
+            agent_config = await self._ensure_agent(agent_id)
             
             if not agent_config:
                 raise ValueError(f"Agent {agent_id} not found")
@@ -478,27 +1174,61 @@ class AgentManager:
             instance_id = await self._get_or_create_instance(agent_id, session_id)
             
             # Add message to conversation history
-            await self.session_manager.add_message(
+            history_length = await self.session_manager.add_message(
                 session_id, "user", message, {"agent_id": agent_id, "instance_id": instance_id}
             )
             
             # Queue the request for processing
+            request_id = str(uuid.uuid4())
             request_data = {
+                "request_id": request_id,
                 "instance_id": instance_id,
                 "message": message,
                 "session_id": session_id,
                 "context": context or {},
-                "tools": tools or []
+                "tools": tools or [],
+                # Lets the worker tell whether its warm history window is still current
+                "history_length": history_length
+            }
+            if self.result_relay:
+                # Workers on other replicas send the outcome back here, where the record lives
+                request_data["reply_to"] = self.result_relay.replica_id
+            
+            # The agent's timeout bounds the whole request, unless the caller's deadline is sooner
+            with deadline_scope(time.time() + agent_config.timeout) as deadline:
+                request_data["deadline"] = deadline
+            
+            # Track the outcome so the caller can wait for or poll it
+            self.results[request_id] = {
+                "request_id": request_id,
+                "status": "queued",
+                "agent_id": agent_id,
+                "session_id": session_id,
+                "response": None,
+                "error": None
             }
+            self.timers.schedule(
+                ("result", request_id), agent_config.timeout + self.result_ttl, self._expire_result, request_id
+            )
+            if submitted is not None:
+                self._dedup_requests[request_id] = (dedup_key, submitted)
             
-            await self.agent_queues[agent_id].put(request_data)
+            request_data["enqueued_at"] = time.time()
+            self._touch_custom_agent(agent_id)
+            try:
+                await self.agent_queues[agent_id].put(request_data)
+            except Exception:
+                self._expire_result(request_id)
+                self.timers.cancel(("result", request_id))
+                raise
             
-            # Return immediate response (actual response will come via WebSocket)
-            return AgentResponse(
+            # Return immediate response (actual response will come via WebSocket or wait_for_result)
+            queued = AgentResponse(
                 response="Request queued for processing. You'll receive the response shortly.",
                 session_id=session_id,
                 agent_id=agent_id,
                 instance_id=instance_id,
+                request_id=request_id,
                 response_time=0.0,
                 metadata={
                     "agent_name": agent_config.name,
@@ -506,10 +1236,27 @@ class AgentManager:
                     "status": "queued"
                 }
             )
+            if submitted is not None:
+                if dedup_key.startswith("hash:"):
+                    self.timers.schedule(
+                        ("dedup", dedup_key), self.dedup_window, self._drop_dedup, dedup_key, submitted
+                    )
+                submitted.set_result(queued)
+            return queued
             
         except Exception as e:
             logger.error(f"Error processing message: {e}")
+            if submitted is not None:
+                self._drop_dedup(dedup_key, submitted)
+                submitted.set_exception(e)
+                # Mark the exception retrieved in case no duplicate is waiting on it
+                submitted.exception()
             raise
+        finally:
+            if submitted is not None and not submitted.done():
+                # Cancelled before queueing: release the key so duplicates and retries are not left waiting
+                self._drop_dedup(dedup_key, submitted)
+                submitted.cancel()
     
     async def _select_optimal_agent(self, agent_type: str, tools: List[str], message: str) -> str:
         """Select the most appropriate agent using enhanced logic"""
@@ -567,17 +1314,23 @@ class AgentManager:
         
         self.instances[instance_id] = instance
         self.session_agents[session_id] = instance_id
+        self.timers.schedule(("expire", instance_id), self.instance_ttl, self._expire_instance, instance_id)
         
         logger.info(f"Created new agent instance: {instance_id} for agent {agent_id}")
         return instance_id
     
+    def _get_metrics(self, agent_id: str) -> AgentMetrics:
+        """Get or create the metrics record for an agent"""
+        metrics = self.metrics.get(agent_id)
+        if metrics is None:
+            metrics = self.metrics[agent_id] = AgentMetrics(agent_id=agent_id)
+        return metrics
+    
     async def _update_metrics(self, agent_id: str, response_time: float, success: bool):
         """Update agent performance metrics"""
-        if agent_id not in self.metrics:
-            self.metrics[agent_id] = AgentMetrics(agent_id=agent_id)
-        
-        metrics = self.metrics[agent_id]
+        metrics = self._get_metrics(agent_id)
         metrics.total_requests += 1
+        metrics.latency.execution.record(response_time)
         
         if success:
             metrics.successful_requests += 1
@@ -587,62 +1340,198 @@ class AgentManager:
         else:
             metrics.failed_requests += 1
     
+    def _mark_instance_busy(self, instance_id: str, message: str):
+        """Mark an instance BUSY and arm its stuck-task timer"""
+        instance = self.instances.get(instance_id)
+        if not instance:
+            return
+        
+        instance.status = AgentStatus.BUSY
+        instance.current_task = message[:100]
+        instance.last_activity = datetime.utcnow()
+        
+        self.timers.schedule(("stuck", instance_id), self.stuck_task_timeout, self._reset_stuck_instance, instance_id)
+        self.timers.schedule(("expire", instance_id), self.instance_ttl, self._expire_instance, instance_id)
+    
+    def _mark_instance_idle(self, instance_id: str):
+        """Mark an instance IDLE, disarm its stuck-task timer and push back its expiry"""
+        instance = self.instances.get(instance_id)
+        if not instance:
+            return
+        
+        instance.status = AgentStatus.IDLE
+        instance.current_task = None
+        instance.message_count += 1
+        instance.last_activity = datetime.utcnow()
+        
+        self.timers.cancel(("stuck", instance_id))
+        self.timers.schedule(("expire", instance_id), self.instance_ttl, self._expire_instance, instance_id)
+    
+    def _reset_stuck_instance(self, instance_id: str):
+        """Timer callback: an instance stayed BUSY past the stuck-task timeout"""
+        instance = self.instances.get(instance_id)
+        if instance and instance.status == AgentStatus.BUSY:
+            logger.warning(f"Instance {instance_id} appears stuck, resetting")
+            instance.status = AgentStatus.ERROR
+            instance.current_task = None
+    
+    def _expire_instance(self, instance_id: str):
+        """Timer callback: an instance saw no activity for the instance TTL"""
+        instance = self.instances.pop(instance_id, None)
+        if not instance:
+            return
+        
+        self.timers.cancel(("stuck", instance_id))
+        self.warm_contexts.discard(instance_id)
+        if self.session_agents.get(instance.session_id) == instance_id:
+            del self.session_agents[instance.session_id]
+        logger.info(f"Cleaned up expired instance: {instance_id}")
+    
     async def _monitor_agents(self):
-        """Monitor agent health and performance"""
+        """Periodically log agent performance"""
         while True:
             try:
-                await asyncio.sleep(60)  # Check every minute
-                
-                current_time = datetime.utcnow()
-                
-                # Check for stuck instances
-                for instance_id, instance in list(self.instances.items()):
-                    if instance.status == AgentStatus.BUSY:
-                        time_since_activity = (current_time - instance.last_activity).total_seconds()
-                        if time_since_activity > 300:  # 5 minutes timeout
-                            logger.warning(f"Instance {instance_id} appears stuck, resetting")
-                            instance.status = AgentStatus.ERROR
-                            instance.current_task = None
+                await asyncio.sleep(60)  # Log every minute
                 
                 # Log metrics
                 for agent_id, metrics in self.metrics.items():
                     if metrics.total_requests > 0:
                         success_rate = (metrics.successful_requests / metrics.total_requests) * 100
-                        logger.info(f"Agent {agent_id}: {metrics.total_requests} requests, {success_rate:.1f}% success rate, {metrics.average_response_time:.2f}s avg response")
+                        p95 = metrics.latency.execution.percentile(95)
+                        logger.info(f"Agent {agent_id}: {metrics.total_requests} requests, {success_rate:.1f}% success rate, {metrics.average_response_time:.2f}s avg response, {p95:.2f}s p95")
                 
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Error in agent monitoring: {e}")
     
-    async def _cleanup_expired_instances(self):
-        """Clean up expired agent instances"""
-        while True:
-            try:
-                await asyncio.sleep(300)  # Check every 5 minutes
-                
-                current_time = datetime.utcnow()
-                expired_instances = []
-                
-                for instance_id, instance in self.instances.items():
-                    time_since_activity = (current_time - instance.last_activity).total_seconds()
-                    if time_since_activity > 3600:  # 1 hour timeout
-                        expired_instances.append(instance_id)
-                
-                # Remove expired instances
-                for instance_id in expired_instances:
-                    instance = self.instances[instance_id]
-                    if instance.session_id in self.session_agents:
-                        del self.session_agents[instance.session_id]
-                    del self.instances[instance_id]
-                    logger.info(f"Cleaned up expired instance: {instance_id}")
-                
-            except Exception as e:
-                logger.error(f"Error in instance cleanup: {e}")
-    
     async def _load_custom_agents(self):
-        """Load custom agent configurations from database"""
-        # This would load custom agents from configuration
-        # For now, we'll use the default agents
-        pass
+        """Start the custom agent registry; agents themselves are loaded on first use"""
+        await self.agent_registry.start()
+    
+    async def _ensure_agent(self, agent_id: str) -> Optional[AgentConfig]:
+        """Get an agent's config, loading a custom agent from the registry on first use"""
+        agent_config = self.agents.get(agent_id)
+        if agent_config:
+            self._touch_custom_agent(agent_id)
+            return agent_config
+        
+        stored = await self.agent_registry.load(agent_id)
+        if not stored:
+            return None
+        
+        # Another request may have loaded it while we were reading
+        if agent_id not in self.agents:
+            await self._activate_custom_agent(AgentConfig(**stored))
+        return self.agents.get(agent_id)
+    
+    async def _activate_custom_agent(self, config: AgentConfig):
+        """Register a custom agent in this process and start its workers"""
+        agent_id = config.agent_id
+        self.agents[agent_id] = config
+        if agent_id in self.custom_agents:
+            # Deleted and re-created before its old workers were unloaded
+            self._touch_custom_agent(agent_id)
+            return
+        
+        self.custom_agents.add(agent_id)
+        self._get_metrics(agent_id)
+        queue = self.agent_queues[agent_id] = self.queue_factory(agent_id)
+        await queue.start()
+        self.scale_workers(agent_id, self.autoscaler.policy.min_workers if self.autoscaler else 1)
+        self._touch_custom_agent(agent_id)
+        logger.info(f"Loaded custom agent: {agent_id}")
+    
+    def _touch_custom_agent(self, agent_id: str):
+        """Push back a loaded custom agent's idle unload"""
+        # Without the registry an unloaded agent could not be loaded again
+        if agent_id in self.custom_agents and self.agent_registry.available:
+            self.timers.schedule(("idle_agent", agent_id), self.custom_agent_idle_timeout, self._unload_custom_agent, agent_id)
+    
+    async def _unload_custom_agent(self, agent_id: str):
+        """Timer callback: stop an idle custom agent's workers and drop it from this process"""
+        if agent_id not in self.custom_agents:
+            return
+        
+        queue = self.agent_queues.get(agent_id)
+        busy = any(task in self._busy_tasks for task in self.worker_tasks.get(agent_id, []))
+        if busy or (queue and queue.qsize()):
+            # Still has work; check again later
+            self._touch_custom_agent(agent_id)
+            return
+        
+        self.timers.cancel(("idle_agent", agent_id))
+        self.custom_agents.discard(agent_id)
+        self.agents.pop(agent_id, None)
+        self.metrics.pop(agent_id, None)
+        self.prompt_cache.invalidate(agent_id)
+        
+        # No worker is busy, so every one of them is cancelled right away.
+        # Everything is detached before awaiting so a reload can start afresh.
+        self.scale_workers(agent_id, 0)
+        tasks = self.worker_tasks.pop(agent_id, [])
+        self._retiring.pop(agent_id, None)
+        self.busy_workers.pop(agent_id, None)
+        if self.autoscaler:
+            self.autoscaler.state.pop(agent_id, None)
+        queue = self.agent_queues.pop(agent_id, None)
+        
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if queue:
+            await queue.close()
+        logger.info(f"Unloaded idle custom agent: {agent_id}")
+    
+    async def _on_agent_config_change(self, agent_id: str):
+        """Registry callback: reload or drop a custom agent whose stored config changed"""
+        if agent_id not in self.custom_agents:
+            # Not loaded here; the new config is read on first use
+            return
+        
+        stored = await self.agent_registry.load(agent_id)
+        if stored is None:
+            # Deleted: new requests fail to find it and the workers go once idle
+            self.agents.pop(agent_id, None)
+            await self._unload_custom_agent(agent_id)
+            return
+        
+        # Workers read the config per request, so the next one picks this up
+        self.agents[agent_id] = AgentConfig(**stored)
+        logger.info(f"Reloaded custom agent config: {agent_id}")
+    
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Collect agent queue, worker and latency metrics for /metrics"""
+        queue_depth = MetricFamily("agent_queue_depth", "gauge", "Requests waiting in each agent queue")
+        workers = MetricFamily("agent_workers", "gauge", "Worker tasks per agent")
+        busy = MetricFamily("agent_workers_busy", "gauge", "Worker tasks currently processing a request")
+        requests = MetricFamily("agent_requests_total", "counter", "Agent requests processed by outcome")
+        instances = MetricFamily("agent_instances", "gauge", "Live agent instances")
+        latency = summary_family("agent_stage_latency_seconds", "Agent request latency by stage over a sliding window")
+        tool_latency = summary_family("agent_tool_latency_seconds", "Agent tool call latency over a sliding window")
+        
+        for agent_id, queue in self.agent_queues.items():
+            labels = {"agent_id": agent_id}
+            queue_depth.add(labels, queue.qsize())
+            workers.add(labels, self.worker_count(agent_id))
+            busy.add(labels, self.busy_workers.get(agent_id, 0))
+        
+        for agent_id, metrics in self.metrics.items():
+            requests.add({"agent_id": agent_id, "outcome": "success"}, metrics.successful_requests)
+            requests.add({"agent_id": agent_id, "outcome": "failure"}, metrics.failed_requests)
+            for stage, summary in metrics.latency.summary().items():
+                add_latency_summary(latency, {"agent_id": agent_id, "stage": stage}, summary)
+            for tool, summary in metrics.latency.tool_summary().items():
+                add_latency_summary(tool_latency, {"agent_id": agent_id, "tool": tool}, summary)
+        
+        instances.add({}, len(self.instances))
+        families = [queue_depth, workers, busy, requests, instances, latency, tool_latency]
+        
+        if self.cpu_executor:
+            cpu = MetricFamily("cpu_executor_tasks", "gauge", "CPU offload calls by state")
+            cpu.add({"state": "running"}, self.cpu_executor.running)
+            cpu.add({"state": "pending"}, self.cpu_executor.pending)
+            families.append(cpu)
+        return families
     
     async def get_agent_info(self, agent_id: str) -> Optional[AgentConfig]:
         """Get information about a specific agent"""
@@ -680,21 +1569,28 @@ class AgentManager:
             "total_requests": metrics.total_requests,
             "success_rate": (metrics.successful_requests / metrics.total_requests * 100) if metrics.total_requests > 0 else 0,
             "average_response_time": metrics.average_response_time,
+            "latency": metrics.latency.summary(),
             "capabilities": [cap.dict() for cap in agent_config.capabilities],
             "tools": agent_config.tools
         }
     
     async def create_custom_agent(self, config: AgentConfig) -> str:
-        """Create a custom agent"""
+        """Create a custom agent.
+        
+        With a database the config is persisted and every replica loads the
+        agent on first use; otherwise it only lives in this process.
+        """
         try:
             # Validate configuration
-            if config.agent_id in self.agents:
+            if config.agent_id in self.agents and config.agent_id not in self.custom_agents:
                 raise ValueError(f"Agent {config.agent_id} already exists")
             
-            # Add to registry
-            self.agents[config.agent_id] = config
-            self.metrics[config.agent_id] = AgentMetrics(agent_id=config.agent_id)
-            self.agent_queues[config.agent_id] = asyncio.Queue()
+            if self.agent_registry.available:
+                await self.agent_registry.save(config.dict(), create=True)
+            elif config.agent_id in self.agents:
+                raise ValueError(f"Agent {config.agent_id} already exists")
+            else:
+                await self._activate_custom_agent(config)
             
             logger.info(f"Created custom agent: {config.agent_id}")
             return config.agent_id
@@ -703,16 +1599,68 @@ class AgentManager:
             logger.error(f"Failed to create custom agent: {e}")
             raise
     
+    async def update_custom_agent(self, config: AgentConfig) -> str:
+        """Replace a custom agent's config; running replicas pick it up without a restart"""
+        if config.agent_id in self.agents and config.agent_id not in self.custom_agents:
+            raise PermissionError(f"Built-in agent {config.agent_id} cannot be modified")
+        if not self.agent_registry.available:
+            raise RuntimeError("Custom agent updates require a database")
+        if await self.agent_registry.load(config.agent_id) is None:
+            raise ValueError(f"Agent {config.agent_id} not found")
+        
+        await self.agent_registry.save(config.dict())
+        logger.info(f"Updated custom agent: {config.agent_id}")
+        return config.agent_id
+    
+    async def delete_custom_agent(self, agent_id: str) -> bool:
+        """Delete a custom agent on every replica"""
+        if agent_id in self.agents and agent_id not in self.custom_agents:
+            raise PermissionError(f"Built-in agent {agent_id} cannot be deleted")
+        if not self.agent_registry.available:
+            if agent_id not in self.custom_agents:
+                return False
+            self.agents.pop(agent_id, None)
+            await self._unload_custom_agent(agent_id)
+            return True
+        
+        deleted = await self.agent_registry.delete(agent_id)
+        if deleted:
+            logger.info(f"Deleted custom agent: {agent_id}")
+        return deleted
+    
     async def cleanup(self):
         """Cleanup all agent resources"""
         try:
-            # Stop all worker tasks
-            for task in self.worker_tasks.values():
+            # Stop timers, monitoring, config change notifications and relayed outcomes
+            await self.timers.stop()
+            await self.agent_registry.stop()
+            if self.result_relay:
+                await self.result_relay.stop()
+            if self.monitor_task:
+                self.monitor_task.cancel()
+            
+            # Stop scaling, then all worker tasks
+            if self.autoscaler:
+                await self.autoscaler.stop()
+            tasks = [task for pool in self.worker_tasks.values() for task in pool]
+            for task in tasks:
                 task.cancel()
             
             # Wait for tasks to complete
-            if self.worker_tasks:
-                await asyncio.gather(*self.worker_tasks.values(), return_exceptions=True)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            
+            # Release queue backends
+            for queue in self.agent_queues.values():
+                await queue.close()
+            
+            # Stop the CPU offload pool
+            if self.cpu_executor:
+                await self.cpu_executor.shutdown()
+            
+            # Close pooled provider connections
+            if self.llm_providers:
+                await self.llm_providers.close()
             
             logger.info("Advanced Agent Manager cleanup complete")
         except Exception as e:
@@ -0,0 +1,254 @@
+"""
+Agent Queue Backends
+In-process asyncio queues and Redis Streams consumer-group queues for agent requests
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (request_data, receipt) - the receipt is passed back to ack()
+QueuedRequest = Tuple[Dict[str, Any], Any]
+
+
+class AgentQueue:
+    """Interface for agent request queues"""
+
+    async def start(self):
+        """Prepare the queue for use"""
+
+    async def put(self, request_data: Dict[str, Any]):
+        """Enqueue a request"""
+        raise NotImplementedError
+
+    async def get(self) -> QueuedRequest:
+        """Wait for the next request and its delivery receipt"""
+        raise NotImplementedError
+
+    async def ack(self, receipt: Any):
+        """Acknowledge that a delivered request has been processed"""
+        raise NotImplementedError
+
+    def qsize(self) -> int:
+        """Get the (possibly approximate) number of waiting requests"""
+        raise NotImplementedError
+
+    async def close(self):
+        """Release queue resources"""
+
+
+class LocalAgentQueue(AgentQueue):
+    """In-process queue; requests are lost on restart and not shared across replicas"""
+
+    def __init__(self, maxsize: int = 0):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def put(self, request_data: Dict[str, Any]):
+        await self.queue.put(request_data)
+
+    async def get(self) -> QueuedRequest:
+        return await self.queue.get(), None
+
+    async def ack(self, receipt: Any):
+        self.queue.task_done()
+
+    def qsize(self) -> int:
+        return self.queue.qsize()
+
+
+class RedisStreamQueue(AgentQueue):
+    """Agent queue on a Redis Stream shared by every backend replica.
+
+    All replicas join one consumer group per agent, so any replica can enqueue
+    and any replica's workers can consume. Entries stay pending until acked;
+    a replica keeps its in-flight entries alive by re-claiming them, and entries
+    whose consumer stopped doing so (e.g. it died) are taken over by others
+    once idle for claim_idle_ms. Each process joins under its own consumer
+    name, so consumers left with nothing pending and idle for
+    consumer_idle_ms are deleted from the group.
+    """
+
+    def __init__(
+        self,
+        redis: Any,
+        agent_id: str,
+        consumer: str,
+        group: str = "agent-workers",
+        stream_prefix: str = "agent_queue:",
+        claim_idle_ms: int = 30000,
+        block_ms: int = 5000,
+        maxlen: int = 100000,
+        consumer_idle_ms: Optional[int] = None
+    ):
+        self.redis = redis
+        self.agent_id = agent_id
+        self.stream = f"{stream_prefix}{agent_id}"
+        self.group = group
+        self.consumer = consumer
+        self.claim_idle_ms = claim_idle_ms
+        # Live consumers poll every block_ms and heartbeat what they own, so this is well past any of them
+        self.consumer_idle_ms = consumer_idle_ms or 10 * claim_idle_ms
+        self.block_ms = block_ms
+        self.maxlen = maxlen
+
+        self._reclaimed: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        # Entries this consumer owns: being processed or reclaimed and waiting in _reclaimed
+        self._in_flight: Set[str] = set()
+        self._depth = 0
+        self._maintenance_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Create the consumer group and start reclaim/heartbeat maintenance"""
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as e:
+            # The group already exists when another replica created it first
+            if "BUSYGROUP" not in str(e):
+                raise
+        await self._refresh_depth()
+        if not self._maintenance_task:
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+
+    async def put(self, request_data: Dict[str, Any]):
+        await self.redis.xadd(
+            self.stream,
+            {"payload": json.dumps(request_data, default=str)},
+            maxlen=self.maxlen,
+            approximate=True
+        )
+        self._depth += 1
+
+    async def get(self) -> QueuedRequest:
+        while True:
+            if self._reclaimed:
+                entry_id, request_data = self._reclaimed.popleft()
+                return request_data, entry_id
+
+            response = await self.redis.xreadgroup(
+                self.group, self.consumer, {self.stream: ">"}, count=1, block=self.block_ms
+            )
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    entry_id = self._decode(entry_id)
+                    request_data = self._parse(entry_id, fields)
+                    if request_data is None:
+                        await self.ack(entry_id)
+                        continue
+                    self._in_flight.add(entry_id)
+                    return request_data, entry_id
+
+    async def ack(self, receipt: Any):
+        self._in_flight.discard(receipt)
+        # Acked entries are deleted so XLEN tracks waiting + in-flight entries
+        await self.redis.xack(self.stream, self.group, receipt)
+        await self.redis.xdel(self.stream, receipt)
+        self._depth = max(self._depth - 1, 0)
+
+    def qsize(self) -> int:
+        return self._depth
+
+    async def close(self):
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+            await asyncio.gather(self._maintenance_task, return_exceptions=True)
+            self._maintenance_task = None
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        return value.decode() if isinstance(value, bytes) else value
+
+    def _parse(self, entry_id: str, fields: Optional[Dict[Any, Any]]) -> Optional[Dict[str, Any]]:
+        """Decode an entry payload; trimmed or malformed entries yield None"""
+        if not fields:
+            return None
+        payload = fields.get("payload", fields.get(b"payload"))
+        try:
+            return json.loads(self._decode(payload))
+        except (TypeError, ValueError) as e:
+            logger.error(f"Dropping malformed entry {entry_id} on {self.stream}: {e}")
+            return None
+
+    async def _refresh_depth(self):
+        self._depth = await self.redis.xlen(self.stream)
+
+    async def _heartbeat(self):
+        """Reset the idle time of our in-flight entries so nobody reclaims them"""
+        if self._in_flight:
+            await self.redis.xclaim(
+                self.stream, self.group, self.consumer, 0, list(self._in_flight), justid=True
+            )
+
+    async def _reclaim(self):
+        """Take over entries left pending by consumers that stopped heartbeating"""
+        start_id = "0-0"
+        while True:
+            result = await self.redis.xautoclaim(
+                self.stream, self.group, self.consumer, self.claim_idle_ms, start_id=start_id, count=100
+            )
+            start_id, entries = self._decode(result[0]), result[1]
+            for entry_id, fields in entries:
+                entry_id = self._decode(entry_id)
+                if entry_id in self._in_flight:
+                    continue
+                request_data = self._parse(entry_id, fields)
+                if request_data is None:
+                    await self.ack(entry_id)
+                    continue
+                logger.warning(f"Reclaimed pending entry {entry_id} on {self.stream}")
+                # Owned from now on, so heartbeats keep it ours until a worker gets to it
+                self._in_flight.add(entry_id)
+                self._reclaimed.append((entry_id, request_data))
+            if start_id == "0-0":
+                break
+
+    async def _prune_consumers(self):
+        """Delete consumers of dead processes once their pending entries have been reclaimed"""
+        for info in await self.redis.xinfo_consumers(self.stream, self.group):
+            name = self._decode(info["name"])
+            if name == self.consumer or info["pending"] or info["idle"] < self.consumer_idle_ms:
+                continue
+            # Deleting a consumer drops its pending entries, so only ever delete one with none
+            await self.redis.xgroup_delconsumer(self.stream, self.group, name)
+            logger.info(f"Removed idle consumer {name} from {self.stream}")
+
+    async def _maintenance_loop(self):
+        interval = max(self.claim_idle_ms / 3000.0, 0.1)
+        while True:
+            try:
+                await asyncio.sleep(interval)
+                await self._heartbeat()
+                await self._reclaim()
+                await self._prune_consumers()
+                await self._refresh_depth()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error maintaining queue {self.stream}: {e}")
+
+
+def default_consumer_name() -> str:
+    """Build a consumer name unique to this backend process"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def create_queue_factory(backend: str = "memory", redis_url: Optional[str] = None,
+                         consumer: Optional[str] = None) -> Callable[[str], AgentQueue]:
+    """Build a factory that creates the configured queue for an agent id"""
+    if backend == "memory":
+        return lambda agent_id: LocalAgentQueue()
+
+    if backend == "redis":
+        import redis.asyncio as redis_asyncio
+
+        client = redis_asyncio.from_url(redis_url, decode_responses=True)
+        consumer_name = consumer or default_consumer_name()
+        return lambda agent_id: RedisStreamQueue(client, agent_id, consumer_name)
+
+    raise ValueError(f"Unknown agent queue backend: {backend}")
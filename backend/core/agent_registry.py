@@ -0,0 +1,158 @@
+"""
+Custom Agent Registry
+Tenant-defined agent configs persisted in MongoDB, with change notifications across replicas
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Redis channel carrying the ids of custom agents whose config changed
+CONFIG_CHANNEL = "agent_config_updates"
+
+# Called with an agent id whenever its stored config may have changed
+ChangeHandler = Callable[[str], Awaitable[None]]
+
+
+class CustomAgentRegistry:
+    """Stores custom agent configs and tells every replica when one changes.
+
+    Configs live in the custom_agents collection and are only read when an
+    agent is first used. Writes publish the agent id on CONFIG_CHANNEL so
+    replicas that have the agent loaded can reload it; a periodic resync on
+    updated_at catches notifications lost while a replica was disconnected.
+    Deletes are soft (deleted=True) so the resync sees them as well.
+    """
+
+    def __init__(self, session_manager: Any, on_change: ChangeHandler, resync_interval: float = 60.0):
+        self.session_manager = session_manager
+        self.on_change = on_change
+        self.resync_interval = resync_interval
+        self._synced_until: Optional[datetime] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def collection(self):
+        db = getattr(self.session_manager, "db", None)
+        return db.custom_agents if db is not None else None
+
+    @property
+    def available(self) -> bool:
+        """Whether a database is configured to persist custom agents"""
+        return self.collection is not None
+
+    async def start(self):
+        """Create indexes and start listening for config changes"""
+        if not self.available:
+            logger.warning("No database configured; custom agents will not be persisted")
+            return
+
+        try:
+            await self.collection.create_index("agent_id", unique=True)
+            await self.collection.create_index("updated_at")
+        except Exception as e:
+            logger.error(f"Failed to create custom agent indexes: {e}")
+
+        self._synced_until = datetime.utcnow()
+        self._tasks.append(asyncio.create_task(self._resync_loop()))
+        if getattr(self.session_manager, "redis", None) is not None:
+            self._tasks.append(asyncio.create_task(self._listen()))
+
+    async def stop(self):
+        """Stop listening for config changes"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def load(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Get a custom agent's stored config fields, or None if it does not exist"""
+        if not self.available:
+            return None
+        return await self.collection.find_one(
+            {"agent_id": agent_id, "deleted": {"$ne": True}},
+            {"_id": 0, "deleted": 0}
+        )
+
+    async def save(self, config: Dict[str, Any], create: bool = False):
+        """Insert or replace a custom agent's config and notify all replicas.
+
+        With create=True an agent that already exists (and is not deleted)
+        raises ValueError instead of being overwritten.
+        """
+        document = {**config, "deleted": False, "updated_at": datetime.utcnow()}
+        if create and await self.load(config["agent_id"]) is not None:
+            raise ValueError(f"Agent {config['agent_id']} already exists")
+
+        await self.collection.replace_one({"agent_id": config["agent_id"]}, document, upsert=True)
+        await self._publish(config["agent_id"])
+
+    async def delete(self, agent_id: str) -> bool:
+        """Mark a custom agent deleted and notify all replicas"""
+        result = await self.collection.update_one(
+            {"agent_id": agent_id, "deleted": {"$ne": True}},
+            {"$set": {"deleted": True, "updated_at": datetime.utcnow()}}
+        )
+        if result.modified_count == 0:
+            return False
+        await self._publish(agent_id)
+        return True
+
+    async def _publish(self, agent_id: str):
+        """Announce a config change; this replica applies it right away"""
+        redis = getattr(self.session_manager, "redis", None)
+        if redis is not None:
+            try:
+                await redis.publish(CONFIG_CHANNEL, agent_id)
+            except Exception as e:
+                logger.error(f"Failed to publish config change for {agent_id}: {e}")
+        await self._notify(agent_id)
+
+    async def _notify(self, agent_id: str):
+        try:
+            await self.on_change(agent_id)
+        except Exception as e:
+            logger.error(f"Failed to apply config change for {agent_id}: {e}")
+
+    async def _listen(self):
+        """Apply config changes announced by other replicas"""
+        while True:
+            pubsub = self.session_manager.redis.pubsub()
+            try:
+                await pubsub.subscribe(CONFIG_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        await self._notify(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Custom agent change subscription failed, resubscribing: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    async def _resync_loop(self):
+        while True:
+            await asyncio.sleep(self.resync_interval)
+            try:
+                await self.resync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Custom agent resync failed: {e}")
+
+    async def resync(self):
+        """Re-apply every config written since shortly before the previous resync"""
+        # The window overlaps the previous one to tolerate clock skew between replicas
+        started = datetime.utcnow()
+        since = (self._synced_until or started) - timedelta(seconds=5)
+        cursor = self.collection.find({"updated_at": {"$gt": since}}, {"_id": 0, "agent_id": 1})
+        async for document in cursor:
+            await self._notify(document["agent_id"])
+        self._synced_until = started
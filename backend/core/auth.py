@@ -29,6 +29,7 @@ class UserRole(str):
     USER = "user"
     AGENT = "agent"
     API_CLIENT = "api_client"
+    OBSERVER = "observer"
 
 
 class Permission(str):
@@ -187,6 +188,12 @@ class AuthenticationService:
                 Permission.AGENT_EXECUTE,
                 Permission.MCP_LIST_TOOLS,
                 Permission.MCP_CALL_TOOL
+            ],
+            # Dashboards following agent, global and other sessions' event topics
+            UserRole.OBSERVER: [
+                Permission.SYSTEM_MONITOR,
+                Permission.AGENT_READ,
+                Permission.API_READ
             ]
         }
         
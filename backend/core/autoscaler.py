@@ -0,0 +1,151 @@
+"""
+Agent Worker Autoscaler
+Grows and shrinks each agent's worker pool from queue depth, queue wait and busy ratio
+"""
+
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+AUTOSCALE_EVENTS = REGISTRY.counter(
+    "agent_autoscale_events_total",
+    "Worker pool resize decisions by direction",
+    ["agent_id", "direction"]
+)
+
+
+class AutoscalePolicy(BaseModel):
+    """Worker pool bounds and scaling thresholds, applied per agent"""
+    min_workers: int = 1
+    max_workers: int = 8
+    # Scale up when more than this many requests wait per worker...
+    scale_up_queue_per_worker: float = 2.0
+    # ...or when requests waited longer than this on average since the last sample
+    scale_up_queue_wait: float = 0.5
+    # Scale down after this many consecutive samples with an empty queue and
+    # at most this fraction of workers busy
+    scale_down_busy_ratio: float = 0.3
+    scale_down_samples: int = 3
+    # Minimum time between resizes of one pool; shrinking waits longer than growing
+    scale_up_cooldown: float = 1.0
+    scale_down_cooldown: float = 30.0
+    # Sampling interval in seconds
+    interval: float = 1.0
+
+
+class _PoolState:
+    """What the autoscaler remembers about one agent between samples"""
+
+    __slots__ = ("last_change", "low_samples", "wait_count", "wait_sum")
+
+    def __init__(self):
+        self.last_change = float("-inf")
+        self.low_samples = 0
+        self.wait_count = 0
+        self.wait_sum = 0.0
+
+
+class WorkerAutoscaler:
+    """Periodically resizes AgentManager worker pools within the policy bounds.
+
+    Growth is proportional to the backlog (at most doubling per step) so a
+    burst is absorbed in a few samples. Shrinking removes one worker at a
+    time and only after the pool has looked idle for several samples, so a
+    pool does not flap between sizes around a threshold.
+    """
+
+    def __init__(self, manager: Any, policy: Optional[AutoscalePolicy] = None):
+        self.manager = manager
+        self.policy = policy or AutoscalePolicy()
+        self.state: Dict[str, _PoolState] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the sampling loop"""
+        if not self.task:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the sampling loop"""
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.sleep(self.policy.interval)
+                self.sample()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in worker autoscaler: {e}")
+
+    def sample(self, now: Optional[float] = None):
+        """Evaluate every agent once and apply the resulting pool sizes"""
+        now = time.monotonic() if now is None else now
+        for agent_id in list(self.manager.worker_tasks.keys()):
+            # Only pools that were started are managed; agents without one stay cold
+            current = self.manager.worker_count(agent_id)
+            desired = self.evaluate(agent_id, current, now)
+            if desired != current:
+                direction = "up" if desired > current else "down"
+                logger.info(f"Scaling {agent_id} workers {direction}: {current} -> {desired}")
+                AUTOSCALE_EVENTS.labels(agent_id, direction).inc()
+                self.manager.scale_workers(agent_id, desired)
+
+    def evaluate(self, agent_id: str, current: int, now: float) -> int:
+        """Decide the pool size for one agent"""
+        policy = self.policy
+        state = self.state.setdefault(agent_id, _PoolState())
+
+        depth = self.manager.agent_queues[agent_id].qsize()
+        busy = self.manager.busy_workers.get(agent_id, 0)
+
+        # Mean queue wait of requests dequeued since the previous sample
+        queue_wait = self.manager._get_metrics(agent_id).latency.queue_wait
+        new_count = queue_wait.total_count - state.wait_count
+        recent_wait = (queue_wait.total_sum - state.wait_sum) / new_count if new_count > 0 else 0.0
+        state.wait_count, state.wait_sum = queue_wait.total_count, queue_wait.total_sum
+
+        bounded = min(max(current, policy.min_workers), policy.max_workers)
+        if bounded != current:
+            state.last_change = now
+            return bounded
+
+        since_change = now - state.last_change
+        backlog = depth > 0 and (
+            depth / max(current, 1) > policy.scale_up_queue_per_worker or recent_wait > policy.scale_up_queue_wait
+        )
+        if backlog:
+            state.low_samples = 0
+            if current >= policy.max_workers or since_change < policy.scale_up_cooldown:
+                return current
+            # More workers cannot drain a queue that is waiting on model provider quota
+            rate_limited = getattr(self.manager, "is_rate_limited", None)
+            if rate_limited and rate_limited(agent_id):
+                return current
+            needed = busy + math.ceil(depth / policy.scale_up_queue_per_worker)
+            state.last_change = now
+            return min(policy.max_workers, max(current + 1, min(needed, current * 2)))
+
+        idle = depth == 0 and busy <= current * policy.scale_down_busy_ratio
+        state.low_samples = state.low_samples + 1 if idle else 0
+        if (
+            state.low_samples >= policy.scale_down_samples
+            and current > policy.min_workers
+            and since_change >= policy.scale_down_cooldown
+        ):
+            state.low_samples = 0
+            state.last_change = now
+            return current - 1
+        return current
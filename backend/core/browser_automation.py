@@ -19,6 +19,10 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+from .deadline import DeadlineExceeded, bounded_timeout_ms, with_deadline
+from .metrics import REGISTRY, MetricFamily
+from .timer_heap import TimerHeap
+
 logger = logging.getLogger(__name__)
 
 
@@ -115,15 +119,24 @@ class BrowserAutomationService:
         self.cdp_clients: Dict[str, CDPWebSocketClient] = {}
         self.active_tasks: Dict[str, BrowserTask] = {}
         
+        # Expiry timers for finished tasks
+        self.task_timers = TimerHeap("browser_tasks")
+        self.task_retention = 300  # seconds a finished task stays queryable
+        
         # Configuration
         self.headless = os.getenv("BROWSER_HEADLESS", "true").lower() == "true"
         self.timeout = int(os.getenv("BROWSER_TIMEOUT", "30000"))
+        
+        REGISTRY.register_collector("browser_automation", self.collect_metrics)
     
     async def initialize(self):
         """Initialize browser automation service"""
         try:
             logger.info("Initializing Browser Automation Service...")
             
+            # Start task expiry timers
+            self.task_timers.start()
+            
             # Initialize Playwright
             self.playwright = await async_playwright().start()
             
@@ -185,33 +198,10 @@ class BrowserAutomationService:
         )
         
         self.active_tasks[task_id] = task
+        options = options or {}
         
         try:
-            # Execute the task based on action type
-            if action == "navigate":
-                result = await self._navigate(url, options)
-            elif action == "click":
-                result = await self._click(selector, options)
-            elif action == "type":
-                result = await self._type(selector, text, options)
-            elif action == "screenshot":
-                result = await self._screenshot(options)
-            elif action == "extract_text":
-                result = await self._extract_text(selector, options)
-            elif action == "extract_data":
-                result = await self._extract_data(options)
-            elif action == "wait_for_element":
-                result = await self._wait_for_element(selector, options)
-            elif action == "execute_script":
-                result = await self._execute_script(text, options)
-            elif action == "fill_form":
-                result = await self._fill_form(options)
-            elif action == "scroll":
-                result = await self._scroll(options)
-            elif action == "cdp_command":
-                result = await self._execute_cdp_command(options)
-            else:
-                raise ValueError(f"Unknown action: {action}")
+            result = await with_deadline(self._run_action(action, url, selector, text, options))
             
             task.status = "completed"
             task.result = result
@@ -222,6 +212,11 @@ class BrowserAutomationService:
                 "result": result
             }
             
+        except DeadlineExceeded:
+            # The hung action was cancelled; let the caller's deadline handling take over
+            task.status = "failed"
+            task.error = "Request deadline exceeded"
+            raise
         except Exception as e:
             task.status = "failed"
             task.error = str(e)
@@ -233,8 +228,42 @@ class BrowserAutomationService:
                 "error": str(e)
             }
         finally:
-            # Clean up completed task after some time
-            asyncio.create_task(self._cleanup_task(task_id, delay=300))  # 5 minutes
+            # Clean up completed task after the retention period
+            self.task_timers.schedule(task_id, self.task_retention, self._cleanup_task, task_id)
+    
+    async def _run_action(
+        self,
+        action: str,
+        url: Optional[str],
+        selector: Optional[str],
+        text: Optional[str],
+        options: Dict
+    ) -> Dict[str, Any]:
+        """Dispatch a browser action to its handler"""
+        if action == "navigate":
+            return await self._navigate(url, options)
+        elif action == "click":
+            return await self._click(selector, options)
+        elif action == "type":
+            return await self._type(selector, text, options)
+        elif action == "screenshot":
+            return await self._screenshot(options)
+        elif action == "extract_text":
+            return await self._extract_text(selector, options)
+        elif action == "extract_data":
+            return await self._extract_data(options)
+        elif action == "wait_for_element":
+            return await self._wait_for_element(selector, options)
+        elif action == "execute_script":
+            return await self._execute_script(text, options)
+        elif action == "fill_form":
+            return await self._fill_form(options)
+        elif action == "scroll":
+            return await self._scroll(options)
+        elif action == "cdp_command":
+            return await self._execute_cdp_command(options)
+        else:
+            raise ValueError(f"Unknown action: {action}")
     
     async def _get_page(self, context_name: str = "default") -> Page:
         """Get or create a page in the specified context"""
@@ -253,7 +282,7 @@ class BrowserAutomationService:
         """Navigate to a URL"""
         page = await self._get_page(options.get("context", "default"))
         
-        response = await page.goto(url, timeout=self.timeout)
+        response = await page.goto(url, timeout=bounded_timeout_ms(self.timeout))
         
         return {
             "url": page.url,
@@ -265,7 +294,7 @@ class BrowserAutomationService:
         """Click an element"""
         page = await self._get_page(options.get("context", "default"))
         
-        await page.wait_for_selector(selector, timeout=self.timeout)
+        await page.wait_for_selector(selector, timeout=bounded_timeout_ms(self.timeout))
         await page.click(selector)
         
         return {"clicked": selector}
@@ -274,7 +303,7 @@ class BrowserAutomationService:
         """Type text into an element"""
         page = await self._get_page(options.get("context", "default"))
         
-        await page.wait_for_selector(selector, timeout=self.timeout)
+        await page.wait_for_selector(selector, timeout=bounded_timeout_ms(self.timeout))
         
         if options.get("clear", True):
             await page.fill(selector, "")
@@ -298,7 +327,7 @@ class BrowserAutomationService:
         screenshot_bytes = await page.screenshot(**screenshot_options)
         
         return {
-            "screenshot": screenshot_bytes.hex() if not options.get("path") else None,
+            "screenshot": screenshot_bytes if not options.get("path") else None,
             "path": options.get("path"),
             "size": len(screenshot_bytes)
         }
@@ -308,7 +337,7 @@ class BrowserAutomationService:
         page = await self._get_page(options.get("context", "default"))
         
         if selector:
-            await page.wait_for_selector(selector, timeout=self.timeout)
+            await page.wait_for_selector(selector, timeout=bounded_timeout_ms(self.timeout))
             
             if options.get("all", False):
                 elements = await page.query_selector_all(selector)
@@ -366,7 +395,7 @@ class BrowserAutomationService:
         page = await self._get_page(options.get("context", "default"))
         
         state = options.get("state", "visible")  # visible, hidden, attached, detached
-        timeout = options.get("timeout", self.timeout)
+        timeout = bounded_timeout_ms(options.get("timeout", self.timeout))
         
         await page.wait_for_selector(selector, state=state, timeout=timeout)
         
@@ -389,7 +418,7 @@ class BrowserAutomationService:
         
         for selector, value in form_data.items():
             try:
-                await page.wait_for_selector(selector, timeout=5000)
+                await page.wait_for_selector(selector, timeout=bounded_timeout_ms(5000))
                 await page.fill(selector, str(value))
                 results[selector] = "success"
             except Exception as e:
@@ -460,6 +489,21 @@ class BrowserAutomationService:
             del self.contexts[context_name]
             logger.info(f"Closed browser context: {context_name}")
     
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Collect browser context, page and task metrics for /metrics"""
+        browsers = MetricFamily("browser_instances", "gauge", "Launched browser instances")
+        browsers.add({}, len(self.browsers))
+        
+        contexts = MetricFamily("browser_contexts", "gauge", "Open browser contexts")
+        contexts.add({}, len(self.contexts))
+        
+        pages = MetricFamily("browser_pages", "gauge", "Open pages across all browser contexts")
+        pages.add({}, sum(len(context.pages) for context in self.contexts.values()))
+        
+        tasks = MetricFamily("browser_tasks", "gauge", "Browser tasks retained for status queries")
+        tasks.add({}, len(self.active_tasks))
+        return [browsers, contexts, pages, tasks]
+    
     async def get_task_status(self, task_id: str) -> Optional[Dict]:
         """Get the status of a task"""
         task = self.active_tasks.get(task_id)
@@ -474,17 +518,17 @@ class BrowserAutomationService:
             "error": task.error
         }
     
-    async def _cleanup_task(self, task_id: str, delay: int = 0):
-        """Clean up a completed task after delay"""
-        if delay > 0:
-            await asyncio.sleep(delay)
-        
+    def _cleanup_task(self, task_id: str):
+        """Clean up a completed task"""
         if task_id in self.active_tasks:
             del self.active_tasks[task_id]
     
     async def cleanup(self):
         """Cleanup all browser resources"""
         try:
+            # Stop task expiry timers
+            await self.task_timers.stop()
+            
             # Close all contexts
             for context_name in list(self.contexts.keys()):
                 await self.close_context(context_name)
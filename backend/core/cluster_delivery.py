@@ -0,0 +1,161 @@
+"""
+Cluster Delivery
+Relays WebSocket/SSE topic messages between backend replicas over Redis pub/sub
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Set
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_MESSAGES = REGISTRY.counter(
+    "websocket_cluster_messages_total",
+    "Topic messages relayed between replicas over Redis, by direction",
+    ["direction"]
+)
+
+# Redis channels are the topic names under this prefix
+CHANNEL_PREFIX = "ws:"
+
+# Called with (topics, index of the topic the copy came in on, message type, encoded message, excluded sessions)
+RemoteHandler = Callable[[List[str], int, Optional[str], str, List[str]], Awaitable[Any]]
+
+
+class ClusterDelivery:
+    """Relays published messages to the replicas holding the topics' subscribers.
+
+    Each replica subscribes to the channel of every topic it has local
+    subscribers for (the sessions of its connections, topics observers
+    follow, and global) and publishes each message on the channels of its
+    topics. The publishing replica serves its own subscribers directly and
+    skips its messages when they come back. A message is published once
+    per topic, so a replica delivers each copy only to subscribers not
+    covered by an earlier topic of the same message.
+
+    Pub/sub is fire-and-forget: messages published while a replica is
+    (re)subscribing are not delivered to it.
+    """
+
+    def __init__(self, redis: Any, replica_id: Optional[str] = None, prefix: str = CHANNEL_PREFIX):
+        self.redis = redis
+        self.replica_id = replica_id or uuid.uuid4().hex
+        self.prefix = prefix
+        # Channels this replica should be subscribed to, and those it is
+        self.channels: Set[str] = set()
+        self._subscribed: Set[str] = set()
+        self._changed = asyncio.Event()
+        self._pubsub: Any = None
+        self._handler: Optional[RemoteHandler] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self, handler: RemoteHandler, topics: Iterable[str] = ()):
+        """Start relaying messages on the channels of topics (and any watched later) to handler"""
+        self._handler = handler
+        for topic in topics:
+            self.watch(topic)
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._sync())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def watch(self, topic: str):
+        """Receive other replicas' messages on topic"""
+        self.channels.add(self.prefix + topic)
+        self._changed.set()
+
+    def unwatch(self, topic: str):
+        self.channels.discard(self.prefix + topic)
+        self._changed.set()
+
+    async def publish(
+        self, topics: List[str], message_type: Optional[str], text: str, exclude_sessions: Iterable[str] = ()
+    ):
+        """Publish an encoded message on the channels of its topics"""
+        header = json.dumps([self.replica_id, topics, message_type, list(exclude_sessions)])
+        payload = f"{header}\n{text}"
+        try:
+            if len(topics) == 1:
+                await self.redis.publish(self.prefix + topics[0], payload)
+            else:
+                pipeline = self.redis.pipeline(transaction=False)
+                for topic in topics:
+                    pipeline.publish(self.prefix + topic, payload)
+                await pipeline.execute()
+            CLUSTER_MESSAGES.labels("published").inc()
+        except Exception as e:
+            logger.error(f"Failed to publish message on {topics} to other replicas: {e}")
+
+    async def _receive(self, channel: Any, data: Any):
+        if isinstance(channel, bytes):
+            channel, data = channel.decode(), data.decode()
+        header, _, text = data.partition("\n")
+        origin, topics, message_type, exclude_sessions = json.loads(header)
+        if origin == self.replica_id:
+            return
+        topic = channel[len(self.prefix):]
+        if topic not in topics:
+            return
+        CLUSTER_MESSAGES.labels("received").inc()
+        await self._handler(topics, topics.index(topic), message_type, text, exclude_sessions)
+
+    async def _listen(self):
+        """Hand other replicas' messages to the handler, resubscribing after connection errors"""
+        # The global channel keeps the subscription (and so the listener) alive with no other topics
+        keepalive = self.prefix + "global"
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                channels = self.channels | {keepalive}
+                await pubsub.subscribe(*channels)
+                self._subscribed = channels
+                self._pubsub = pubsub
+                self._changed.set()
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        try:
+                            await self._receive(message["channel"], message["data"])
+                        except Exception as e:
+                            logger.error(f"Failed to deliver message from another replica: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cluster delivery subscription failed, resubscribing: {e}")
+                await asyncio.sleep(1)
+            finally:
+                self._pubsub = None
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    async def _sync(self):
+        """Follow changes to the watched topics on the live subscription"""
+        keepalive = self.prefix + "global"
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            pubsub = self._pubsub
+            if pubsub is None:
+                continue
+            added = self.channels - self._subscribed
+            removed = self._subscribed - self.channels - {keepalive}
+            try:
+                if added:
+                    await pubsub.subscribe(*added)
+                    self._subscribed |= added
+                if removed:
+                    await pubsub.unsubscribe(*removed)
+                    self._subscribed -= removed
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The listener resubscribes to every watched channel when it reconnects
+                logger.error(f"Failed to update cluster delivery subscriptions: {e}")
@@ -0,0 +1,255 @@
+"""
+CPU Offload
+Managed process pool for CPU-bound agent steps, with shared-memory payload handoff
+"""
+
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Byte and text payloads at least this large travel through shared memory instead of pickling
+DEFAULT_SHM_THRESHOLD = 256 * 1024
+
+
+class CPUExecutorBusy(RuntimeError):
+    """Raised when the CPU executor's pending queue is full"""
+
+
+def cpu_bound(func: Callable) -> Callable:
+    """Mark an agent step as CPU-bound so AgentManager runs it in the process pool.
+
+    The function must be defined at module level so worker processes can import it.
+    """
+    func.__cpu_bound__ = True
+    return func
+
+
+def is_cpu_bound(func: Callable) -> bool:
+    """Check whether a step was declared with @cpu_bound"""
+    return getattr(func, "__cpu_bound__", False)
+
+
+def _untrack(shm: shared_memory.SharedMemory):
+    """Stop this process's resource tracker from unlinking a block it does not own"""
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+class SharedPayload:
+    """Handle to bytes or text placed in a shared memory block; only the name is pickled"""
+
+    __slots__ = ("name", "size", "text")
+
+    def __init__(self, name: str, size: int, text: bool = False):
+        self.name = name
+        self.size = size
+        # Text is stored UTF-8 encoded and decoded again on read
+        self.text = text
+
+    @classmethod
+    def create(cls, data: Union[bytes, str], owned: bool = True) -> "SharedPayload":
+        """Copy data into a new shared memory block.
+
+        Blocks created with owned=False are handed to another process, which
+        becomes responsible for unlinking them.
+        """
+        text = isinstance(data, str)
+        if text:
+            data = data.encode("utf-8", errors="surrogatepass")
+        shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        try:
+            shm.buf[:len(data)] = data
+        finally:
+            shm.close()
+        if not owned:
+            _untrack(shm)
+        return cls(shm.name, len(data), text)
+
+    def read(self) -> Union[bytes, str]:
+        """Copy the payload out of shared memory"""
+        shm = shared_memory.SharedMemory(name=self.name)
+        # Attaching registers the block with the resource tracker on Python < 3.13
+        _untrack(shm)
+        try:
+            if self.text:
+                return str(shm.buf[:self.size], "utf-8", "surrogatepass")
+            return bytes(shm.buf[:self.size])
+        finally:
+            shm.close()
+
+    def unlink(self):
+        """Free the shared memory block"""
+        try:
+            shm = shared_memory.SharedMemory(name=self.name)
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __getstate__(self):
+        return self.name, self.size, self.text
+
+    def __setstate__(self, state):
+        self.name, self.size, self.text = state
+
+
+def _to_shared(value: Any, threshold: int, owned: bool = True) -> Any:
+    # Page HTML and table data arrive as str; a character is at least one encoded byte
+    if isinstance(value, str) and len(value) >= threshold:
+        return SharedPayload.create(value, owned=owned)
+    if isinstance(value, (bytes, bytearray, memoryview)) and len(value) >= threshold:
+        return SharedPayload.create(bytes(value), owned=owned)
+    return value
+
+
+def _from_shared(value: Any) -> Any:
+    return value.read() if isinstance(value, SharedPayload) else value
+
+
+def _warmup() -> int:
+    """Runs in each worker at startup so imports and process spawn are paid up front"""
+    return os.getpid()
+
+
+def _invoke(func: Callable, args: Tuple, kwargs: Dict[str, Any], threshold: int) -> Any:
+    """Worker-side entry point: resolve shared payloads, run, and share a large result"""
+    args = tuple(_from_shared(arg) for arg in args)
+    kwargs = {key: _from_shared(value) for key, value in kwargs.items()}
+    return _to_shared(func(*args, **kwargs), threshold, owned=False)
+
+
+def _discard_result(future: asyncio.Future):
+    """Unlink the shared result of a call whose caller went away"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    if isinstance(result, SharedPayload):
+        result.unlink()
+
+
+class CPUExecutor:
+    """Process pool for CPU-bound steps with a bounded submission queue.
+
+    At most max_workers calls run at once; up to max_pending more wait for a
+    slot, and further submissions fail fast with CPUExecutorBusy instead of
+    piling up behind the pool.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_pending: int = 64,
+        shm_threshold: int = DEFAULT_SHM_THRESHOLD
+    ):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_pending = max_pending
+        self.shm_threshold = shm_threshold
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending = 0
+        self.running = 0
+
+    @property
+    def pending(self) -> int:
+        """Calls waiting for a free worker"""
+        return self._pending
+
+    async def start(self):
+        """Create the pool and warm up every worker"""
+        if self.pool:
+            return
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._slots = asyncio.Semaphore(self.max_workers)
+
+        loop = asyncio.get_event_loop()
+        pids = await asyncio.gather(*(
+            loop.run_in_executor(self.pool, _warmup) for _ in range(self.max_workers)
+        ))
+        logger.info(f"CPU executor started with {len(set(pids))} warm workers")
+
+    async def run(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run func(*args, **kwargs) in a worker process"""
+        if not self.pool:
+            raise RuntimeError("CPU executor not started")
+        if self._pending >= self.max_pending:
+            raise CPUExecutorBusy(f"CPU executor queue full ({self.max_pending} pending)")
+
+        self._pending += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._pending -= 1
+
+        self.running += 1
+        shared = []
+
+        def share(value: Any) -> Any:
+            value = _to_shared(value, self.shm_threshold)
+            if isinstance(value, SharedPayload):
+                shared.append(value)
+            return value
+
+        loop = asyncio.get_event_loop()
+        try:
+            call_args = tuple(share(arg) for arg in args)
+            call_kwargs = {key: share(value) for key, value in kwargs.items()}
+            call = functools.partial(_invoke, func, call_args, call_kwargs, self.shm_threshold)
+            pool = self.pool
+            try:
+                future = loop.run_in_executor(pool, call)
+            except BrokenProcessPool:
+                # An earlier crash broke the pool; nothing ran yet, so submit to a fresh one
+                pool = self._replace_pool(pool)
+                future = loop.run_in_executor(pool, call)
+        except BaseException:
+            self._finish(shared, None)
+            raise
+        # The slot and input blocks are held until the worker is done, not just this caller
+        future.add_done_callback(functools.partial(self._finish, shared))
+
+        try:
+            result = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Nobody will read the result of an abandoned call; free it once the worker returns it
+            future.add_done_callback(_discard_result)
+            raise
+        except BrokenProcessPool:
+            # A worker died mid-call (maybe this one); later calls get a fresh pool
+            self._replace_pool(pool)
+            raise
+        if isinstance(result, SharedPayload):
+            try:
+                return result.read()
+            finally:
+                result.unlink()
+        return result
+
+    def _finish(self, shared: List[SharedPayload], future: Optional[asyncio.Future]):
+        """Release a call's worker slot and input blocks once the worker no longer needs them"""
+        self.running -= 1
+        self._slots.release()
+        for payload in shared:
+            payload.unlink()
+
+    def _replace_pool(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Swap a pool broken by a crashed worker for a new one, once however many calls saw it break"""
+        if self.pool is broken:
+            logger.warning("CPU executor worker died; recreating the process pool")
+            self.pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            broken.shutdown(wait=False)
+        return self.pool
+
+    async def shutdown(self):
+        """Shut the pool down, waiting for running calls"""
+        if self.pool:
+            pool, self.pool = self.pool, None
+            await asyncio.get_event_loop().run_in_executor(None, pool.shutdown)
@@ -0,0 +1,87 @@
+"""
+CPU-bound Agent Steps
+Parsing and text-processing steps that AgentManager offloads to the process pool
+"""
+
+import csv
+import io
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Union
+
+from .cpu_offload import cpu_bound
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def _as_text(data: Union[str, bytes]) -> str:
+    return data.decode("utf-8", errors="replace") if isinstance(data, (bytes, bytearray)) else data
+
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text, skipping script and style content"""
+
+    def __init__(self):
+        super().__init__()
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style", "noscript"):
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style", "noscript") and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip and data.strip():
+            self.parts.append(data.strip())
+
+
+@cpu_bound
+def html_to_text(html: Union[str, bytes]) -> str:
+    """Extract the visible text of an HTML document"""
+    parser = _TextExtractor()
+    parser.feed(_as_text(html))
+    parser.close()
+    return " ".join(parser.parts)
+
+
+@cpu_bound
+def estimate_tokens(text: Union[str, bytes]) -> int:
+    """Roughly count model tokens (words and punctuation)"""
+    return sum(1 for _ in _TOKEN_PATTERN.finditer(_as_text(text)))
+
+
+@cpu_bound
+def summarize_table(data: Union[str, bytes], delimiter: str = ",") -> Dict[str, Any]:
+    """Parse delimited text and summarize its columns"""
+    reader = csv.reader(io.StringIO(_as_text(data)), delimiter=delimiter)
+    header = next(reader, [])
+    columns: Dict[str, Dict[str, Any]] = {
+        name: {"numeric": 0, "empty": 0, "min": None, "max": None, "sum": 0.0} for name in header
+    }
+
+    row_count = 0
+    for row in reader:
+        row_count += 1
+        for name, value in zip(header, row):
+            stats = columns[name]
+            if not value.strip():
+                stats["empty"] += 1
+                continue
+            try:
+                number = float(value)
+            except ValueError:
+                continue
+            stats["numeric"] += 1
+            stats["sum"] += number
+            stats["min"] = number if stats["min"] is None else min(stats["min"], number)
+            stats["max"] = number if stats["max"] is None else max(stats["max"], number)
+
+    for stats in columns.values():
+        stats["mean"] = stats["sum"] / stats["numeric"] if stats["numeric"] else None
+        del stats["sum"]
+
+    return {"rows": row_count, "columns": columns}
@@ -0,0 +1,88 @@
+"""
+Request Deadlines
+Request-scoped deadlines carried in a contextvar and propagated through queued requests
+"""
+
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Absolute wall-clock deadline (time.time()) so it survives being queued,
+# possibly to another replica, as part of request_data
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Raised when work runs past its request deadline"""
+
+
+def current_deadline() -> Optional[float]:
+    """Get the deadline of the current request, if any"""
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the current deadline (None without one, never negative)"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.time(), 0.0)
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current deadline has passed"""
+    deadline = _deadline.get()
+    if deadline is not None and time.time() >= deadline:
+        raise DeadlineExceeded("Request deadline exceeded")
+
+
+def bounded_timeout(timeout: Optional[float]) -> Optional[float]:
+    """Clamp a timeout in seconds to the time left before the deadline"""
+    left = remaining()
+    if left is None:
+        return timeout
+    return left if timeout is None else min(timeout, left)
+
+
+def bounded_timeout_ms(timeout_ms: float) -> float:
+    """Clamp a millisecond timeout (e.g. Playwright's) to the deadline, never below 1ms"""
+    left = remaining()
+    if left is None:
+        return timeout_ms
+    return max(min(timeout_ms, left * 1000.0), 1.0)
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]) -> Iterator[Optional[float]]:
+    """Run the block under a deadline; an enclosing earlier deadline still wins"""
+    outer = _deadline.get()
+    if deadline is None or (outer is not None and outer <= deadline):
+        effective = outer
+    else:
+        effective = deadline
+    token = _deadline.set(effective)
+    try:
+        yield effective
+    finally:
+        _deadline.reset(token)
+
+
+async def with_deadline(awaitable: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Await under the current deadline (and optional timeout), cancelling it on expiry"""
+    limit = bounded_timeout(timeout)
+    if limit is None:
+        return await awaitable
+
+    try:
+        return await asyncio.wait_for(awaitable, limit)
+    except asyncio.TimeoutError as e:
+        if isinstance(e, DeadlineExceeded):
+            raise
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded("Request deadline exceeded") from None
+        raise
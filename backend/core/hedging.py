@@ -0,0 +1,167 @@
+"""
+Hedged Model Calls
+Send a backup request to a second provider when the first is slower than usual
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from pydantic import BaseModel
+
+from .deadline import bounded_timeout, with_deadline
+from .latency import WindowedHistogram
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LLM_HEDGES = REGISTRY.counter(
+    "llm_hedged_requests_total",
+    "Backup model requests by which side answered first",
+    ["provider", "outcome"]
+)
+
+
+class HedgePolicy(BaseModel):
+    """When to send a backup request and how many of them to allow"""
+    enabled: bool = True
+    # Hedge once the primary has been running longer than this quantile of its recent latency...
+    quantile: float = 90.0
+    # ...which needs this many recent samples; until then fixed_delay applies (no hedging if unset)
+    min_samples: int = 20
+    fixed_delay: Optional[float] = None
+    # Never hedge sooner than this
+    min_delay: float = 0.05
+    # Backup requests allowed per primary request, with a small burst allowance
+    max_hedge_ratio: float = 0.1
+    burst: float = 5.0
+    # How long a computed delay is reused before re-reading the histogram
+    refresh_interval: float = 1.0
+    window_seconds: float = 60.0
+
+
+class HedgeBudget:
+    """Token bucket that earns max_hedge_ratio tokens per primary request"""
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def earn(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class Hedger:
+    """Runs a primary call and, if it is slow, races a backup call against it.
+
+    The first successful result wins and the other call is cancelled. If the
+    first call to finish fails, the other one is still awaited. Latencies of
+    every completed call feed the per-key histograms the delay comes from.
+    """
+
+    def __init__(self, policy: Optional[HedgePolicy] = None):
+        self.policy = policy or HedgePolicy()
+        self.budget = HedgeBudget(self.policy.max_hedge_ratio, self.policy.burst)
+        self.latency: Dict[str, WindowedHistogram] = {}
+        self._delays: Dict[str, Tuple[float, Optional[float]]] = {}
+        self.requests = 0
+        self.hedges = 0
+
+    def observe(self, key: str, seconds: float):
+        """Record how long a call to key took"""
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = WindowedHistogram(self.policy.window_seconds)
+        histogram.record(seconds)
+
+    def hedge_delay(self, key: str, threshold: Optional[float] = None) -> Optional[float]:
+        """Seconds to wait on key's call before hedging, or None to never hedge it"""
+        policy = self.policy
+        if threshold is not None:
+            return max(threshold, policy.min_delay)
+
+        now = time.monotonic()
+        cached = self._delays.get(key)
+        if cached and now - cached[0] < policy.refresh_interval:
+            return cached[1]
+
+        delay = policy.fixed_delay
+        histogram = self.latency.get(key)
+        if histogram is not None:
+            window = histogram.window(now)
+            if window.count >= policy.min_samples:
+                delay = window.percentile(policy.quantile)
+        if delay is not None:
+            delay = max(delay, policy.min_delay)
+        self._delays[key] = (now, delay)
+        return delay
+
+    async def _timed(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        start = time.perf_counter()
+        result = await call()
+        self.observe(key, time.perf_counter() - start)
+        return result
+
+    async def run(
+        self,
+        primary_key: str,
+        primary: Callable[[], Awaitable[T]],
+        backup_key: Optional[str] = None,
+        backup: Optional[Callable[[], Awaitable[T]]] = None,
+        threshold: Optional[float] = None
+    ) -> T:
+        """Await primary(), racing backup() against it if primary is slow and budget allows"""
+        self.requests += 1
+        self.budget.earn()
+        started = time.perf_counter()
+        primary_task = asyncio.ensure_future(self._timed(primary_key, primary))
+        delay = self.hedge_delay(primary_key, threshold) if self.policy.enabled and backup else None
+        if delay is None:
+            return await with_deadline(primary_task)
+
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=bounded_timeout(delay))
+            if done:
+                return primary_task.result()
+            if not self.budget.try_spend():
+                return await with_deadline(primary_task)
+        except BaseException:
+            primary_task.cancel()
+            raise
+
+        logger.debug(f"Hedging {primary_key} with {backup_key} after {delay:.3f}s")
+        self.hedges += 1
+        backup_task = asyncio.ensure_future(self._timed(backup_key, backup))
+        return await self._race(primary_key, primary_task, backup_task, started)
+
+    async def _race(self, primary_key: str, primary_task: asyncio.Future, backup_task: asyncio.Future,
+                    started: float):
+        """First successful result wins; the loser is cancelled"""
+        pending = {primary_task, backup_task}
+        try:
+            while pending:
+                done, pending = await with_deadline(asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED))
+                for task in done:
+                    if task.exception() is None:
+                        LLM_HEDGES.labels(primary_key, "backup_won" if task is backup_task else "primary_won").inc()
+                        return task.result()
+            # Both failed: surface the primary's error
+            LLM_HEDGES.labels(primary_key, "both_failed").inc()
+            return primary_task.result()
+        finally:
+            if not primary_task.done():
+                # Its latency is at least this; dropping it would bias the quantile low
+                self.observe(primary_key, time.perf_counter() - started)
+            for task in (primary_task, backup_task):
+                if not task.done():
+                    task.cancel()
@@ -0,0 +1,223 @@
+"""
+Latency Histograms
+Log-linear (HDR-style) histograms with sliding windows for tail-latency tracking
+"""
+
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .metrics import OVERFLOW_LABEL_VALUE
+
+# Each power of two is split into 2**(SUB_BUCKET_BITS - 1) linear buckets,
+# which bounds the relative error of any reported value to ~3%.
+SUB_BUCKET_BITS = 5
+_SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+_SUB_BUCKET_HALF = _SUB_BUCKET_COUNT >> 1
+
+# Values are recorded in microseconds and clamped to one hour
+MAX_VALUE_US = 3600 * 1_000_000
+_BUCKET_COUNT = (MAX_VALUE_US.bit_length() - SUB_BUCKET_BITS + 1) * _SUB_BUCKET_HALF + _SUB_BUCKET_HALF
+
+
+def _bucket_index(value_us: int) -> int:
+    """Map a microsecond value to its bucket index"""
+    if value_us < _SUB_BUCKET_COUNT:
+        return value_us
+    shift = value_us.bit_length() - SUB_BUCKET_BITS
+    return (shift << (SUB_BUCKET_BITS - 1)) + (value_us >> shift)
+
+
+def _bucket_bounds(index: int) -> Tuple[int, int]:
+    """Get the [lower, upper) microsecond bounds of a bucket"""
+    if index < _SUB_BUCKET_COUNT:
+        return index, index + 1
+    shift = (index >> (SUB_BUCKET_BITS - 1)) - 1
+    mantissa = index - (shift << (SUB_BUCKET_BITS - 1))
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class LatencyHistogram:
+    """Mergeable log-linear latency histogram (values in seconds)"""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, seconds: float):
+        """Record one observation"""
+        value_us = int(seconds * 1_000_000)
+        if value_us < _SUB_BUCKET_COUNT:
+            index = value_us if value_us > 0 else 0
+        else:
+            if value_us > MAX_VALUE_US:
+                value_us = MAX_VALUE_US
+            shift = value_us.bit_length() - SUB_BUCKET_BITS
+            index = (shift << (SUB_BUCKET_BITS - 1)) + (value_us >> shift)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """Add another histogram's observations into this one"""
+        if not other.count:
+            return self
+        counts = self.counts
+        for index, value in enumerate(other.counts):
+            if value:
+                counts[index] += value
+        self.count += other.count
+        self.total += other.total
+        if self.min is None or (other.min is not None and other.min < self.min):
+            self.min = other.min
+        if self.max is None or (other.max is not None and other.max > self.max):
+            self.max = other.max
+        return self
+
+    def reset(self):
+        """Drop all observations"""
+        self.counts = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def percentile(self, q: float) -> float:
+        """Get the value at quantile q (0-100), in seconds"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(q / 100.0 * self.count)))
+        seen = 0
+        for index, value in enumerate(self.counts):
+            if not value:
+                continue
+            seen += value
+            if seen >= rank:
+                lower, upper = _bucket_bounds(index)
+                estimate = (lower + upper) / 2.0 / 1_000_000
+                # Never report outside the exact observed range
+                return min(max(estimate, self.min), self.max)
+        return self.max or 0.0
+
+    def mean(self) -> float:
+        """Get the mean observation, in seconds"""
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self, quantiles: Iterable[float] = (50, 95, 99)) -> Dict[str, float]:
+        """Summarize count, mean, max and the requested percentiles"""
+        result = {
+            "count": self.count,
+            "mean": self.mean(),
+            "max": self.max or 0.0,
+        }
+        for q in quantiles:
+            result[f"p{q:g}"] = self.percentile(q)
+        return result
+
+
+class WindowedHistogram:
+    """Sliding-window latency histogram built from a ring of time slots.
+
+    Recording touches only the current slot; reads merge the slots that fall
+    inside the window.
+    """
+
+    __slots__ = ("window_seconds", "slot_width", "slots", "slot_epochs", "total_count", "total_sum",
+                 "_current", "_slot_end")
+
+    def __init__(self, window_seconds: float = 60.0, slots: int = 6):
+        self.window_seconds = window_seconds
+        self.slot_width = window_seconds / slots
+        self.slots = [LatencyHistogram() for _ in range(slots)]
+        self.slot_epochs = [-1] * slots
+        self.total_count = 0
+        self.total_sum = 0.0
+        self._current = self.slots[0]
+        self._slot_end = float("-inf")
+
+    def _advance(self, now: float):
+        """Rotate to the slot covering now, clearing it if it holds stale data"""
+        epoch = int(now / self.slot_width)
+        index = epoch % len(self.slots)
+        if self.slot_epochs[index] != epoch:
+            self.slots[index].reset()
+            self.slot_epochs[index] = epoch
+        self._current = self.slots[index]
+        self._slot_end = (epoch + 1) * self.slot_width
+
+    def record(self, seconds: float, now: Optional[float] = None):
+        """Record one observation"""
+        if now is None:
+            now = time.monotonic()
+        if now >= self._slot_end:
+            self._advance(now)
+        self._current.record(seconds)
+        self.total_count += 1
+        self.total_sum += seconds
+
+    def window(self, now: Optional[float] = None) -> LatencyHistogram:
+        """Merge the slots that are still inside the sliding window"""
+        epoch = int((time.monotonic() if now is None else now) / self.slot_width)
+        oldest = epoch - len(self.slots) + 1
+        merged = LatencyHistogram()
+        for slot, slot_epoch in zip(self.slots, self.slot_epochs):
+            if oldest <= slot_epoch <= epoch:
+                merged.merge(slot)
+        return merged
+
+    def percentile(self, q: float) -> float:
+        """Get the windowed value at quantile q (0-100), in seconds"""
+        return self.window().percentile(q)
+
+    def summary(self, quantiles: Iterable[float] = (50, 95, 99)) -> Dict[str, float]:
+        """Summarize the sliding window, plus all-time count and sum"""
+        result = self.window().summary(quantiles)
+        result["total_count"] = self.total_count
+        result["total_sum"] = self.total_sum
+        return result
+
+
+class StageLatency:
+    """Per-agent latency histograms for each request stage and each tool"""
+
+    # execution encloses history_fetch, tool_resolution, tool_calls and generation
+    STAGES = ("queue_wait", "history_fetch", "tool_resolution", "tool_calls", "generation", "execution", "delivery")
+
+    def __init__(self, window_seconds: float = 60.0, max_tools: int = 64):
+        self.window_seconds = window_seconds
+        self.max_tools = max_tools
+        self.queue_wait = WindowedHistogram(window_seconds)
+        self.history_fetch = WindowedHistogram(window_seconds)
+        self.tool_resolution = WindowedHistogram(window_seconds)
+        self.tool_calls = WindowedHistogram(window_seconds)
+        self.generation = WindowedHistogram(window_seconds)
+        self.execution = WindowedHistogram(window_seconds)
+        self.delivery = WindowedHistogram(window_seconds)
+        self.tools: Dict[str, WindowedHistogram] = {}
+
+    def record_tool(self, tool: str, seconds: float):
+        """Record one call of a tool; tools beyond max_tools share one overflow histogram"""
+        histogram = self.tools.get(tool)
+        if histogram is None:
+            if len(self.tools) >= self.max_tools:
+                tool = OVERFLOW_LABEL_VALUE
+                histogram = self.tools.get(tool)
+            if histogram is None:
+                histogram = self.tools[tool] = WindowedHistogram(self.window_seconds)
+        histogram.record(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Summarize all stages"""
+        return {stage: getattr(self, stage).summary() for stage in self.STAGES}
+
+    def tool_summary(self) -> Dict[str, Dict[str, float]]:
+        """Summarize each tool's call latency"""
+        return {tool: histogram.summary() for tool, histogram in self.tools.items()}
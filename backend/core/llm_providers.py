@@ -0,0 +1,483 @@
+"""
+LLM Providers
+One long-lived, pooled HTTP client per model provider, with retries and jittered backoff
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import httpx
+from pydantic import BaseModel
+
+from .deadline import DeadlineExceeded, bounded_timeout, check_deadline, remaining, with_deadline
+from .hedging import HedgePolicy, Hedger
+from .metrics import REGISTRY
+from .rate_limiter import ProviderRateLimiter
+
+logger = logging.getLogger(__name__)
+
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "llm_request_duration_seconds",
+    "Model provider request latency per attempt",
+    ["provider"]
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "llm_requests_total",
+    "Model provider calls by outcome",
+    ["provider", "outcome"]
+)
+LLM_RETRIES = REGISTRY.counter(
+    "llm_request_retries_total",
+    "Model provider attempts that were retried",
+    ["provider"]
+)
+LLM_REROUTES = REGISTRY.counter(
+    "llm_rate_limit_reroutes_total",
+    "Model calls moved to an overflow provider to avoid waiting for quota",
+    ["provider", "overflow"]
+)
+
+# Responses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class ProviderError(Exception):
+    """A model provider call failed"""
+
+    def __init__(self, provider: str, message: str, status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code is None or self.status_code in RETRYABLE_STATUS
+
+
+class ProviderConfig(BaseModel):
+    """Connection and retry settings for one provider"""
+    name: str
+    # Wire format: "openai" (also Groq and the mock server) or "anthropic"
+    kind: str = "openai"
+    base_url: str
+    api_key: Optional[str] = None
+    # Model name prefixes routed to this provider
+    models: List[str] = []
+    http2: bool = True
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    max_retries: int = 3
+    backoff_base: float = 0.25
+    backoff_max: float = 8.0
+    # Backup provider (and optionally model) raced against slow calls when hedging is on
+    hedge_provider: Optional[str] = None
+    hedge_model: Optional[str] = None
+    # Fixed hedge delay in seconds instead of the observed latency quantile
+    hedge_threshold: Optional[float] = None
+    # Quota of this API key; learned from rate-limit response headers when unset
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    # Provider (and optionally model) that takes calls which would otherwise
+    # wait longer than max_queue_wait for this provider's quota
+    overflow_provider: Optional[str] = None
+    overflow_model: Optional[str] = None
+    max_queue_wait: float = 2.0
+
+
+class CompletionRequest(BaseModel):
+    """A provider-neutral chat completion request"""
+    model: str
+    messages: List[Dict[str, str]]
+    system: Optional[str] = None
+    max_tokens: int = 1024
+    temperature: float = 0.7
+
+
+class CompletionResult(BaseModel):
+    """The text and accounting of a completed model call"""
+    text: str
+    provider: str
+    model: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    latency: float = 0.0
+    attempts: int = 1
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: random.Random = random) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]"""
+    return rng.uniform(0.0, min(cap, base * (2 ** attempt)))
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class LLMProvider:
+    """Base provider: owns one AsyncClient for its lifetime and retries transient failures.
+
+    Subclasses translate CompletionRequest to and from their wire format.
+    """
+
+    path = "/chat/completions"
+
+    def __init__(self, config: ProviderConfig, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.config = config
+        self.name = config.name
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._rng = random.Random()
+        self.limiter = ProviderRateLimiter(config.name, config.requests_per_minute, config.tokens_per_minute)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared client, created on first use"""
+        if self._client is None:
+            self._client = self._build_client()
+        return self._client
+
+    def _build_client(self) -> httpx.AsyncClient:
+        config = self.config
+        http2 = config.http2 and self._transport is None
+        if http2 and not _http2_available():
+            logger.warning(f"Provider {self.name}: h2 is not installed, using HTTP/1.1")
+            http2 = False
+        return httpx.AsyncClient(
+            base_url=config.base_url,
+            headers=self._headers(),
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry
+            ),
+            timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+            transport=self._transport
+        )
+
+    async def start(self):
+        """Open the client ahead of the first call"""
+        _ = self.client
+
+    async def close(self):
+        """Close the client and its pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"content-type": "application/json"}
+        if self.config.api_key:
+            headers["authorization"] = f"Bearer {self.config.api_key}"
+        return headers
+
+    def _payload(self, request: CompletionRequest) -> Dict[str, Any]:
+        messages = list(request.messages)
+        if request.system:
+            messages.insert(0, {"role": "system", "content": request.system})
+        return {
+            "model": request.model,
+            "messages": messages,
+            "max_tokens": request.max_tokens,
+            "temperature": request.temperature
+        }
+
+    def _parse(self, data: Dict[str, Any]) -> Tuple[str, int, int]:
+        """Extract (text, input_tokens, output_tokens) from a response body"""
+        usage = data.get("usage") or {}
+        return (
+            data["choices"][0]["message"]["content"],
+            usage.get("prompt_tokens", 0),
+            usage.get("completion_tokens", 0)
+        )
+
+    async def complete(self, request: CompletionRequest) -> CompletionResult:
+        """Run a completion, retrying transient failures within the request deadline.
+
+        Every attempt first waits for this provider's request and token quota.
+        """
+        started = time.perf_counter()
+        cost = self.limiter.estimate_tokens(request)
+        attempt = 0
+        while True:
+            check_deadline()
+            try:
+                await self.limiter.acquire(cost)
+                text, input_tokens, output_tokens = await self._attempt(request, cost)
+                LLM_REQUESTS.labels(self.name, "success").inc()
+                return CompletionResult(
+                    text=text,
+                    provider=self.name,
+                    model=request.model,
+                    input_tokens=input_tokens,
+                    output_tokens=output_tokens,
+                    latency=time.perf_counter() - started,
+                    attempts=attempt + 1
+                )
+            except ProviderError as e:
+                if not e.retryable or attempt >= self.config.max_retries:
+                    LLM_REQUESTS.labels(self.name, "error").inc()
+                    raise
+
+                delay = backoff_delay(attempt, self.config.backoff_base, self.config.backoff_max, self._rng)
+                if e.retry_after is not None:
+                    delay = max(delay, min(e.retry_after, self.config.backoff_max))
+                left = remaining()
+                if left is not None and left <= delay:
+                    LLM_REQUESTS.labels(self.name, "error").inc()
+                    raise
+                logger.warning(f"Retrying {self.name} in {delay:.2f}s after: {e}")
+                LLM_RETRIES.labels(self.name).inc()
+                attempt += 1
+                if e.status_code == 429:
+                    # Hold back every caller of this key, not just this one; acquire() does the waiting
+                    self.limiter.block(delay)
+                else:
+                    await asyncio.sleep(delay)
+            except (DeadlineExceeded, asyncio.CancelledError):
+                LLM_REQUESTS.labels(self.name, "cancelled").inc()
+                raise
+
+    async def _attempt(self, request: CompletionRequest, cost: int) -> Tuple[str, int, int]:
+        """Send one HTTP request holding a quota reservation of cost tokens, mapping failures to ProviderError"""
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        try:
+            response = await with_deadline(self.client.post(
+                self.path,
+                json=self._payload(request),
+                timeout=bounded_timeout(self.config.read_timeout)
+            ))
+        except httpx.TransportError as e:
+            self.limiter.release(cost)
+            raise ProviderError(self.name, f"{type(e).__name__}: {e}") from e
+        finally:
+            LLM_REQUEST_SECONDS.labels(self.name).observe(loop.time() - start)
+
+        self.limiter.update_from_headers(response.headers)
+        if response.status_code >= 400:
+            self.limiter.release(cost)
+            retry_after = response.headers.get("retry-after")
+            try:
+                retry_after = float(retry_after) if retry_after is not None else None
+            except ValueError:
+                retry_after = None
+            raise ProviderError(
+                self.name, f"HTTP {response.status_code}: {response.text[:200]}",
+                status_code=response.status_code, retry_after=retry_after
+            )
+        text, input_tokens, output_tokens = self._parse(response.json())
+        if input_tokens or output_tokens:
+            self.limiter.settle(cost, input_tokens + output_tokens)
+        return text, input_tokens, output_tokens
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI chat completions format, also spoken by Groq and the mock server"""
+
+
+class AnthropicProvider(LLMProvider):
+    """Anthropic messages format"""
+
+    path = "/v1/messages"
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"content-type": "application/json", "anthropic-version": "2023-06-01"}
+        if self.config.api_key:
+            headers["x-api-key"] = self.config.api_key
+        return headers
+
+    def _payload(self, request: CompletionRequest) -> Dict[str, Any]:
+        payload = {
+            "model": request.model,
+            "messages": request.messages,
+            "max_tokens": request.max_tokens,
+            "temperature": request.temperature
+        }
+        if request.system:
+            payload["system"] = request.system
+        return payload
+
+    def _parse(self, data: Dict[str, Any]) -> Tuple[str, int, int]:
+        usage = data.get("usage") or {}
+        text = "".join(block.get("text", "") for block in data.get("content", []) if block.get("type") == "text")
+        return text, usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+
+def _pairs(value: Optional[str]) -> List[Tuple[str, str]]:
+    """Parse "key=value,key=value" settings"""
+    pairs = []
+    for item in (value or "").split(","):
+        key, _, val = item.strip().partition("=")
+        if key and val:
+            pairs.append((key.strip(), val.strip()))
+    return pairs
+
+
+PROVIDER_KINDS: Dict[str, Type[LLMProvider]] = {
+    "openai": OpenAIProvider,
+    "anthropic": AnthropicProvider
+}
+
+
+class ProviderRegistry:
+    """The process-wide set of providers, routed by model name prefix"""
+
+    def __init__(self, default: Optional[str] = None, hedger: Optional[Hedger] = None):
+        self.providers: Dict[str, LLMProvider] = {}
+        self.default = default
+        # Races slow calls against their provider's hedge_provider when set
+        self.hedger = hedger
+
+    def add(self, config: ProviderConfig, transport: Optional[httpx.AsyncBaseTransport] = None) -> LLMProvider:
+        """Register a provider built from its config"""
+        if config.kind not in PROVIDER_KINDS:
+            raise ValueError(f"Unknown provider kind: {config.kind}")
+        provider = PROVIDER_KINDS[config.kind](config, transport)
+        self.providers[config.name] = provider
+        return provider
+
+    def get(self, name: str) -> Optional[LLMProvider]:
+        return self.providers.get(name)
+
+    def for_model(self, model: str) -> Optional[LLMProvider]:
+        """Pick the provider serving a model, falling back to the default provider"""
+        for provider in self.providers.values():
+            if any(model.startswith(prefix) for prefix in provider.config.models):
+                return provider
+        return self.providers.get(self.default) if self.default else None
+
+    def _route(self, provider: LLMProvider, request: CompletionRequest) -> Tuple[LLMProvider, CompletionRequest]:
+        """Move a call to the overflow provider when the primary's quota would keep it waiting too long"""
+        config = provider.config
+        overflow = self.providers.get(config.overflow_provider) if config.overflow_provider else None
+        if overflow is None:
+            return provider, request
+
+        cost = provider.limiter.estimate_tokens(request)
+        if provider.limiter.queue_wait(cost) <= config.max_queue_wait:
+            return provider, request
+        if overflow.limiter.queue_wait(cost) > config.max_queue_wait:
+            return provider, request
+
+        logger.debug(f"Rerouting {request.model} from {provider.name} to {overflow.name} to avoid a quota wait")
+        LLM_REROUTES.labels(provider.name, overflow.name).inc()
+        return overflow, request.copy(update={"model": config.overflow_model or request.model})
+
+    def is_saturated(self, model: str) -> bool:
+        """Whether calls for model are queued for quota with nowhere else to go"""
+        provider = self.for_model(model)
+        if provider is None or not provider.limiter.saturated:
+            return False
+        overflow = self.providers.get(provider.config.overflow_provider or "")
+        return overflow is None or overflow.limiter.saturated
+
+    async def wait_for_quota(self, model: str):
+        """Return once a call for model would not have to queue behind others for quota"""
+        while self.is_saturated(model):
+            await self.for_model(model).limiter.drained()
+
+    async def complete(self, request: CompletionRequest) -> CompletionResult:
+        """Run a completion on the provider serving its model, rerouting quota-bound calls
+        and hedging slow calls if configured"""
+        provider = self.for_model(request.model)
+        if provider is None:
+            raise ValueError(f"No provider serves model {request.model}")
+
+        provider, request = self._route(provider, request)
+        config = provider.config
+        backup = self.providers.get(config.hedge_provider) if config.hedge_provider else None
+        if not self.hedger or backup is None or backup is provider and not config.hedge_model:
+            return await provider.complete(request)
+
+        backup_request = request.copy(update={"model": config.hedge_model or request.model})
+        return await self.hedger.run(
+            provider.name, lambda: provider.complete(request),
+            f"{backup.name}:{backup_request.model}", lambda: backup.complete(backup_request),
+            threshold=config.hedge_threshold
+        )
+
+    async def start(self):
+        for provider in self.providers.values():
+            await provider.start()
+
+    async def close(self):
+        for provider in self.providers.values():
+            await provider.close()
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "ProviderRegistry":
+        """Build providers for every configured API key (and the mock server, if set)"""
+        shared = dict(
+            http2=settings.llm_http2,
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            max_retries=settings.llm_max_retries,
+            max_queue_wait=settings.llm_max_queue_wait
+        )
+        registry = cls()
+        if settings.openai_api_key:
+            registry.add(ProviderConfig(
+                name="openai", base_url="https://api.openai.com/v1", api_key=settings.openai_api_key,
+                models=["gpt-", "o1", "o3"], **shared
+            ))
+        if settings.anthropic_api_key:
+            registry.add(ProviderConfig(
+                name="anthropic", kind="anthropic", base_url="https://api.anthropic.com",
+                api_key=settings.anthropic_api_key, models=["claude"], **shared
+            ))
+        if settings.groq_api_key:
+            registry.add(ProviderConfig(
+                name="groq", base_url="https://api.groq.com/openai/v1", api_key=settings.groq_api_key,
+                models=["llama", "mixtral", "gemma"], **shared
+            ))
+        if settings.llm_mock_url:
+            # Serves every model no other provider claims, for offline runs
+            registry.add(ProviderConfig(name="mock", base_url=settings.llm_mock_url, models=["mock"], **shared))
+            registry.default = "mock"
+
+        # "openai=500/150000,anthropic=50/40000": requests and tokens per minute
+        for name, limits in _pairs(settings.llm_rate_limits):
+            provider = registry.providers.get(name)
+            if provider is None:
+                logger.warning(f"Rate limits given for unconfigured provider {name}")
+                continue
+            rpm, _, tpm = limits.partition("/")
+            provider.limiter = ProviderRateLimiter(name, float(rpm) if rpm else None, float(tpm) if tpm else None)
+
+        # "anthropic=openai:gpt-4o-mini": where calls go instead of queueing for quota
+        for name, target in _pairs(settings.llm_overflow):
+            overflow, _, model = target.partition(":")
+            if name not in registry.providers or overflow not in registry.providers:
+                logger.warning(f"Overflow {name}={target} names an unconfigured provider")
+                continue
+            registry.providers[name].config.overflow_provider = overflow
+            registry.providers[name].config.overflow_model = model or None
+
+        # "provider" or "provider:model" backs up every other provider's slow calls
+        if settings.llm_hedge_backup:
+            backup, _, model = settings.llm_hedge_backup.partition(":")
+            if backup not in registry.providers:
+                logger.warning(f"Hedge backup provider {backup} is not configured; hedging disabled")
+            else:
+                registry.hedger = Hedger(HedgePolicy(
+                    quantile=settings.llm_hedge_quantile,
+                    max_hedge_ratio=settings.llm_hedge_max_ratio
+                ))
+                for provider in registry.providers.values():
+                    if provider.name != backup or model:
+                        provider.config.hedge_provider = backup
+                        provider.config.hedge_model = model or None
+        return registry
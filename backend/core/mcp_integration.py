@@ -17,8 +17,25 @@ import websockets
 import httpx
 from pydantic import BaseModel
 
+from .deadline import bounded_timeout, with_deadline
+from .metrics import REGISTRY
+
 logger = logging.getLogger(__name__)
 
+# Tool names come from MCP server configs, so cap the series per metric
+MCP_TOOL_CALL_SECONDS = REGISTRY.histogram(
+    "mcp_tool_call_duration_seconds",
+    "MCP tool call latency",
+    ["server", "tool"],
+    max_series=500
+)
+MCP_TOOL_CALL_ERRORS = REGISTRY.counter(
+    "mcp_tool_call_errors_total",
+    "MCP tool calls that raised an error",
+    ["server", "tool"],
+    max_series=500
+)
+
 
 @dataclass
 class MCPServerConfig:
@@ -123,7 +140,7 @@ class MCPServerProcess:
             # Read response with timeout
             response_line = await asyncio.wait_for(
                 asyncio.to_thread(self.process.stdout.readline),
-                timeout=self.config.timeout
+                timeout=bounded_timeout(self.config.timeout)
             )
             
             if response_line:
@@ -192,7 +209,7 @@ class MCPServerProcess:
             # Read response with timeout
             response_line = await asyncio.wait_for(
                 asyncio.to_thread(self.process.stdout.readline),
-                timeout=self.config.timeout
+                timeout=bounded_timeout(self.config.timeout)
             )
             
             if response_line:
@@ -261,6 +278,8 @@ class MCPServerManager:
         self.servers: Dict[str, MCPServerProcess] = {}
         self.tools: Dict[str, MCPTool] = {}  # tool_name -> tool
         self.server_configs: Dict[str, MCPServerConfig] = {}
+        # Bumped whenever the tool registry changes so dependent caches can rebuild
+        self.tools_version = 0
     
     async def initialize(self):
         """Initialize MCP server manager"""
@@ -326,6 +345,7 @@ class MCPServerManager:
             except Exception as e:
                 logger.error(f"Failed to start MCP server {server_name}: {e}")
                 # Continue with other servers
+        self.tools_version += 1
     
     async def add_server(self, config: MCPServerConfig) -> bool:
         """Add and start a new MCP server"""
@@ -343,6 +363,7 @@ class MCPServerManager:
             # Register tools
             for tool in server.tools:
                 self.tools[tool.name] = tool
+            self.tools_version += 1
             
             logger.info(f"Added MCP server: {config.name}")
             return True
@@ -365,6 +386,7 @@ class MCPServerManager:
             tools_to_remove = [name for name, tool in self.tools.items() if tool.server_name == server_name]
             for tool_name in tools_to_remove:
                 del self.tools[tool_name]
+            self.tools_version += 1
             
             del self.servers[server_name]
             if server_name in self.server_configs:
@@ -387,7 +409,16 @@ class MCPServerManager:
         if not server:
             raise RuntimeError(f"Server {tool.server_name} not available")
         
-        return await server.call_tool(tool_name, arguments)
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+        try:
+            # Cancel the call if the request's deadline passes first
+            return await with_deadline(server.call_tool(tool_name, arguments))
+        except Exception:
+            MCP_TOOL_CALL_ERRORS.labels(tool.server_name, tool_name).inc()
+            raise
+        finally:
+            MCP_TOOL_CALL_SECONDS.labels(tool.server_name, tool_name).observe(loop.time() - start_time)
     
     async def list_tools(self) -> List[Dict[str, Any]]:
         """List all available tools from all servers"""
@@ -456,6 +487,7 @@ class MCPServerManager:
             tools_to_remove = [name for name, tool in self.tools.items() if tool.server_name == server_name]
             for tool_name in tools_to_remove:
                 del self.tools[tool_name]
+            self.tools_version += 1
             
             # Start new server
             new_server = MCPServerProcess(config)
@@ -466,6 +498,7 @@ class MCPServerManager:
             # Register new tools
             for tool in new_server.tools:
                 self.tools[tool.name] = tool
+            self.tools_version += 1
             
             logger.info(f"Restarted MCP server: {server_name}")
             return True
@@ -486,6 +519,7 @@ class MCPServerManager:
             self.servers.clear()
             self.tools.clear()
             self.server_configs.clear()
+            self.tools_version += 1
             
             logger.info("MCP Server Manager cleanup complete")
             
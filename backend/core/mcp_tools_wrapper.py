@@ -92,6 +92,8 @@ class MCPToolsetManager:
         self.mcp_manager = mcp_manager
         self.tool_wrappers: Dict[str, MCPToolWrapper] = {}
         self.toolsets: Dict[str, List[MCPToolWrapper]] = {}
+        # Server registry version the wrappers were built from
+        self.registry_version = -1
     
     async def initialize(self):
         """Initialize the toolset manager"""
@@ -112,6 +114,7 @@ class MCPToolsetManager:
     
     async def _create_tool_wrappers(self):
         """Create ADK-compatible wrappers for all MCP tools"""
+        self.registry_version = self.mcp_manager.tools_version
         for tool_name, mcp_tool in self.mcp_manager.tools.items():
             wrapper = MCPToolWrapper(mcp_tool, self.mcp_manager)
             self.tool_wrappers[tool_name] = wrapper
@@ -178,6 +181,16 @@ class MCPToolsetManager:
             for name, tools in self.toolsets.items()
         }
     
+    @property
+    def is_stale(self) -> bool:
+        """Whether MCP servers were added, removed or restarted since the last build"""
+        return self.registry_version != self.mcp_manager.tools_version
+    
+    async def sync(self):
+        """Rebuild wrappers and toolsets if the server registry has changed"""
+        if self.is_stale:
+            await self.refresh_tools()
+    
     async def refresh_tools(self):
         """Refresh tools from MCP servers"""
         try:
@@ -0,0 +1,304 @@
+"""
+Metrics Registry
+Low-overhead counters, gauges and histograms rendered in the Prometheus text format
+"""
+
+import bisect
+import logging
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Series beyond a metric's limit are folded into this label value
+OVERFLOW_LABEL_VALUE = "__overflow__"
+DEFAULT_MAX_SERIES = 1000
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value for the text exposition format"""
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, int) or (value.is_integer() and abs(value) < 1e15):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class MetricFamily:
+    """A rendered metric with its samples, as produced by collectors"""
+
+    def __init__(self, name: str, metric_type: str, documentation: str, max_series: int = DEFAULT_MAX_SERIES):
+        self.name = name
+        self.type = metric_type
+        self.documentation = documentation
+        self.max_series = max_series
+        self.samples: List[Tuple[str, Dict[str, str], float]] = []
+        self._series = set()
+
+    def add(self, labels: Dict[str, str], value: float, suffix: str = ""):
+        """Add a sample; samples of series past the series limit are dropped"""
+        series = tuple(item for item in labels.items() if item[0] not in ("le", "quantile"))
+        if series not in self._series:
+            if len(self._series) >= self.max_series:
+                return
+            self._series.add(series)
+        self.samples.append((self.name + suffix, labels, value))
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, labels, value in self.samples:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class _Metric:
+    """Base for instruments with a bounded set of label combinations"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), max_series: int = DEFAULT_MAX_SERIES):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        self._overflowed = False
+        if not self.labelnames:
+            self._default = self._series[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str, **kwargs: str):
+        """Get the child instrument for a label combination"""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+
+        child = self._series.get(values)
+        if child is not None:
+            return child
+
+        with self._lock:
+            child = self._series.get(values)
+            if child is not None:
+                return child
+            if len(self._series) >= self.max_series:
+                # Cardinality guard: fold new series into a single overflow series
+                if not self._overflowed:
+                    self._overflowed = True
+                    logger.warning(f"Metric {self.name} exceeded {self.max_series} series; folding new labels")
+                values = (OVERFLOW_LABEL_VALUE,) * len(self.labelnames)
+                child = self._series.get(values)
+                if child is not None:
+                    return child
+            child = self._series[values] = self._new_child()
+            return child
+
+    def remove(self, *values: str):
+        """Drop the series for a label combination"""
+        with self._lock:
+            self._series.pop(tuple(str(value) for value in values), None)
+
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(self.name, self.metric_type, self.documentation, max_series=self.max_series + 1)
+        for values, child in list(self._series.items()):
+            self._collect_child(family, dict(zip(self.labelnames, values)), child)
+        return family
+
+    def _collect_child(self, family: MetricFamily, labels: Dict[str, str], child):
+        family.add(labels, child.value)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "buckets", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.buckets = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.buckets[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    """Gauge that can go up and down"""
+
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+    def set(self, value: float):
+        self._default.set(value)
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, max_series: int = DEFAULT_MAX_SERIES):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, max_series)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _collect_child(self, family: MetricFamily, labels: Dict[str, str], child):
+        cumulative = 0
+        for bound, count in zip(self.upper_bounds + (math.inf,), child.buckets):
+            cumulative += count
+            family.add({**labels, "le": _format_value(bound)}, cumulative, suffix="_bucket")
+        family.add(labels, child.sum, suffix="_sum")
+        family.add(labels, child.count, suffix="_count")
+
+
+Collector = Callable[[], Iterable[MetricFamily]]
+
+
+class MetricsRegistry:
+    """Holds instruments and scrape-time collectors"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Collector] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.metric_type}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                max_series: int = DEFAULT_MAX_SERIES) -> Counter:
+        """Get or create a counter"""
+        return self._get_or_create(Counter, name, documentation, labelnames, max_series=max_series)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              max_series: int = DEFAULT_MAX_SERIES) -> Gauge:
+        """Get or create a gauge"""
+        return self._get_or_create(Gauge, name, documentation, labelnames, max_series=max_series)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS, max_series: int = DEFAULT_MAX_SERIES) -> Histogram:
+        """Get or create a histogram"""
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets, max_series=max_series)
+
+    def register_collector(self, key: str, collector: Collector):
+        """Register (or replace) a scrape-time collector"""
+        self._collectors[key] = collector
+
+    def unregister_collector(self, key: str):
+        """Remove a scrape-time collector"""
+        self._collectors.pop(key, None)
+
+    def collect(self) -> List[MetricFamily]:
+        """Collect every instrument and collector"""
+        families = [metric.collect() for metric in list(self._metrics.values())]
+        for key, collector in list(self._collectors.items()):
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector {key} failed: {e}")
+        return families
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for family in self.collect():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+def summary_family(name: str, documentation: str, max_series: int = DEFAULT_MAX_SERIES) -> MetricFamily:
+    """Create a summary family for exporting precomputed quantiles"""
+    return MetricFamily(name, "summary", documentation, max_series=max_series)
+
+
+def add_latency_summary(family: MetricFamily, labels: Dict[str, str], summary: Dict[str, float],
+                        quantiles: Iterable[float] = (50, 95, 99)):
+    """Add a windowed latency summary to a summary family.
+
+    Quantiles cover the sliding window; _sum and _count are cumulative.
+    """
+    for q in quantiles:
+        family.add({**labels, "quantile": _format_value(q / 100.0)}, summary[f"p{q:g}"])
+    family.add(labels, summary["total_sum"], suffix="_sum")
+    family.add(labels, summary["total_count"], suffix="_count")
+
+
+# Process-wide default registry
+REGISTRY = MetricsRegistry()
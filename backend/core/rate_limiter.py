@@ -0,0 +1,231 @@
+"""
+Provider Rate Limiting
+Request and token buckets per provider key, fed by estimates and response headers
+"""
+
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Mapping, Optional
+
+from .deadline import DeadlineExceeded, remaining, with_deadline
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LLM_RATE_LIMIT_WAIT = REGISTRY.histogram(
+    "llm_rate_limit_wait_seconds",
+    "Time model calls waited for provider quota",
+    ["provider"]
+)
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds until a rate-limit window resets.
+
+    Accepts OpenAI/Groq durations ("1s", "6m0s", "20ms"), plain seconds and
+    Anthropic RFC 3339 timestamps.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    parts = _DURATION.findall(value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * _UNIT_SECONDS[unit] for number, unit in parts)
+
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if reset_at.tzinfo is None:
+        reset_at = reset_at.replace(tzinfo=timezone.utc)
+    return max(reset_at.timestamp() - (time.time() if now is None else now), 0.0)
+
+
+def _header_number(headers: Mapping[str, str], *names: str) -> Optional[float]:
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+class TokenBucket:
+    """Continuously refilling bucket; the balance may go negative after a corrected estimate"""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, per_minute: float, now: Optional[float] = None):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic() if now is None else now
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available"""
+        self.refill(now)
+        needed = amount - self.tokens
+        return max(needed / self.rate, 0.0) if self.rate > 0 else 0.0
+
+    def resize(self, per_minute: float):
+        if per_minute != self.capacity:
+            self.capacity = per_minute
+            self.rate = per_minute / 60.0
+            self.tokens = min(self.tokens, per_minute)
+
+    def observe_remaining(self, remaining_amount: float, reset_seconds: Optional[float], now: float):
+        """Align with the provider's count when it is lower than ours"""
+        self.refill(now)
+        if remaining_amount < self.tokens:
+            self.tokens = remaining_amount
+        if reset_seconds and remaining_amount < self.capacity:
+            # The provider refills the rest by the reset time; never assume faster than that
+            self.rate = max(min(self.rate, (self.capacity - remaining_amount) / reset_seconds), self.capacity / 3600.0)
+        else:
+            self.rate = self.capacity / 60.0
+
+
+class ProviderRateLimiter:
+    """Requests-per-minute and tokens-per-minute budgets for one provider key.
+
+    Calls reserve their estimated token cost before being sent and wait, in
+    FIFO order, until both buckets can cover it, so bursts queue here instead
+    of turning into 429s. Estimates are corrected with actual usage, and
+    limits not configured up front are learned from rate-limit headers.
+    """
+
+    def __init__(self, name: str, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        # Callers waiting in acquire() and the tokens they asked for
+        self.waiting = 0
+        self.waiting_tokens = 0.0
+        self._drained = asyncio.Event()
+        self._drained.set()
+
+    @staticmethod
+    def estimate_tokens(request: Any) -> int:
+        """Rough token cost of a completion: ~4 characters per input token plus the output cap"""
+        characters = len(request.system or "") + sum(len(message.get("content", "")) for message in request.messages)
+        return characters // 4 + 1 + request.max_tokens
+
+    def _wait(self, requests: float, tokens: float, now: float) -> float:
+        wait = max(self._blocked_until - now, 0.0)
+        if self.requests:
+            wait = max(wait, self.requests.wait_time(requests, now))
+        if self.tokens:
+            # A call bigger than the whole bucket waits for a full bucket and runs into debt
+            wait = max(wait, self.tokens.wait_time(min(tokens, self.tokens.capacity), now))
+        return wait
+
+    def wait_time(self, cost: float, now: Optional[float] = None) -> float:
+        """Seconds until a call costing cost tokens could be sent, ignoring queued callers"""
+        return self._wait(1, cost, time.monotonic() if now is None else now)
+
+    def queue_wait(self, cost: float, now: Optional[float] = None) -> float:
+        """Seconds a new call costing cost tokens would wait behind the callers already queued"""
+        now = time.monotonic() if now is None else now
+        wait = self._wait(1 + self.waiting, 0, now)
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(self.waiting_tokens + min(cost, self.tokens.capacity), now))
+        return wait
+
+    @property
+    def saturated(self) -> bool:
+        """Whether calls are currently queued for quota"""
+        return self.waiting > 0
+
+    async def drained(self):
+        """Wait until no call is queued for quota"""
+        await self._drained.wait()
+
+    async def acquire(self, cost: float):
+        """Wait for quota and reserve one request and cost tokens.
+
+        Raises DeadlineExceeded right away if the quota cannot be had before
+        the current request deadline.
+        """
+        start = time.monotonic()
+        self.waiting += 1
+        self.waiting_tokens += cost
+        self._drained.clear()
+        try:
+            # The lock keeps waiters in arrival order
+            await with_deadline(self._lock.acquire())
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self.wait_time(cost, now)
+                    if wait <= 0:
+                        break
+                    left = remaining()
+                    if left is not None and left < wait:
+                        raise DeadlineExceeded(f"{self.name} quota not available before the deadline")
+                    await asyncio.sleep(wait)
+                if self.requests:
+                    self.requests.tokens -= 1
+                if self.tokens:
+                    self.tokens.tokens -= cost
+            finally:
+                self._lock.release()
+        finally:
+            self.waiting -= 1
+            self.waiting_tokens -= cost
+            if not self.waiting:
+                self._drained.set()
+            LLM_RATE_LIMIT_WAIT.labels(self.name).observe(time.monotonic() - start)
+
+    def settle(self, estimated: float, actual: float):
+        """Correct a reservation with the tokens the call actually used"""
+        if self.tokens:
+            self.tokens.tokens += estimated - actual
+
+    def release(self, estimated: float):
+        """Return the token reservation of a call that was never answered"""
+        if self.tokens:
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + estimated)
+
+    def block(self, seconds: float):
+        """Stop dispatching for a while, e.g. after a 429 with Retry-After"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Learn limits and remaining quota from OpenAI/Groq or Anthropic rate-limit headers"""
+        now = time.monotonic()
+        for kind in ("requests", "tokens"):
+            limit = _header_number(headers, f"x-ratelimit-limit-{kind}", f"anthropic-ratelimit-{kind}-limit")
+            left = _header_number(headers, f"x-ratelimit-remaining-{kind}", f"anthropic-ratelimit-{kind}-remaining")
+            reset = parse_reset(
+                headers.get(f"x-ratelimit-reset-{kind}") or headers.get(f"anthropic-ratelimit-{kind}-reset")
+            )
+
+            bucket = getattr(self, kind)
+            if limit:
+                if bucket is None:
+                    bucket = TokenBucket(limit, now)
+                    setattr(self, kind, bucket)
+                else:
+                    bucket.resize(limit)
+            if bucket is not None and left is not None:
+                bucket.observe_remaining(left, reset, now)
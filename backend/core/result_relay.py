@@ -0,0 +1,105 @@
+"""
+Result Relay
+Returns agent request outcomes over Redis pub/sub to the replica that accepted the request
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RESULTS_RELAYED = REGISTRY.counter(
+    "agent_results_relayed_total",
+    "Request outcomes sent to or received from the replica that accepted the request, by direction",
+    ["direction"]
+)
+
+# Each replica receives the outcomes of the requests it accepted on its own channel under this prefix
+CHANNEL_PREFIX = "agent_results:"
+
+# Called with an outcome: request_id, status and any result, error, response_time and timings
+OutcomeHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class ResultRelay:
+    """Delivers request outcomes from the worker's replica to the accepting one.
+
+    With a shared queue backend, a request accepted here may be processed
+    by a worker on any replica, while its result record (and any caller
+    waiting on it) lives on this one. Requests carry this replica's id as
+    reply_to; a worker elsewhere publishes the outcome on that replica's
+    channel instead of resolving it locally.
+
+    Pub/sub is fire-and-forget: an outcome published while the accepting
+    replica is (re)subscribing is lost, and the request's record stays
+    unresolved until it expires.
+    """
+
+    def __init__(self, redis: Any, replica_id: Optional[str] = None, prefix: str = CHANNEL_PREFIX):
+        self.redis = redis
+        self.replica_id = replica_id or uuid.uuid4().hex
+        self.prefix = prefix
+        self._handler: Optional[OutcomeHandler] = None
+        self._task: Optional[asyncio.Task] = None
+        self._subscribed = asyncio.Event()
+
+    async def start(self, handler: OutcomeHandler):
+        """Start handing outcomes published for this replica to handler"""
+        self._handler = handler
+        self._task = asyncio.create_task(self._listen())
+        # Requests queued before the subscription is live could not be answered
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), 5.0)
+        except asyncio.TimeoutError:
+            logger.warning("Result relay is not subscribed yet; remote outcomes may be missed")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def is_remote(self, reply_to: Optional[str]) -> bool:
+        """Whether a request's outcome belongs to another replica"""
+        return bool(reply_to) and reply_to != self.replica_id
+
+    async def publish(self, reply_to: str, outcome: Dict[str, Any]):
+        """Send an outcome to the replica that accepted the request"""
+        try:
+            await self.redis.publish(self.prefix + reply_to, json.dumps(outcome, default=str))
+            RESULTS_RELAYED.labels("sent").inc()
+        except Exception as e:
+            logger.error(f"Failed to relay outcome of request {outcome.get('request_id')} to {reply_to}: {e}")
+
+    async def _listen(self):
+        """Hand outcomes to the handler, resubscribing after connection errors"""
+        channel = self.prefix + self.replica_id
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(channel)
+                self._subscribed.set()
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    RESULTS_RELAYED.labels("received").inc()
+                    try:
+                        await self._handler(json.loads(message["data"]))
+                    except Exception as e:
+                        logger.error(f"Failed to apply a relayed request outcome: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Result relay subscription failed, resubscribing: {e}")
+                await asyncio.sleep(1)
+            finally:
+                self._subscribed.clear()
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
@@ -14,8 +14,15 @@ from fastapi.middleware.base import BaseHTTPMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.responses import JSONResponse
 
+from .metrics import REGISTRY
+
 logger = logging.getLogger(__name__)
 
+RATE_LIMIT_REJECTIONS = REGISTRY.counter(
+    "rate_limit_rejections_total",
+    "Requests rejected by the rate limiter"
+)
+
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
     """Rate limiting middleware"""
@@ -40,6 +47,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         
         # Check rate limit
         if len(client_calls) >= self.calls:
+            RATE_LIMIT_REJECTIONS.inc()
             return JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 content={
@@ -14,8 +14,18 @@ import aioredis
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel
 
+from .deadline import DeadlineExceeded, with_deadline
+from .metrics import REGISTRY
+from .wire_format import encode_default
+
 logger = logging.getLogger(__name__)
 
+SESSION_CACHE_LOOKUPS = REGISTRY.counter(
+    "session_cache_lookups_total",
+    "Session lookups by cache result",
+    ["result"]
+)
+
 
 class SessionData(BaseModel):
     """Session data model"""
@@ -93,7 +103,7 @@ class SessionManager:
             await self.redis.setex(
                 f"session:{session_id}",
                 3600,  # 1 hour TTL
-                json.dumps(session_data.dict(), default=str)
+                json.dumps(session_data.dict(), default=encode_default)
             )
             
             logger.info(f"Created session: {session_id}")
@@ -107,13 +117,15 @@ class SessionManager:
         """Get session data"""
         try:
             # Try Redis first
-            cached_data = await self.redis.get(f"session:{session_id}")
+            cached_data = await with_deadline(self.redis.get(f"session:{session_id}"))
             if cached_data:
+                SESSION_CACHE_LOOKUPS.labels("hit").inc()
                 data = json.loads(cached_data)
                 return SessionData(**data)
             
             # Fallback to MongoDB
-            doc = await self.db.sessions.find_one({"session_id": session_id})
+            SESSION_CACHE_LOOKUPS.labels("miss").inc()
+            doc = await with_deadline(self.db.sessions.find_one({"session_id": session_id}))
             if doc:
                 session_data = SessionData(**doc)
                 
@@ -121,13 +133,15 @@ class SessionManager:
                 await self.redis.setex(
                     f"session:{session_id}",
                     3600,
-                    json.dumps(session_data.dict(), default=str)
+                    json.dumps(session_data.dict(), default=encode_default)
                 )
                 
                 return session_data
             
             return None
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Failed to get session {session_id}: {e}")
             return None
@@ -155,7 +169,7 @@ class SessionManager:
             await self.redis.setex(
                 f"session:{session_id}",
                 3600,
-                json.dumps(session.dict(), default=str)
+                json.dumps(session.dict(), default=encode_default)
             )
             
             logger.debug(f"Updated session: {session_id}")
@@ -164,8 +178,8 @@ class SessionManager:
             logger.error(f"Failed to update session {session_id}: {e}")
             raise
     
-    async def add_message(self, session_id: str, role: str, content: str, metadata: Dict = None):
-        """Add a message to conversation history"""
+    async def add_message(self, session_id: str, role: str, content: str, metadata: Dict = None) -> int:
+        """Add a message to conversation history, returning the history's new length"""
         message = {
             "role": role,
             "content": content,
@@ -183,6 +197,7 @@ class SessionManager:
             await self.update_session(session_id, {
                 "conversation_history": session.conversation_history
             })
+            return len(session.conversation_history)
             
         except Exception as e:
             logger.error(f"Failed to add message to session {session_id}: {e}")
@@ -198,6 +213,8 @@ class SessionManager:
             # Return last N messages
             return session.conversation_history[-limit:]
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Failed to get conversation history for {session_id}: {e}")
             return []
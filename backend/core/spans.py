@@ -0,0 +1,75 @@
+"""
+Request Stage Spans
+Lightweight wall-clock timing of the stages one agent request passes through
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+_timings: ContextVar[Optional["RequestTimings"]] = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Seconds spent per stage of one request, plus each tool call it made.
+
+    Stages may nest (execution encloses history_fetch, tool_calls and so on)
+    and a stage entered twice accumulates.
+    """
+
+    __slots__ = ("stages", "tool_calls")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.tool_calls: List[Dict[str, Any]] = []
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_tool_call(self, call_id: str, tool: str, status: str, seconds: float):
+        self.tool_calls.append({"call_id": call_id, "tool": tool, "status": status, "duration": round(seconds, 6)})
+
+    def as_dict(self) -> Dict[str, Any]:
+        """JSON-friendly breakdown for response metadata"""
+        return {
+            "stages": {stage: round(seconds, 6) for stage, seconds in self.stages.items()},
+            "tool_calls": list(self.tool_calls)
+        }
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Get the timings of the request being processed, if any"""
+    return _timings.get()
+
+
+@contextmanager
+def timings_scope(timings: RequestTimings) -> Iterator[RequestTimings]:
+    """Collect spans entered in the block (and tasks it starts) into timings"""
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the block as stage of the current request (a no-op outside one)"""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - start)
+
+
+async def timed(stage: str, awaitable: Awaitable[T]) -> T:
+    """Await under a span, e.g. for work started as a separate task"""
+    with span(stage):
+        return await awaitable
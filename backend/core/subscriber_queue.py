@@ -0,0 +1,115 @@
+"""
+Subscriber Queues
+Bounded per-subscriber event buffers that never block the publisher
+"""
+
+import asyncio
+from enum import Enum
+from typing import Any
+
+from .metrics import REGISTRY
+
+SSE_MESSAGES_DROPPED = REGISTRY.counter(
+    "sse_messages_dropped_total",
+    "Messages a full SSE subscriber buffer dropped or replaced, by overflow policy",
+    ["policy"]
+)
+SSE_SUBSCRIBERS_OVERFLOWED = REGISTRY.counter(
+    "sse_subscribers_overflowed_total",
+    "SSE subscribers whose buffer filled up, by overflow policy",
+    ["policy"]
+)
+
+# Pushed to the consumer of a disconnected queue in place of the messages it missed
+_CLOSED = object()
+
+
+class OverflowPolicy(str, Enum):
+    """What a full subscriber buffer does with a new message"""
+    # Discard the oldest buffered message
+    DROP_OLDEST = "drop_oldest"
+    # Replace the buffered message of the same type (dropping the oldest if there is none)
+    COALESCE = "coalesce"
+    # Drop everything and end the subscription; the client reconnects and resyncs
+    DISCONNECT = "disconnect"
+
+
+class SubscriberOverflow(Exception):
+    """Raised to the consumer of a queue disconnected for falling behind"""
+
+
+class SubscriberQueue(asyncio.Queue):
+    """asyncio.Queue with a size bound enforced by an overflow policy instead of by blocking.
+
+    put_nowait always succeeds for an open queue; a consumer that is too
+    slow loses messages (or, with DISCONNECT, the subscription) rather than
+    holding up publishers or growing without bound.
+    """
+
+    def __init__(self, maxsize: int = 256, policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST):
+        super().__init__(maxsize=maxsize)
+        self.policy = OverflowPolicy(policy)
+        self.closed = False
+        self.dropped = 0
+        self.overflowed = False
+
+    def put_nowait(self, item: Any) -> bool:
+        """Buffer item, applying the overflow policy when full
+
+        Returns:
+            bool: False if the queue is closed and the subscriber should be removed.
+        """
+        if self.closed:
+            return False
+        if self.full():
+            self._overflow()
+            if self.policy == OverflowPolicy.DISCONNECT:
+                self._close()
+                return False
+            self._drop(1)
+            if self.policy == OverflowPolicy.COALESCE and self._coalesce(item):
+                return True
+            self._queue.popleft()
+        super().put_nowait(item)
+        return True
+
+    async def get(self) -> Any:
+        item = await super().get()
+        if item is _CLOSED:
+            raise SubscriberOverflow("Subscriber fell too far behind")
+        return item
+
+    def lag(self) -> float:
+        """Fraction of the buffer in use"""
+        return self.qsize() / self.maxsize if self.maxsize > 0 else 0.0
+
+    def _overflow(self):
+        if not self.overflowed:
+            self.overflowed = True
+            SSE_SUBSCRIBERS_OVERFLOWED.labels(self.policy.value).inc()
+
+    def _coalesce(self, item: Any) -> bool:
+        """Replace the newest buffered message of item's type, if any"""
+        kind = _message_type(item)
+        if kind is None:
+            return False
+        buffered = self._queue
+        for index in range(len(buffered) - 1, -1, -1):
+            if _message_type(buffered[index]) == kind:
+                buffered[index] = item
+                return True
+        return False
+
+    def _drop(self, count: int):
+        self.dropped += count
+        SSE_MESSAGES_DROPPED.labels(self.policy.value).inc(count)
+
+    def _close(self):
+        self.closed = True
+        self._drop(self.qsize() + 1)
+        self._queue.clear()
+        super().put_nowait(_CLOSED)
+
+
+def _message_type(message: Any) -> Any:
+    return message.get("type") if isinstance(message, dict) else getattr(message, "type", None)
@@ -0,0 +1,169 @@
+"""
+Timer Heap
+Keyed one-shot timers on a single min-heap, driven by one asyncio task
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _TimerEntry:
+    """A scheduled callback; superseded entries stay in the heap until popped"""
+
+    __slots__ = ("deadline", "seq", "key", "callback", "args", "cancelled")
+
+    def __init__(self, deadline: float, seq: int, key: Hashable, callback: Callable, args: Tuple):
+        self.deadline = deadline
+        self.seq = seq
+        self.key = key
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other: "_TimerEntry") -> bool:
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+
+class TimerHeap:
+    """Keyed timers with O(log n) schedule/reschedule and O(1) cancel.
+
+    Each key has at most one live timer; scheduling an existing key replaces it.
+    Replaced and cancelled entries are discarded lazily when they reach the top
+    of the heap, and the heap is compacted when they outnumber live timers.
+    Callbacks may be plain functions or coroutine functions.
+    """
+
+    def __init__(self, name: str = "timers"):
+        self.name = name
+        self._heap: List[_TimerEntry] = []
+        self._timers: Dict[Hashable, _TimerEntry] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    @staticmethod
+    def _now() -> float:
+        return asyncio.get_event_loop().time()
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable, *args: Any) -> float:
+        """Schedule (or reschedule) the timer for key to fire after delay seconds
+
+        Returns:
+            float: The absolute loop time at which the timer fires.
+        """
+        deadline = self._now() + max(delay, 0.0)
+        previous = self._timers.get(key)
+        if previous is not None:
+            previous.cancelled = True
+
+        entry = _TimerEntry(deadline, next(self._seq), key, callback, args)
+        self._timers[key] = entry
+        heapq.heappush(self._heap, entry)
+        self._maybe_compact()
+
+        # Only wake the runner when the new timer is now the earliest one
+        if self._wakeup is not None and self._heap[0] is entry:
+            self._wakeup.set()
+        return deadline
+
+    def cancel(self, key: Hashable) -> bool:
+        """Cancel the timer for key, returning whether one was pending"""
+        entry = self._timers.pop(key, None)
+        if entry is None:
+            return False
+        entry.cancelled = True
+        return True
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """Get the loop time at which the timer for key fires, if scheduled"""
+        entry = self._timers.get(key)
+        return entry.deadline if entry else None
+
+    def clear(self):
+        """Cancel all pending timers"""
+        self._timers.clear()
+        self._heap.clear()
+
+    def start(self):
+        """Start the runner task on the current event loop"""
+        if self._task and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the runner task; pending timers are kept but will not fire"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._wakeup = None
+
+    def _maybe_compact(self):
+        """Drop stale entries once they dominate the heap"""
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._timers):
+            self._heap = [entry for entry in self._heap if not entry.cancelled]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float) -> List[_TimerEntry]:
+        """Pop all live entries whose deadline has passed"""
+        due = []
+        while self._heap and self._heap[0].deadline <= now:
+            entry = heapq.heappop(self._heap)
+            if entry.cancelled:
+                continue
+            del self._timers[entry.key]
+            due.append(entry)
+        return due
+
+    def _next_deadline(self) -> Optional[float]:
+        """Get the earliest live deadline, discarding stale heap heads"""
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+        return self._heap[0].deadline if self._heap else None
+
+    async def _run(self):
+        """Sleep until the earliest deadline and fire everything that is due"""
+        while True:
+            try:
+                self._wakeup.clear()
+                next_deadline = self._next_deadline()
+                if next_deadline is None:
+                    await self._wakeup.wait()
+                    continue
+
+                timeout = next_deadline - self._now()
+                if timeout > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                        continue
+                    except asyncio.TimeoutError:
+                        pass
+
+                for entry in self._pop_due(self._now()):
+                    await self._fire(entry)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in timer heap {self.name}: {e}")
+
+    async def _fire(self, entry: _TimerEntry):
+        """Invoke a timer callback, isolating failures"""
+        try:
+            result = entry.callback(*entry.args)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            logger.error(f"Timer {entry.key!r} in {self.name} failed: {e}")
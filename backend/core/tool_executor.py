@@ -0,0 +1,242 @@
+"""
+Tool Execution Engine
+Runs the tool calls of one agent turn concurrently, respecting declared dependencies
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from .deadline import DeadlineExceeded, check_deadline
+
+logger = logging.getLogger(__name__)
+
+# A resolved tool: called with the invocation's arguments, returns the tool result
+ToolRunner = Callable[..., Awaitable[Any]]
+
+
+class ToolInvocation(BaseModel):
+    """A single tool call requested during an agent turn"""
+    call_id: str
+    tool: str
+    arguments: Dict[str, Any] = {}
+    # call_ids whose results this call needs; an argument given as
+    # {"$result": "<call_id>"} is replaced with that call's result
+    depends_on: List[str] = []
+    # Calls sharing a resource key (e.g. one browser page) run one at a time
+    resource: Optional[str] = None
+
+
+class ToolResult(BaseModel):
+    """Outcome of a tool invocation"""
+    call_id: str
+    tool: str
+    status: str  # success, failed or skipped
+    result: Any = None
+    error: Optional[str] = None
+    duration: float = 0.0
+
+
+class ToolExecutionReport(BaseModel):
+    """Results of all invocations in a turn, keyed by call_id"""
+    results: Dict[str, ToolResult] = Field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def succeeded(self) -> bool:
+        return all(result.status == "success" for result in self.results.values())
+
+    @property
+    def failures(self) -> List[ToolResult]:
+        return [result for result in self.results.values() if result.status != "success"]
+
+
+def _check_dependencies(invocations: List[ToolInvocation]):
+    """Reject duplicate ids, unknown dependencies and cycles before anything runs"""
+    by_id: Dict[str, ToolInvocation] = {}
+    for invocation in invocations:
+        if invocation.call_id in by_id:
+            raise ValueError(f"Duplicate tool call id: {invocation.call_id}")
+        by_id[invocation.call_id] = invocation
+
+    for invocation in invocations:
+        for dependency in invocation.depends_on:
+            if dependency not in by_id:
+                raise ValueError(f"Tool call {invocation.call_id} depends on unknown call {dependency}")
+
+    # Kahn's algorithm: anything left unvisited sits on a cycle
+    remaining = {call_id: len(set(invocation.depends_on)) for call_id, invocation in by_id.items()}
+    dependents: Dict[str, List[str]] = {call_id: [] for call_id in by_id}
+    for invocation in invocations:
+        for dependency in set(invocation.depends_on):
+            dependents[dependency].append(invocation.call_id)
+
+    ready = [call_id for call_id, count in remaining.items() if count == 0]
+    visited = 0
+    while ready:
+        call_id = ready.pop()
+        visited += 1
+        for dependent in dependents[call_id]:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                ready.append(dependent)
+
+    if visited != len(by_id):
+        cyclic = sorted(call_id for call_id, count in remaining.items() if count > 0)
+        raise ValueError(f"Tool calls form a dependency cycle: {', '.join(cyclic)}")
+
+
+def _substitute_results(value: Any, results: Dict[str, ToolResult]) -> Any:
+    """Replace {"$result": call_id} placeholders with dependency results"""
+    if isinstance(value, dict):
+        if set(value) == {"$result"}:
+            return results[value["$result"]].result
+        return {key: _substitute_results(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_substitute_results(item, results) for item in value]
+    return value
+
+
+class ToolExecutor:
+    """Dependency-aware concurrent tool runner.
+
+    Every invocation starts as soon as its dependencies have succeeded, so
+    independent calls overlap and a turn costs roughly its critical path
+    rather than the sum of all calls. At most max_concurrency calls are in
+    flight at once. A failed call does not abort the turn: its dependents
+    are skipped and everything else still runs. Only the turn's deadline
+    passing or cancellation stops it, cancelling the calls still running.
+    """
+
+    def __init__(self, resolve: Callable[[ToolInvocation], Optional[ToolRunner]], max_concurrency: int = 4):
+        self.resolve = resolve
+        self.max_concurrency = max_concurrency
+
+    async def execute(
+        self,
+        invocations: List[ToolInvocation],
+        completed: Optional[Dict[str, ToolResult]] = None,
+        on_result: Optional[Callable[[ToolResult], Awaitable[None]]] = None
+    ) -> ToolExecutionReport:
+        """Run the invocations and collect every result, failed or not.
+
+        Successful results passed in completed (e.g. from a checkpoint) are
+        reused instead of running those calls again. on_result is awaited
+        after each new result is recorded.
+        """
+        _check_dependencies(invocations)
+        completed = {
+            call_id: result for call_id, result in (completed or {}).items() if result.status == "success"
+        }
+
+        loop = asyncio.get_event_loop()
+        started_at = loop.time()
+        slots = asyncio.Semaphore(self.max_concurrency)
+        resource_locks: Dict[str, asyncio.Lock] = {}
+        results: Dict[str, ToolResult] = {}
+        done: Dict[str, asyncio.Future] = {invocation.call_id: loop.create_future() for invocation in invocations}
+
+        async def run(invocation: ToolInvocation):
+            if invocation.call_id in completed:
+                results[invocation.call_id] = completed[invocation.call_id]
+                done[invocation.call_id].set_result(None)
+                return
+            try:
+                # Wait for dependencies; each future resolves once its result is recorded
+                for dependency in invocation.depends_on:
+                    await done[dependency]
+
+                failed = [dependency for dependency in invocation.depends_on if results[dependency].status != "success"]
+                if failed:
+                    results[invocation.call_id] = ToolResult(
+                        call_id=invocation.call_id,
+                        tool=invocation.tool,
+                        status="skipped",
+                        error=f"Dependency failed: {', '.join(failed)}"
+                    )
+                    return
+
+                results[invocation.call_id] = await self._run_one(invocation, slots, resource_locks, results)
+            finally:
+                try:
+                    if invocation.call_id in results and on_result:
+                        await on_result(results[invocation.call_id])
+                finally:
+                    done[invocation.call_id].set_result(None)
+
+        tasks = [asyncio.ensure_future(run(invocation)) for invocation in invocations]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A call that ends the turn (deadline, cancellation) stops the calls still running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        ordered = {invocation.call_id: results[invocation.call_id] for invocation in invocations}
+        return ToolExecutionReport(results=ordered, elapsed=loop.time() - started_at)
+
+    async def _run_one(
+        self,
+        invocation: ToolInvocation,
+        slots: asyncio.Semaphore,
+        resource_locks: Dict[str, asyncio.Lock],
+        results: Dict[str, ToolResult]
+    ) -> ToolResult:
+        runner = self.resolve(invocation)
+        if runner is None:
+            return ToolResult(
+                call_id=invocation.call_id, tool=invocation.tool, status="failed",
+                error=f"Tool {invocation.tool} not available"
+            )
+
+        lock = None
+        if invocation.resource:
+            lock = resource_locks.setdefault(invocation.resource, asyncio.Lock())
+
+        loop = asyncio.get_event_loop()
+        # Take the resource before a slot, so calls queued behind a busy resource leave slots to others
+        if lock:
+            await lock.acquire()
+        try:
+            async with slots:
+                start_time = loop.time()
+                try:
+                    arguments = _substitute_results(invocation.arguments, results)
+                    output = await runner(**arguments)
+                except asyncio.CancelledError:
+                    raise
+                except DeadlineExceeded as e:
+                    # The turn's deadline ends the turn; a call's own narrower deadline only fails the call
+                    check_deadline()
+                    return self._failed(invocation, e, loop.time() - start_time)
+                except Exception as e:
+                    return self._failed(invocation, e, loop.time() - start_time)
+        finally:
+            if lock:
+                lock.release()
+
+        duration = loop.time() - start_time
+        # MCPToolWrapper and the browser service report failures in-band
+        if isinstance(output, dict) and (output.get("success") is False or output.get("status") == "error"):
+            return ToolResult(
+                call_id=invocation.call_id, tool=invocation.tool, status="failed",
+                result=output, error=output.get("error"), duration=duration
+            )
+        if isinstance(output, dict) and "result" in output and ("success" in output or "status" in output):
+            output = output["result"]
+        return ToolResult(
+            call_id=invocation.call_id, tool=invocation.tool, status="success",
+            result=output, duration=duration
+        )
+
+    @staticmethod
+    def _failed(invocation: ToolInvocation, error: Exception, duration: float) -> ToolResult:
+        logger.error(f"Tool call {invocation.call_id} ({invocation.tool}) failed: {error}")
+        return ToolResult(
+            call_id=invocation.call_id, tool=invocation.tool, status="failed",
+            error=str(error), duration=duration
+        )
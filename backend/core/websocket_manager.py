@@ -3,124 +3,540 @@ WebSocket management for real-time communication
 """
 
 import asyncio
+import itertools
 import json
 import logging
-from typing import Dict, List, Optional
+import time
+import uuid
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Union
 
 from fastapi import WebSocket
 
+from .cluster_delivery import ClusterDelivery
+from .metrics import REGISTRY, MetricFamily
+from .subscriber_queue import OverflowPolicy, SubscriberQueue
+from .wire_format import ENCODINGS, JSON, MSGPACK, dumps, loads, pack_array, packb
+
 logger = logging.getLogger(__name__)
 
+WEBSOCKET_BROADCAST_SECONDS = REGISTRY.histogram(
+    "websocket_broadcast_duration_seconds",
+    "Time for a broadcast to be queued for every connection"
+)
+WEBSOCKET_SLOW_CONSUMERS = REGISTRY.counter(
+    "websocket_slow_consumers_evicted_total",
+    "Connections closed because a send did not finish within send_timeout or their outbound queue filled",
+    ["reason"]
+)
+WEBSOCKET_BATCHED_MESSAGES = REGISTRY.counter(
+    "websocket_batched_messages_total",
+    "Messages sent coalesced with others into one JSON array frame"
+)
+
+# Close code asking a client that fell behind to reconnect later
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Every connection and session SSE stream receives broadcasts on this topic
+GLOBAL_TOPIC = "global"
+
+
+def session_topic(session_id: str) -> str:
+    """Topic of the messages addressed to a session"""
+    return f"session:{session_id}"
+
+
+def agent_topic(agent_id: str) -> str:
+    """Topic of the messages any session receives from an agent"""
+    return f"agent:{agent_id}"
+
+
+def valid_topic(topic: str) -> bool:
+    """Whether topic names the global topic, a session or an agent"""
+    kind, _, name = topic.partition(":")
+    return topic == GLOBAL_TOPIC or (kind in ("session", "agent") and bool(name))
+
+
+def topic_allowed(topic: str, session_id: Optional[str], observer: bool = False) -> bool:
+    """Whether a subscriber may follow topic: its own session's, or any topic for an observer
+
+    Agent topics and the global topic carry every session's messages, so
+    only authenticated observers may subscribe to them or to other sessions.
+    """
+    return observer or (session_id is not None and topic == session_topic(session_id))
+
+
+class Event(NamedTuple):
+    """A published message as SSE subscribers receive it, encoded once for all of them"""
+    type: Optional[str]
+    data: str
+
+
+class Connection:
+    """One client WebSocket, the session it was opened for and the topics it receives
+
+    Outgoing messages wait in the connection's outbox until its writer task
+    sends them, so producers never wait on the client's socket. They are
+    queued as JSON text, or as msgpack bytes for msgpack connections.
+    """
+
+    __slots__ = (
+        "connection_id", "websocket", "session_id", "topics", "connected_at", "message_count",
+        "batch", "encoding", "observer", "outbox", "outbox_bytes", "wakeup", "idle", "writer", "closed"
+    )
+
+    def __init__(
+        self, websocket: WebSocket, session_id: str, batch: bool = False, encoding: str = JSON, observer: bool = False
+    ):
+        self.connection_id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.session_id = session_id
+        self.topics: Set[str] = set()
+        self.connected_at = asyncio.get_event_loop().time()
+        self.message_count = 0
+        # Whether the client accepts several messages coalesced into one JSON array frame
+        self.batch = batch
+        self.encoding = encoding
+        # Authenticated observers may subscribe to agent, global and other sessions' topics
+        self.observer = observer
+        self.outbox: deque = deque()
+        self.outbox_bytes = 0
+        # Idle once everything queued has been sent; wakeup is set when an idle connection gets a message
+        self.idle = True
+        self.wakeup = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def info(self) -> Dict:
+        return {
+            "connection_id": self.connection_id,
+            "connected_at": self.connected_at,
+            "message_count": self.message_count,
+            "queued_messages": len(self.outbox),
+            "batch": self.batch,
+            "encoding": self.encoding,
+            "topics": sorted(self.topics)
+        }
+
+
+class SSESubscriber(SubscriberQueue):
+    """Bounded SSE event queue, with the session it was opened for (if any) and its topics"""
+
+    def __init__(self, session_id: Optional[str], maxsize: int, policy: OverflowPolicy):
+        super().__init__(maxsize, policy)
+        self.session_id = session_id
+        self.topics: Set[str] = set()
+
+
+Subscriber = Union[Connection, SSESubscriber]
+
 
 class WebSocketManager:
-    """Manages WebSocket connections for real-time communication"""
+    """Manages WebSocket connections for real-time communication.
+    
+    Delivery is by topic: a session's own topic, an agent's topic and the
+    global topic. Any number of WebSocket connections and SSE streams can
+    subscribe to a topic, so several tabs can share a session and an
+    observer can follow many sessions or agents. A published message is
+    encoded once and shared by all of its subscribers.
+    
+    Publishing never waits on a client: messages are queued on each
+    connection and sent by its own writer task, coalesced into one frame
+    when the client opted in to batching. A connection that falls
+    max_outbound_messages or max_outbound_bytes behind is disconnected.
+    
+    With a ClusterDelivery, messages also reach subscribers connected to
+    other replicas; subscribers on this replica are still served directly.
+    """
     
-    def __init__(self):
-        # Store active connections by session_id
-        self.active_connections: Dict[str, WebSocket] = {}
-        # Store connection metadata
-        self.connection_metadata: Dict[str, Dict] = {}
-        # Store SSE subscribers per session (list of asyncio.Queue)
-        self.sse_subscribers: Dict[str, List[asyncio.Queue]] = {}
+    # A send to one connection taking longer than this evicts the connection
+    send_timeout: float = 5.0
+    # Messages (and their encoded size) a connection may have waiting before it is evicted
+    max_outbound_messages: int = 1000
+    max_outbound_bytes: int = 8 * 1024 * 1024
+    # Most messages coalesced into one frame for a batching connection
+    max_batch: int = 100
+    # SSE subscribers with at least this fraction of their buffer in use count as slow
+    slow_subscriber_threshold: float = 0.8
     
-    async def connect(self, websocket: WebSocket, session_id: str):
+    def __init__(
+        self,
+        sse_queue_size: int = 256,
+        sse_overflow: str = OverflowPolicy.DROP_OLDEST.value,
+        cluster: Optional[ClusterDelivery] = None
+    ):
+        # Subscribers (WebSocket connections and SSE streams) per topic
+        self.topics: Dict[str, Set[Subscriber]] = {}
+        # Open WebSocket connections by id, and by the session they were opened for
+        self.connections: Dict[str, Connection] = {}
+        self.session_connections: Dict[str, Set[Connection]] = {}
+        # SSE streams, each with a bounded buffer
+        self.sse_subscribers: Set[SSESubscriber] = set()
+        self.sse_queue_size = sse_queue_size
+        self.sse_overflow = OverflowPolicy(sse_overflow)
+        # Relay to and from other replicas (single-process delivery when absent)
+        self.cluster = cluster
+        # Connections with messages not yet sent, and whether there are none
+        self._busy = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+        
+        REGISTRY.register_collector("websocket_manager", self.collect_metrics)
+    
+    async def start(self):
+        """Start receiving messages published on other replicas"""
+        if self.cluster:
+            await self.cluster.start(self._deliver_remote, list(self.topics))
+    
+    async def stop(self):
+        try:
+            await self.flush(self.send_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Stopping with WebSocket messages still queued")
+        writers = [connection.writer for connection in self.connections.values() if connection.writer]
+        for writer in writers:
+            writer.cancel()
+        await asyncio.gather(*writers, return_exceptions=True)
+        if self.cluster:
+            await self.cluster.stop()
+    
+    async def flush(self, timeout: Optional[float] = None):
+        """Wait until every queued message has been sent (or its connection dropped)"""
+        if self._busy:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+    
+    async def connect(
+        self,
+        websocket: WebSocket,
+        session_id: str,
+        batch: bool = False,
+        encoding: str = JSON,
+        subprotocol: Optional[str] = None,
+        observer: bool = False
+    ) -> Connection:
         """Accept a WebSocket connection
         
+        The connection receives its session's topic and the global topic
+        (server broadcasts); other sessions' connections are unaffected.
+        
         Parameters:
             websocket (WebSocket): The FastAPI WebSocket instance to accept.
             session_id (str): The session identifier associated with this connection.
+            batch (bool): Whether the client accepts queued messages coalesced into array frames.
+            encoding (str): "json" for text frames or "msgpack" for binary frames.
+            subprotocol (str, optional): The Sec-WebSocket-Protocol to accept, if the client offered one.
+            observer (bool): Whether the client authenticated as an observer and may follow other topics.
+        Returns:
+            Connection: The registered connection, to pass to handle_message and disconnect.
         """
         try:
-            await websocket.accept()
-            self.active_connections[session_id] = websocket
-            self.connection_metadata[session_id] = {
-                "connected_at": asyncio.get_event_loop().time(),
-                "message_count": 0
-            }
+            if subprotocol:
+                await websocket.accept(subprotocol=subprotocol)
+            else:
+                await websocket.accept()
+            connection = Connection(websocket, session_id, batch, encoding, observer)
+            connection.writer = asyncio.create_task(self._write(connection))
+            self.connections[connection.connection_id] = connection
+            self.session_connections.setdefault(session_id, set()).add(connection)
+            self._subscribe(connection, (session_topic(session_id), GLOBAL_TOPIC))
             
-            logger.info(f"WebSocket connected for session: {session_id}")
+            logger.info(
+                f"WebSocket connected for session: {session_id} "
+                f"(connections: {len(self.session_connections[session_id])})"
+            )
             
             # Send welcome message
-            await self.send_message(session_id, {
+            self._reply(connection, {
                 "type": "connection",
                 "status": "connected",
-                "session_id": session_id
+                "session_id": session_id,
+                "connection_id": connection.connection_id
             })
-            
+            return connection
+        
         except Exception as e:
             logger.error(f"Failed to connect WebSocket for session {session_id}: {e}")
             raise
     
-    def disconnect(self, session_id: str):
+    def disconnect(self, connection: Connection):
         """Disconnect a WebSocket
         
+        Messages still queued for the connection are discarded.
+        
         Parameters:
-            session_id (str): The session identifier to disconnect and cleanup.
+            connection (Connection): The connection to unregister from its session and topics.
         """
         try:
-            if session_id in self.active_connections:
-                del self.active_connections[session_id]
-            if session_id in self.connection_metadata:
-                del self.connection_metadata[session_id]
-            
-            logger.info(f"WebSocket disconnected for session: {session_id}")
+            if self.connections.pop(connection.connection_id, None) is None:
+                return
+            connection.closed = True
+            connection.outbox.clear()
+            connection.outbox_bytes = 0
+            self._mark_idle(connection)
+            if connection.writer is not None and connection.writer is not asyncio.current_task():
+                connection.writer.cancel()
+            self._unsubscribe(connection, list(connection.topics))
+            connections = self.session_connections.get(connection.session_id)
+            if connections is not None:
+                connections.discard(connection)
+                if not connections:
+                    del self.session_connections[connection.session_id]
             
+            logger.info(f"WebSocket disconnected for session: {connection.session_id}")
+        
         except Exception as e:
-            logger.error(f"Error disconnecting WebSocket for session {session_id}: {e}")
+            logger.error(f"Error disconnecting WebSocket for session {connection.session_id}: {e}")
     
-    async def send_message(self, session_id: str, message: Dict):
-        """Send a message to a specific session over WebSocket and publish to SSE subscribers
+    async def send_message(self, session_id: str, message: Dict) -> int:
+        """Send a message to a session's subscribers over WebSocket and SSE
+        
+        Messages carrying an agent_id also reach that agent's topic.
         
         Parameters:
             session_id (str): The target session identifier.
             message (Dict): The JSON-serializable message to send/publish.
+        Returns:
+            int: The number of WebSocket connections the message was queued for.
         """
+        topics = [session_topic(session_id)]
+        if message.get("agent_id"):
+            topics.append(agent_topic(message["agent_id"]))
         try:
-            if session_id in self.active_connections:
-                websocket = self.active_connections[session_id]
-                await websocket.send_text(json.dumps(message))
-                
-                # Update metadata
-                if session_id in self.connection_metadata:
-                    self.connection_metadata[session_id]["message_count"] += 1
-                
-                logger.debug(f"Sent message to session {session_id}: {message.get('type', 'unknown')}")
-            else:
+            if topics[0] not in self.topics and not self.cluster:
                 logger.warning(f"No active connection for session: {session_id}")
-            
-            # Always publish to SSE subscribers regardless of WebSocket status
-            await self._publish_sse(session_id, message)
-                
+            sent = await self.publish(topics, message)
+            logger.debug(f"Sent message to session {session_id}: {message.get('type', 'unknown')}")
+            return sent
         except Exception as e:
             logger.error(f"Failed to send message to session {session_id}: {e}")
-            # Remove broken connection
-            self.disconnect(session_id)
+            return 0
     
-    async def broadcast_message(self, message: Dict, exclude_sessions: List[str] = None):
+    async def broadcast_message(self, message: Dict, exclude_sessions: List[str] = None) -> int:
         """Broadcast a message to all connected sessions and publish to SSE subscribers
         
+        The message is encoded once and queued for every connection; a slow
+        client delays only its own writer (and is evicted after send_timeout).
+        
         Parameters:
             message (Dict): The JSON-serializable message to broadcast.
             exclude_sessions (List[str], optional): Session IDs to exclude from broadcast.
+        Returns:
+            int: The number of WebSocket connections the message was queued for.
+        """
+        start = time.perf_counter()
+        sent = await self.publish([GLOBAL_TOPIC], message, exclude_sessions)
+        WEBSOCKET_BROADCAST_SECONDS.observe(time.perf_counter() - start)
+        return sent
+    
+    async def publish(
+        self, topics: Iterable[str], message: Dict, exclude_sessions: Optional[Iterable[str]] = None
+    ) -> int:
+        """Deliver a message once to every subscriber of any of the topics
+        
+        This replica's subscribers get the message queued without waiting on
+        any client; other replicas get it through the cluster, if any.
+        
+        Parameters:
+            topics (Iterable[str]): Topics to publish on.
+            message (Dict): The JSON-serializable message to publish.
+            exclude_sessions (Iterable[str], optional): Skip subscribers opened for these sessions.
+        Returns:
+            int: The number of WebSocket connections on this replica the message was queued for.
         """
-        exclude_sessions = exclude_sessions or []
+        topics = list(topics)
+        if len(topics) == 1:
+            subscribers = list(self.topics.get(topics[0], ()))
+        else:
+            # A subscriber of several of the topics still gets the message once
+            subscribers = set()
+            for topic in topics:
+                subscribers.update(self.topics.get(topic, ()))
+        if not subscribers and not self.cluster:
+            return 0
         
-        for session_id in list(self.active_connections.keys()):
-            if session_id not in exclude_sessions:
-                await self.send_message(session_id, message)
+        text = dumps(message)
+        sent = self._deliver(subscribers, message.get("type"), text, exclude_sessions, message)
+        if self.cluster:
+            await self.cluster.publish(topics, message.get("type"), text, exclude_sessions or ())
+        return sent
+    
+    async def _deliver_remote(
+        self, topics: List[str], index: int, message_type: Optional[str], text: str, exclude_sessions: List[str]
+    ):
+        """Deliver a message published on another replica, arriving on the channel of topics[index]"""
+        subscribers = self.topics.get(topics[index])
+        if not subscribers:
+            return
+        # Subscribers of an earlier topic of the message get that topic's copy
+        earlier = [self.topics[topic] for topic in topics[:index] if topic in self.topics]
+        if earlier:
+            subscribers = [
+                subscriber for subscriber in subscribers if not any(subscriber in covered for covered in earlier)
+            ]
+        self._deliver(subscribers, message_type, text, exclude_sessions)
+    
+    def _deliver(
+        self,
+        subscribers: Iterable[Subscriber],
+        message_type: Optional[str],
+        text: str,
+        exclude_sessions: Optional[Iterable[str]] = None,
+        message: Optional[Dict] = None
+    ) -> int:
+        """Queue an encoded message for local subscribers
         
-        # Also publish to any sessions that may only have SSE subscribers
-        for session_id in list(self.sse_subscribers.keys()):
-            if session_id not in (exclude_sessions or []):
-                await self._publish_sse(session_id, message)
+        SSE subscribers get the JSON text as an Event and JSON connections
+        get it as is. For msgpack connections the message (decoded from the
+        text if not given) is packed once and shared.
+        """
+        if exclude_sessions:
+            exclude = set(exclude_sessions)
+            subscribers = [subscriber for subscriber in subscribers if subscriber.session_id not in exclude]
+        sent = 0
+        event = packed = None
+        for subscriber in subscribers:
+            if isinstance(subscriber, Connection):
+                if subscriber.encoding == MSGPACK:
+                    if packed is None:
+                        packed = packb(message if message is not None else loads(text))
+                    sent += self._enqueue(subscriber, packed)
+                else:
+                    sent += self._enqueue(subscriber, text)
+            else:
+                event = event or Event(message_type, text)
+                self._publish_sse(subscriber, event)
+        return sent
     
-    async def handle_message(self, session_id: str, message: str):
+    def _enqueue(self, connection: Connection, frame: Union[str, bytes]) -> bool:
+        """Queue an encoded message for a connection's writer, evicting the connection if its queue is full
+        
+        Returns:
+            bool: Whether the message was queued.
+        """
+        if connection.closed:
+            return False
+        if (
+            len(connection.outbox) >= self.max_outbound_messages
+            or connection.outbox_bytes + len(frame) > self.max_outbound_bytes
+        ):
+            self._evict_slow(connection, "queue_full")
+            return False
+        connection.outbox.append(frame)
+        connection.outbox_bytes += len(frame)
+        if connection.idle:
+            connection.idle = False
+            self._busy += 1
+            self._drained.clear()
+            connection.wakeup.set()
+        return True
+    
+    def _mark_idle(self, connection: Connection):
+        if not connection.idle:
+            connection.idle = True
+            self._busy -= 1
+            if not self._busy:
+                self._drained.set()
+    
+    async def _write(self, connection: Connection):
+        """Send a connection's queued messages in order until it disconnects
+        
+        A batching connection gets everything queued since its last send
+        (up to max_batch messages) in one frame: a JSON array of the text
+        messages, or a msgpack array of the binary ones. The messages are
+        already encoded, so the array is joined from them without re-encoding.
+        """
+        loop = asyncio.get_running_loop()
+        outbox = connection.outbox
+        try:
+            while True:
+                if not outbox:
+                    self._mark_idle(connection)
+                    connection.wakeup.clear()
+                    await connection.wakeup.wait()
+                    continue
+                
+                count = 1
+                if connection.batch:
+                    # Messages queued before a change of encoding are not mixed into one frame
+                    binary = isinstance(outbox[0], bytes)
+                    for frame in itertools.islice(outbox, 1, self.max_batch):
+                        if isinstance(frame, bytes) is not binary:
+                            break
+                        count += 1
+                if count == 1:
+                    frame = outbox.popleft()
+                    connection.outbox_bytes -= len(frame)
+                else:
+                    frames = [outbox.popleft() for _ in range(count)]
+                    connection.outbox_bytes -= sum(map(len, frames))
+                    frame = pack_array(frames) if binary else f"[{','.join(frames)}]"
+                    WEBSOCKET_BATCHED_MESSAGES.inc(count)
+                send = connection.websocket.send_bytes if isinstance(frame, bytes) else connection.websocket.send_text
+                # A timer rather than wait_for, which would wrap every send in a task of its own
+                deadline = loop.call_later(self.send_timeout, self._evict_slow, connection, "timeout")
+                try:
+                    await send(frame)
+                finally:
+                    deadline.cancel()
+                connection.message_count += count
+        except Exception as e:
+            logger.error(f"Failed to send message to session {connection.session_id}: {e}")
+            # Remove broken connection
+            self.disconnect(connection)
+    
+    def _evict_slow(self, connection: Connection, reason: str):
+        """Drop and close a connection whose send timed out or whose outbound queue is full"""
+        # A cancelled send may have left a partial frame, so the connection cannot be reused
+        logger.warning(f"Evicting slow WebSocket consumer for session: {connection.session_id} ({reason})")
+        WEBSOCKET_SLOW_CONSUMERS.labels(reason).inc()
+        self.disconnect(connection)
+        asyncio.ensure_future(self._close_quietly(connection.websocket))
+    
+    async def _close_quietly(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(
+                websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason="Slow consumer"), self.send_timeout
+            )
+        except Exception:
+            pass
+    
+    def _subscribe(self, subscriber: Subscriber, topics: Iterable[str]):
+        for topic in topics:
+            subscribers = self.topics.get(topic)
+            if subscribers is None:
+                subscribers = self.topics[topic] = set()
+                # The first local subscriber of a topic starts receiving it from other replicas
+                if self.cluster:
+                    self.cluster.watch(topic)
+            subscribers.add(subscriber)
+            subscriber.topics.add(topic)
+    
+    def _unsubscribe(self, subscriber: Subscriber, topics: Iterable[str]):
+        for topic in topics:
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.topics[topic]
+                    if self.cluster:
+                        self.cluster.unwatch(topic)
+            subscriber.topics.discard(topic)
+    
+    async def handle_message(self, connection: Connection, message: str):
         """Handle incoming WebSocket message
         
+        Replies go to the connection the message came in on. "subscribe" and
+        "unsubscribe" messages change the connection's topics, e.g.
+        {"type": "subscribe", "topics": ["agent:browser_agent", "session:abc"]};
+        topics other than the connection's own session need an observer
+        connection. {"type": "options", "batch": true, "encoding": "msgpack"} turns on
+        batched frames and binary msgpack frames. Client messages are JSON text.
+        
         Parameters:
-            session_id (str): The session identifier from which the message was received.
+            connection (Connection): The connection from which the message was received.
             message (str): The raw JSON string received from the client.
         """
+        session_id = connection.session_id
         try:
             data = json.loads(message)
             message_type = data.get("type", "unknown")
@@ -129,11 +545,41 @@ class WebSocketManager:
             
             # Handle different message types
             if message_type == "ping":
-                await self.send_message(session_id, {"type": "pong"})
+                self._reply(connection, {"type": "pong"})
+            
+            elif message_type in ("subscribe", "unsubscribe"):
+                topics = data.get("topics") or []
+                invalid = [topic for topic in topics if not isinstance(topic, str) or not valid_topic(topic)]
+                if invalid:
+                    self._reply(connection, {"type": "error", "message": f"Invalid topics: {invalid}"})
+                    return
+                denied = [
+                    topic for topic in topics
+                    if message_type == "subscribe" and not topic_allowed(topic, session_id, connection.observer)
+                ]
+                if denied:
+                    logger.warning(f"Session {session_id} is not authorized to subscribe to {denied}")
+                    self._reply(connection, {"type": "error", "message": f"Not authorized for topics: {denied}"})
+                    return
+                if message_type == "subscribe":
+                    self._subscribe(connection, topics)
+                else:
+                    self._unsubscribe(connection, topics)
+                self._reply(connection, {"type": "subscriptions", "topics": sorted(connection.topics)})
+            
+            elif message_type == "options":
+                encoding = data.get("encoding", connection.encoding)
+                if encoding not in ENCODINGS:
+                    self._reply(connection, {"type": "error", "message": f"Unknown encoding: {encoding}"})
+                    return
+                connection.encoding = encoding
+                if "batch" in data:
+                    connection.batch = bool(data["batch"])
+                self._reply(connection, {"type": "options", "batch": connection.batch, "encoding": encoding})
             
             elif message_type == "agent_request":
                 # Forward to agent manager (will be implemented)
-                await self.send_message(session_id, {
+                self._reply(connection, {
                     "type": "agent_response",
                     "status": "processing",
                     "request_id": data.get("request_id")
@@ -141,7 +587,7 @@ class WebSocketManager:
             
             elif message_type == "browser_task":
                 # Forward to browser automation service
-                await self.send_message(session_id, {
+                self._reply(connection, {
                     "type": "browser_response",
                     "status": "processing",
                     "task_id": data.get("task_id")
@@ -149,31 +595,34 @@ class WebSocketManager:
             
             else:
                 logger.warning(f"Unknown message type: {message_type}")
-                await self.send_message(session_id, {
+                self._reply(connection, {
                     "type": "error",
                     "message": f"Unknown message type: {message_type}"
                 })
-                
+        
         except json.JSONDecodeError:
             logger.error(f"Invalid JSON message from session {session_id}: {message}")
-            await self.send_message(session_id, {
+            self._reply(connection, {
                 "type": "error",
                 "message": "Invalid JSON format"
             })
         except Exception as e:
             logger.error(f"Error handling message from session {session_id}: {e}")
-            await self.send_message(session_id, {
+            self._reply(connection, {
                 "type": "error",
                 "message": "Internal server error"
             })
     
+    def _reply(self, connection: Connection, message: Dict):
+        self._enqueue(connection, packb(message) if connection.encoding == MSGPACK else dumps(message))
+    
     def get_connection_count(self) -> int:
         """Get the number of active WebSocket connections
         
         Returns:
             int: The count of active WebSocket connections.
         """
-        return len(self.active_connections)
+        return len(self.connections)
     
     def get_connection_info(self, session_id: str) -> Optional[Dict]:
         """Get connection information for a session
@@ -181,9 +630,15 @@ class WebSocketManager:
         Parameters:
             session_id (str): The session identifier to query.
         Returns:
-            Optional[Dict]: Connection metadata if exists, otherwise None.
+            Optional[Dict]: The session's connections and their message counts if any, otherwise None.
         """
-        return self.connection_metadata.get(session_id)
+        connections = self.session_connections.get(session_id)
+        if not connections:
+            return None
+        return {
+            "connections": [connection.info() for connection in connections],
+            "message_count": sum(connection.message_count for connection in connections)
+        }
     
     def list_active_sessions(self) -> List[str]:
         """List all active session IDs for WebSockets
@@ -191,56 +646,105 @@ class WebSocketManager:
         Returns:
             List[str]: A list of session identifiers currently connected via WebSocket.
         """
-        return list(self.active_connections.keys())
-
+        return list(self.session_connections.keys())
+    
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Collect connection and subscriber metrics for /metrics"""
+        connections = MetricFamily("websocket_connections", "gauge", "Active WebSocket connections")
+        connections.add({}, len(self.connections))
+        
+        sessions = MetricFamily("websocket_sessions", "gauge", "Sessions with at least one WebSocket connection")
+        sessions.add({}, len(self.session_connections))
+        
+        outbound = MetricFamily(
+            "websocket_outbound_messages", "gauge", "Messages queued for WebSocket connections' writers"
+        )
+        outbound.add({}, sum(len(connection.outbox) for connection in self.connections.values()))
+        
+        topics = MetricFamily("pubsub_topics", "gauge", "Topics with at least one subscriber")
+        topics.add({}, len(self.topics))
+        
+        subscribers = MetricFamily("sse_subscribers", "gauge", "Active SSE subscribers")
+        subscribers.add({}, len(self.sse_subscribers))
+        
+        sse_sessions = MetricFamily("sse_sessions", "gauge", "Sessions with at least one SSE subscriber")
+        sse_sessions.add({}, len({queue.session_id for queue in self.sse_subscribers if queue.session_id}))
+        
+        buffered = MetricFamily("sse_buffered_messages", "gauge", "Messages waiting in SSE subscriber buffers")
+        buffered.add({}, sum(queue.qsize() for queue in self.sse_subscribers))
+        slow = MetricFamily(
+            "sse_slow_subscribers", "gauge", "SSE subscribers whose buffer is nearly full or has overflowed"
+        )
+        slow.add({}, sum(
+            1 for queue in self.sse_subscribers
+            if queue.overflowed or queue.lag() >= self.slow_subscriber_threshold
+        ))
+        return [connections, sessions, outbound, topics, subscribers, sse_sessions, buffered, slow]
+    
     # ===== SSE support =====
-    def subscribe(self, session_id: str) -> asyncio.Queue:
+    def subscribe(self, session_id: str) -> SSESubscriber:
         """Subscribe an SSE listener for a given session.
         
-        Creates an asyncio.Queue to push events for the session and registers it.
+        Creates a bounded queue to push events for the session (and
+        broadcasts) and registers it. When the listener falls sse_queue_size
+        messages behind, the sse_overflow policy drops or coalesces messages,
+        or ends the subscription (get() then raises SubscriberOverflow).
         
         Parameters:
             session_id (str): The session to subscribe to.
         Returns:
-            asyncio.Queue: The queue from which the subscriber will consume messages.
+            SSESubscriber: The queue of Events from which the subscriber will consume messages.
         """
-        queue: asyncio.Queue = asyncio.Queue()
-        self.sse_subscribers.setdefault(session_id, []).append(queue)
-        logger.info(f"SSE subscriber added for session: {session_id} (total: {len(self.sse_subscribers[session_id])})")
+        queue = self.subscribe_topics([session_topic(session_id), GLOBAL_TOPIC], session_id)
+        logger.info(f"SSE subscriber added for session: {session_id} (topic subscribers: {len(self.topics[session_topic(session_id)])})")
         return queue
-
-    def unsubscribe(self, session_id: str, queue: asyncio.Queue) -> None:
-        """Unsubscribe an SSE listener for a given session.
+    
+    def subscribe_topics(self, topics: Iterable[str], session_id: Optional[str] = None) -> SSESubscriber:
+        """Subscribe an SSE listener to any topics, e.g. for an observer following many sessions
+        
+        Callers check topic_allowed for the listener first; this does not.
+        
+        Parameters:
+            topics (Iterable[str]): The topics to receive.
+            session_id (str, optional): The session the listener belongs to, if any.
+        Returns:
+            SSESubscriber: The queue of Events from which the subscriber will consume messages.
+        """
+        queue = SSESubscriber(session_id, self.sse_queue_size, self.sse_overflow)
+        self.sse_subscribers.add(queue)
+        self._subscribe(queue, topics)
+        return queue
+    
+    def unsubscribe(self, queue: SSESubscriber) -> None:
+        """Unsubscribe an SSE listener from all its topics.
         
         Parameters:
-            session_id (str): The session to unsubscribe from.
-            queue (asyncio.Queue): The queue that was returned from subscribe().
+            queue (SSESubscriber): The queue that was returned from subscribe().
         """
         try:
-            if session_id in self.sse_subscribers:
-                subscribers = self.sse_subscribers[session_id]
-                if queue in subscribers:
-                    subscribers.remove(queue)
-                    logger.info(f"SSE subscriber removed for session: {session_id} (remaining: {len(subscribers)})")
-                if not subscribers:
-                    del self.sse_subscribers[session_id]
+            if queue in self.sse_subscribers:
+                self.sse_subscribers.discard(queue)
+                self._unsubscribe(queue, list(queue.topics))
+                logger.info(f"SSE subscriber removed for session: {queue.session_id}")
         except Exception as e:
-            logger.error(f"Error unsubscribing SSE for session {session_id}: {e}")
-
-    async def _publish_sse(self, session_id: str, message: Dict) -> None:
-        """Publish a message to all SSE subscribers for the given session.
+            logger.error(f"Error unsubscribing SSE for session {queue.session_id}: {e}")
+    
+    def _publish_sse(self, queue: SSESubscriber, event: Event) -> None:
+        """Publish an event to one SSE subscriber.
+        
+        Never blocks: a full subscriber buffer applies its overflow policy.
         
         Parameters:
-            session_id (str): The target session identifier.
-            message (Dict): The message to publish to subscribers.
+            queue (SSESubscriber): The subscriber to publish to.
+            event (Event): The encoded message.
         """
         try:
-            if session_id not in self.sse_subscribers:
-                return
-            for queue in list(self.sse_subscribers.get(session_id, [])):
-                try:
-                    await queue.put(message)
-                except Exception as e:
-                    logger.error(f"Failed to put message into SSE queue for session {session_id}: {e}")
+            if not queue.put_nowait(event):
+                logger.warning(f"Disconnecting slow SSE subscriber for session: {queue.session_id}")
+                self.unsubscribe(queue)
+            elif queue.dropped == 1:
+                logger.warning(
+                    f"SSE subscriber for session {queue.session_id} is falling behind ({queue.policy.value})"
+                )
         except Exception as e:
-            logger.error(f"Error publishing SSE for session {session_id}: {e}")
+            logger.error(f"Failed to put message into SSE queue for session {queue.session_id}: {e}")
@@ -0,0 +1,63 @@
+"""
+Wire Format
+Encodes messages for clients as JSON text or msgpack binary frames, carrying bytes values without hex
+"""
+
+import base64
+import json
+from typing import Any, Dict, List
+
+import msgpack
+
+# Connection encodings: JSON text frames (the default) or msgpack binary frames
+JSON = "json"
+MSGPACK = "msgpack"
+ENCODINGS = (JSON, MSGPACK)
+
+# JSON has no bytes type, so bytes values become {"$base64": "..."}
+BINARY_KEY = "$base64"
+
+
+def encode_binary(value: bytes) -> Dict[str, str]:
+    """The JSON form of a bytes value"""
+    return {BINARY_KEY: base64.b64encode(value).decode("ascii")}
+
+
+def encode_default(value: Any) -> Any:
+    """json.dumps default: bytes values in their JSON form, anything else as str"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return encode_binary(bytes(value))
+    return str(value)
+
+
+def _decode_binary(value: Dict) -> Any:
+    if len(value) == 1 and BINARY_KEY in value:
+        return base64.b64decode(value[BINARY_KEY])
+    return value
+
+
+def dumps(message: Any) -> str:
+    """Encode a message as JSON text"""
+    return json.dumps(message, default=encode_default)
+
+
+def loads(text: str) -> Any:
+    """Decode JSON text from dumps, restoring its bytes values"""
+    return json.loads(text, object_hook=_decode_binary)
+
+
+def packb(message: Any) -> bytes:
+    """Encode a message as msgpack; bytes values are raw bin data behind a 2-5 byte header"""
+    return msgpack.packb(message, use_bin_type=True, default=str)
+
+
+def pack_array(packed: List[bytes]) -> bytes:
+    """Join already-packed messages into one msgpack array without unpacking them"""
+    count = len(packed)
+    if count < 16:
+        header = bytes((0x90 | count,))
+    elif count < 1 << 16:
+        header = b"\xdc" + count.to_bytes(2, "big")
+    else:
+        header = b"\xdd" + count.to_bytes(4, "big")
+    return header + b"".join(packed)
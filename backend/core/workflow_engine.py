@@ -0,0 +1,216 @@
+"""
+Workflow Engine
+Plans multi-agent task DAGs for the orchestrator and runs them across agent queues
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from .tool_executor import ToolExecutionReport, ToolExecutor, ToolInvocation, ToolResult
+
+logger = logging.getLogger(__name__)
+
+# Sequential stages are separated by "then"/"afterwards"/newlines,
+# parallel steps within a stage by ";" or "and also"
+_STAGE_SPLIT = re.compile(r"\s*(?:\n+|\bthen\b|\bafterwards\b)\s*", re.IGNORECASE)
+_PARALLEL_SPLIT = re.compile(r"\s*(?:;|\band also\b)\s*", re.IGNORECASE)
+_LEADING_FILLER = re.compile(r"^(?:and|first|finally|,|\.)\s*", re.IGNORECASE)
+
+# Sends a message to an agent's queue and waits for its response text
+Dispatch = Callable[[str, str, str, Dict[str, Any], Optional[float]], Awaitable[str]]
+
+
+class WorkflowNode(BaseModel):
+    """One subtask delegated to an agent"""
+    node_id: str
+    agent_id: str
+    message: str
+    depends_on: List[str] = []
+    context: Dict[str, Any] = {}
+    timeout: Optional[float] = None
+
+
+class WorkflowPlan(BaseModel):
+    """A task DAG produced by the orchestrator"""
+    workflow_id: str
+    nodes: List[WorkflowNode]
+
+
+def workflow_id_for(session_id: str, message: str) -> str:
+    """Stable id so a retried request finds the checkpoint of its earlier attempt"""
+    return hashlib.sha1(f"{session_id}:{message}".encode()).hexdigest()[:16]
+
+
+async def plan_workflow(
+    message: str,
+    session_id: str,
+    route: Callable[[str], Awaitable[str]],
+    explicit_plan: Optional[Dict[str, Any]] = None
+) -> WorkflowPlan:
+    """Break a request into a DAG of agent subtasks.
+
+    An explicit plan ({"nodes": [...]}) is used as given. Otherwise the
+    message is split into sequential stages and parallel steps; each step
+    is routed to an agent and depends on every step of the previous stage.
+    """
+    workflow_id = workflow_id_for(session_id, message)
+    if explicit_plan:
+        return WorkflowPlan(workflow_id=explicit_plan.get("workflow_id", workflow_id), nodes=explicit_plan["nodes"])
+
+    nodes: List[WorkflowNode] = []
+    previous_stage: List[str] = []
+    for stage in _STAGE_SPLIT.split(message):
+        current_stage = []
+        for step in _PARALLEL_SPLIT.split(stage):
+            step = _LEADING_FILLER.sub("", step.strip()).strip()
+            if not step:
+                continue
+            node_id = f"step{len(nodes) + 1}"
+            nodes.append(WorkflowNode(
+                node_id=node_id,
+                agent_id=await route(step),
+                message=step,
+                depends_on=list(previous_stage)
+            ))
+            current_stage.append(node_id)
+        if current_stage:
+            previous_stage = current_stage
+
+    return WorkflowPlan(workflow_id=workflow_id, nodes=nodes)
+
+
+class WorkflowEngine:
+    """Runs workflow DAGs with checkpointing and progress streaming.
+
+    Each node is sent to its agent's queue; nodes whose dependencies are met
+    run concurrently and receive their dependencies' results as
+    context["inputs"]. Node results are checkpointed in the session's
+    agent_state after every completion, so a retried workflow only re-runs
+    nodes that have not succeeded yet.
+    """
+
+    def __init__(
+        self,
+        dispatch: Dispatch,
+        session_manager: Any,
+        websocket_manager: Any,
+        max_parallel: int = 4
+    ):
+        self.dispatch = dispatch
+        self.session_manager = session_manager
+        self.websocket_manager = websocket_manager
+        self.max_parallel = max_parallel
+        self._checkpoint_locks: Dict[str, asyncio.Lock] = {}
+
+    async def run(self, plan: WorkflowPlan, session_id: str) -> ToolExecutionReport:
+        """Execute a plan and return every node's result"""
+        nodes = {node.node_id: node for node in plan.nodes}
+        completed = await self._load_checkpoint(session_id, plan.workflow_id)
+        if completed:
+            logger.info(f"Resuming workflow {plan.workflow_id} with {len(completed)} completed nodes")
+
+        invocations = [
+            ToolInvocation(
+                call_id=node.node_id,
+                tool=node.agent_id,
+                arguments={"node_id": node.node_id, "inputs": {dep: {"$result": dep} for dep in node.depends_on}},
+                depends_on=node.depends_on
+            )
+            for node in plan.nodes
+        ]
+        results: Dict[str, Dict[str, Any]] = {call_id: result.dict() for call_id, result in completed.items()}
+
+        def resolve(invocation: ToolInvocation):
+            node = nodes[invocation.call_id]
+
+            async def run_node(node_id: str, inputs: Dict[str, Any]) -> str:
+                await self._progress(session_id, plan, node, "running", len(results))
+                context = {**node.context, "inputs": inputs, "workflow_id": plan.workflow_id}
+                return await self.dispatch(node.agent_id, node.message, session_id, context, node.timeout)
+            return run_node
+
+        async def on_result(result: ToolResult):
+            results[result.call_id] = result.dict()
+            await self._save_checkpoint(session_id, plan.workflow_id, results, len(nodes))
+            await self._progress(session_id, plan, nodes[result.call_id], result.status, len(results), result)
+
+        executor = ToolExecutor(resolve, self.max_parallel)
+        try:
+            report = await executor.execute(invocations, completed=completed, on_result=on_result)
+        finally:
+            self._checkpoint_locks.pop(plan.workflow_id, None)
+
+        await self.websocket_manager.send_message(session_id, {
+            "type": "workflow_complete",
+            "workflow_id": plan.workflow_id,
+            "session_id": session_id,
+            "succeeded": report.succeeded,
+            "elapsed": report.elapsed,
+            "results": {call_id: result.dict() for call_id, result in report.results.items()}
+        })
+        return report
+
+    async def _progress(
+        self,
+        session_id: str,
+        plan: WorkflowPlan,
+        node: WorkflowNode,
+        status: str,
+        finished: int,
+        result: Optional[ToolResult] = None
+    ):
+        message = {
+            "type": "workflow_progress",
+            "workflow_id": plan.workflow_id,
+            "session_id": session_id,
+            "node_id": node.node_id,
+            "agent_id": node.agent_id,
+            "status": status,
+            "finished": finished,
+            "total": len(plan.nodes)
+        }
+        if result is not None:
+            message["result"] = result.result
+            message["error"] = result.error
+        await self.websocket_manager.send_message(session_id, message)
+
+    async def _load_checkpoint(self, session_id: str, workflow_id: str) -> Dict[str, ToolResult]:
+        session = await self.session_manager.get_session(session_id)
+        if not session:
+            return {}
+        checkpoint = session.agent_state.get("workflows", {}).get(workflow_id)
+        if not checkpoint or checkpoint.get("status") == "completed":
+            # Finished workflows are not replayed; asking again runs them fresh
+            return {}
+        return {
+            node_id: ToolResult(**result)
+            for node_id, result in checkpoint.get("nodes", {}).items()
+            if result.get("status") == "success"
+        }
+
+    async def _save_checkpoint(self, session_id: str, workflow_id: str, results: Dict[str, Dict[str, Any]], total: int):
+        # Serialize read-modify-write of agent_state between concurrent nodes
+        lock = self._checkpoint_locks.setdefault(workflow_id, asyncio.Lock())
+        async with lock:
+            try:
+                session = await self.session_manager.get_session(session_id)
+                if not session:
+                    return
+                agent_state = dict(session.agent_state)
+                workflows = dict(agent_state.get("workflows", {}))
+                if len(results) < total:
+                    status = "running"
+                elif all(result["status"] == "success" for result in results.values()):
+                    status = "completed"
+                else:
+                    status = "failed"
+                workflows[workflow_id] = {"status": status, "nodes": dict(results)}
+                agent_state["workflows"] = workflows
+                await self.session_manager.update_session(session_id, {"agent_state": agent_state})
+            except Exception as e:
+                logger.error(f"Failed to checkpoint workflow {workflow_id}: {e}")
@@ -11,17 +11,28 @@ from contextlib import asynccontextmanager
 from typing import Dict, List, Optional
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Header, HTTPException, Response, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
-from core.agent_manager import AgentManager
+from core.agent_manager import AgentConfig, AgentManager
+from core.agent_queue import create_queue_factory
+from core.auth import AuthenticationService, Permission
+from core.autoscaler import AutoscalePolicy
 from core.browser_automation import BrowserAutomationService
+from core.cluster_delivery import ClusterDelivery
+from core.cpu_offload import CPUExecutor
+from core.llm_providers import ProviderRegistry
 from core.mcp_integration import MCPServerManager
+from core.metrics import CONTENT_TYPE_LATEST, REGISTRY
+from core.result_relay import ResultRelay
 from core.session_manager import SessionManager
-from core.websocket_manager import WebSocketManager
+from core.subscriber_queue import SubscriberOverflow
+from core.websocket_manager import WebSocketManager, topic_allowed, valid_topic
+from core.wire_format import ENCODINGS, JSON, MSGPACK, encode_binary
 from utils.config import Settings
 from utils.logger import setup_logging
 
@@ -31,6 +42,7 @@ logger = logging.getLogger(__name__)
 
 # Global managers
 agent_manager: Optional[AgentManager] = None
+auth_service: Optional[AuthenticationService] = None
 browser_service: Optional[BrowserAutomationService] = None
 mcp_manager: Optional[MCPServerManager] = None
 session_manager: Optional[SessionManager] = None
@@ -39,7 +51,7 @@ websocket_manager: Optional[WebSocketManager] = None
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
-    global agent_manager, browser_service, mcp_manager, session_manager, websocket_manager
+    global agent_manager, auth_service, browser_service, mcp_manager, session_manager, websocket_manager
     
     logger.info("Starting AI Agent System...")
     
@@ -53,6 +65,9 @@ async def lifespan(app: FastAPI):
     )
     await session_manager.initialize()
     
+    # Authenticates observers of agent, global and other sessions' event topics
+    auth_service = AuthenticationService(session_manager, settings.secret_key)
+    
     # Initialize browser automation service
     browser_service = BrowserAutomationService()
     await browser_service.initialize()
@@ -63,14 +78,43 @@ async def lifespan(app: FastAPI):
     await mcp_manager.initialize()
     
     # Initialize WebSocket manager
-    websocket_manager = WebSocketManager()
+    # Messages for sessions connected to other replicas are relayed over Redis pub/sub
+    websocket_manager = WebSocketManager(
+        sse_queue_size=settings.sse_queue_size,
+        sse_overflow=settings.sse_overflow_policy,
+        cluster=ClusterDelivery(session_manager.redis)
+        if settings.websocket_cluster and session_manager.redis is not None else None
+    )
+    await websocket_manager.start()
     
     # Initialize agent manager
+    # With shared queues, outcomes of requests processed on other replicas come back over Redis pub/sub
+    result_relay = None
+    if settings.agent_queue_backend == "redis":
+        if session_manager.redis is not None:
+            result_relay = ResultRelay(session_manager.redis)
+        else:
+            logger.warning("Redis is unavailable: results of requests processed on other replicas will not arrive")
     agent_manager = AgentManager(
         session_manager=session_manager,
         browser_service=browser_service,
         mcp_manager=mcp_manager,
-        websocket_manager=websocket_manager
+        websocket_manager=websocket_manager,
+        queue_factory=create_queue_factory(
+            settings.agent_queue_backend,
+            redis_url=settings.redis_url,
+            consumer=settings.agent_queue_consumer
+        ),
+        cpu_executor=CPUExecutor(
+            max_workers=settings.cpu_workers,
+            max_pending=settings.cpu_max_pending
+        ) if settings.cpu_workers > 0 else None,
+        autoscale_policy=AutoscalePolicy(
+            min_workers=settings.agent_min_workers,
+            max_workers=settings.agent_max_workers
+        ) if settings.agent_autoscale else None,
+        llm_providers=ProviderRegistry.from_settings(settings),
+        result_relay=result_relay
     )
     await agent_manager.initialize()
     
@@ -86,6 +130,8 @@ async def lifespan(app: FastAPI):
         await browser_service.cleanup()
     if mcp_manager:
         await mcp_manager.cleanup()
+    if websocket_manager:
+        await websocket_manager.stop()
     if session_manager:
         await session_manager.cleanup()
     
@@ -108,18 +154,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Longest a request may hold its connection open waiting for an agent's result, in seconds
+MAX_RESULT_WAIT = 60.0
+
 # Pydantic models
 class AgentRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
     agent_type: str = "default"
+    # Send to this agent (e.g. a custom one) instead of picking one by agent_type
+    agent_id: Optional[str] = None
     tools: List[str] = []
     context: Dict = {}
+    # Idempotency key within session_id: a resubmission with the same id joins the original request instead of running again
+    request_id: Optional[str] = None
+    # Wait for the agent's reply instead of returning once the request is queued
+    wait: bool = False
+    # Seconds to wait, at most MAX_RESULT_WAIT
+    wait_timeout: float = Field(default=30.0, ge=0.0)
 
 class AgentResponse(BaseModel):
     response: str
     session_id: str
     agent_id: str
+    request_id: Optional[str] = None
+    status: str = "completed"
     metadata: Dict = {}
 
 class BrowserTask(BaseModel):
@@ -148,25 +207,132 @@ async def health_check():
         }
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics endpoint"""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/agent/chat", response_model=AgentResponse)
-async def chat_with_agent(request: AgentRequest):
-    """Chat with the AI agent"""
+async def chat_with_agent(request: AgentRequest, response: Response):
+    """Chat with the AI agent.
+
+    With wait=true the reply is returned directly once the agent finishes.
+    Otherwise, or when wait_timeout passes first, the request stays queued:
+    the response is 202 with a request_id to poll at /agent/results/{request_id}.
+    """
     if not agent_manager:
         raise HTTPException(status_code=503, detail="Agent manager not initialized")
 
     try:
-        result = await agent_manager.handle_request(
+        queued = await agent_manager.process_message(
             message=request.message,
             session_id=request.session_id,
             agent_type=request.agent_type,
             tools=request.tools,
-            context=request.context
+            context=request.context,
+            agent_id=request.agent_id,
+            client_request_id=request.request_id
         )
-        return AgentResponse(**result)
+        record = None
+        if request.wait:
+            record = await agent_manager.wait_for_result(queued.request_id, min(request.wait_timeout, MAX_RESULT_WAIT))
     except Exception as e:
         logger.error(f"Error in /agent/chat: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    if not record or record["status"] in ("queued", "running"):
+        response.status_code = 202
+        return AgentResponse(
+            response=queued.response,
+            session_id=queued.session_id,
+            agent_id=queued.agent_id,
+            request_id=queued.request_id,
+            status=record["status"] if record else "queued",
+            metadata=queued.metadata
+        )
+
+    return AgentResponse(
+        response=record["response"] or record["error"] or "",
+        session_id=queued.session_id,
+        agent_id=queued.agent_id,
+        request_id=queued.request_id,
+        status=record["status"],
+        metadata={
+            **queued.metadata,
+            "status": record["status"],
+            "response_time": record.get("response_time"),
+            "timings": record.get("timings")
+        }
+    )
+
+@app.get("/agent/results/{request_id}")
+async def get_agent_result(request_id: str, response: Response, timeout: float = 30.0):
+    """Long-poll for the result of a queued /agent/chat request.
+
+    Returns as soon as the request finishes or after timeout seconds,
+    with 202 while it is still queued or running.
+    """
+    if not agent_manager:
+        raise HTTPException(status_code=503, detail="Agent manager not initialized")
+
+    record = await agent_manager.wait_for_result(request_id, min(max(timeout, 0.0), MAX_RESULT_WAIT))
+    if record is None:
+        raise HTTPException(status_code=404, detail="Request not found or result expired")
+    if record["status"] in ("queued", "running"):
+        response.status_code = 202
+    return record
+
+@app.post("/agents", status_code=201)
+async def create_agent(config: AgentConfig):
+    """Register a custom agent; replicas load it on first use"""
+    if not agent_manager:
+        raise HTTPException(status_code=503, detail="Agent manager not initialized")
+
+    try:
+        agent_id = await agent_manager.create_custom_agent(config)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error creating agent: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"agent_id": agent_id, "status": "created"}
+
+@app.put("/agents/{agent_id}")
+async def update_agent(agent_id: str, config: AgentConfig):
+    """Replace a custom agent's config; running replicas reload it"""
+    if not agent_manager:
+        raise HTTPException(status_code=503, detail="Agent manager not initialized")
+    if config.agent_id != agent_id:
+        raise HTTPException(status_code=400, detail="agent_id does not match the URL")
+
+    try:
+        await agent_manager.update_custom_agent(config)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error updating agent {agent_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"agent_id": agent_id, "status": "updated"}
+
+@app.delete("/agents/{agent_id}")
+async def delete_agent(agent_id: str):
+    """Delete a custom agent on every replica"""
+    if not agent_manager:
+        raise HTTPException(status_code=503, detail="Agent manager not initialized")
+
+    try:
+        deleted = await agent_manager.delete_custom_agent(agent_id)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error deleting agent {agent_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return {"agent_id": agent_id, "status": "deleted"}
+
 @app.post("/browser/execute")
 async def execute_browser_task(task: BrowserTask):
     """Execute a browser automation task"""
@@ -181,7 +347,8 @@ async def execute_browser_task(task: BrowserTask):
             text=task.text,
             options=task.options
         )
-        return {"result": result, "status": "success"}
+        # Screenshots are raw bytes; in JSON they become {"$base64": ...}
+        return {"result": jsonable_encoder(result, custom_encoder={bytes: encode_binary}), "status": "success"}
     except Exception as e:
         logger.error(f"Error executing browser task: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -214,67 +381,94 @@ async def list_mcp_tools():
         logger.error(f"Error listing MCP tools: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _bearer_token(authorization: Optional[str], token: Optional[str]) -> Optional[str]:
+    """The token of an Authorization: Bearer header, or of ?token= for browser WebSocket and EventSource clients"""
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return token
+
+async def _is_observer(token: Optional[str]) -> bool:
+    """Whether a token belongs to a user allowed to follow agent, global and other sessions' topics"""
+    if not token or not auth_service:
+        return False
+    token_data = await auth_service.verify_token(token)
+    return token_data is not None and auth_service.check_permission(token_data.permissions, Permission.SYSTEM_MONITOR)
+
 # WebSocket endpoint for real-time communication
 @app.websocket("/ws/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str):
-    """WebSocket endpoint for real-time agent communication"""
+async def websocket_endpoint(
+    websocket: WebSocket, session_id: str, batch: bool = False, encoding: str = JSON, token: Optional[str] = None
+):
+    """WebSocket endpoint for real-time agent communication
+    
+    With ?batch=true, messages queued while a send is in flight arrive together as one array frame.
+    Offering the "msgpack" subprotocol (or ?encoding=msgpack) switches to binary msgpack frames.
+    An observer token (Authorization: Bearer or ?token=) allows subscribing to topics beyond the session's own.
+    """
     if not websocket_manager:
         await websocket.close(code=1011, reason="WebSocket manager not initialized")
         return
     
-    await websocket_manager.connect(websocket, session_id)
+    subprotocol = MSGPACK if MSGPACK in websocket.scope.get("subprotocols", []) else None
+    encoding = subprotocol or encoding
+    if encoding not in ENCODINGS:
+        await websocket.close(code=1003, reason=f"Unknown encoding: {encoding}")
+        return
+    observer = await _is_observer(_bearer_token(websocket.headers.get("authorization"), token))
+    connection = await websocket_manager.connect(
+        websocket, session_id, batch=batch, encoding=encoding, subprotocol=subprotocol, observer=observer
+    )
     
     try:
         while True:
             data = await websocket.receive_text()
-            await websocket_manager.handle_message(session_id, data)
+            await websocket_manager.handle_message(connection, data)
     except WebSocketDisconnect:
-        websocket_manager.disconnect(session_id)
+        websocket_manager.disconnect(connection)
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
+        websocket_manager.disconnect(connection)
         await websocket.close(code=1011, reason="Internal error")
 
 # Mount static files (for serving the Next.js frontend if needed)
 if os.path.exists("/app/frontend"):
     app.mount("/static", StaticFiles(directory="/app/frontend"), name="static")
 
-# Server-Sent Events (SSE) endpoint for real-time updates per session
-@app.get("/sse/{session_id}")
-async def sse_stream(session_id: str):
-    """SSE endpoint to stream real-time events for a session.
-    Uses an internal asyncio.Queue per session in WebSocketManager.
-    """
-    global websocket_manager
-    if not websocket_manager:
-        # Return a small stream that immediately ends with an error message
-        async def error_gen():
-            yield "event: error\n"
-            yield "data: {\"message\": \"WebSocket manager not initialized\"}\n\n"
-        return StreamingResponse(error_gen(), media_type="text/event-stream")
-
-    queue = websocket_manager.subscribe(session_id)
+# Server-Sent Events (SSE) endpoints for real-time updates
+def _sse_unavailable() -> StreamingResponse:
+    # Return a small stream that immediately ends with an error message
+    async def error_gen():
+        yield "event: error\n"
+        yield "data: {\"message\": \"WebSocket manager not initialized\"}\n\n"
+    return StreamingResponse(error_gen(), media_type="text/event-stream")
 
+def _sse_response(queue, hello: Dict) -> StreamingResponse:
+    """Stream a subscriber queue's events, unsubscribing when the client goes away"""
     async def event_generator():
         try:
             # Initial hello event for clients to confirm connection
             yield "event: hello\n"
-            yield f"data: {{\"session_id\": \"{session_id}\", \"status\": \"connected\"}}\n\n"
+            yield f"data: {json.dumps({**hello, 'status': 'connected'})}\n\n"
 
             while True:
                 try:
-                    # Wait for next message with heartbeat timeout
-                    message = await asyncio.wait_for(queue.get(), timeout=15.0)
-                    payload = json.dumps(message)
-                    yield f"data: {payload}\n\n"
+                    # Wait for next message with heartbeat timeout; events arrive already encoded
+                    event = await asyncio.wait_for(queue.get(), timeout=15.0)
+                    yield f"data: {event.data}\n\n"
                 except asyncio.TimeoutError:
                     # Send heartbeat to keep the connection alive
                     yield ": keep-alive\n\n"
+                except SubscriberOverflow:
+                    # Too far behind to catch up; the client reconnects and resyncs
+                    yield "event: error\n"
+                    yield "data: {\"message\": \"Subscriber fell behind\"}\n\n"
+                    break
         except asyncio.CancelledError:
             # Client disconnected
             pass
         finally:
             # Ensure we unsubscribe to avoid memory leaks
-            websocket_manager.unsubscribe(session_id, queue)
+            websocket_manager.unsubscribe(queue)
 
     headers = {
         "Cache-Control": "no-cache",
@@ -282,3 +476,34 @@ async def sse_stream(session_id: str):
         "X-Accel-Buffering": "no",  # Disable buffering for some proxies
     }
     return StreamingResponse(event_generator(), media_type="text/event-stream", headers=headers)
+
+@app.get("/sse/{session_id}")
+async def sse_stream(session_id: str):
+    """SSE endpoint to stream real-time events for a session.
+    Uses a bounded queue per subscriber in WebSocketManager.
+    """
+    if not websocket_manager:
+        return _sse_unavailable()
+    return _sse_response(websocket_manager.subscribe(session_id), {"session_id": session_id})
+
+@app.get("/sse")
+async def sse_topics(topics: str, token: Optional[str] = None, authorization: Optional[str] = Header(None)):
+    """SSE endpoint for observers: stream the events of comma-separated topics,
+    e.g. ?topics=agent:browser_agent,session:abc,global
+    
+    Needs an observer token (Authorization: Bearer or ?token=).
+    """
+    if not websocket_manager:
+        return _sse_unavailable()
+    requested = [topic.strip() for topic in topics.split(",") if topic.strip()]
+    invalid = [topic for topic in requested if not valid_topic(topic)]
+    if not requested or invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid topics: {invalid or topics}")
+    bearer = _bearer_token(authorization, token)
+    observer = await _is_observer(bearer)
+    denied = [topic for topic in requested if not topic_allowed(topic, None, observer)]
+    if denied:
+        if not bearer:
+            raise HTTPException(status_code=401, detail="Authentication required", headers={"WWW-Authenticate": "Bearer"})
+        raise HTTPException(status_code=403, detail=f"Observer role required for topics: {denied}")
+    return _sse_response(websocket_manager.subscribe_topics(requested), {"topics": requested})
@@ -0,0 +1,69 @@
+"""
+Shared test doubles for the session and WebSocket managers
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+
+class FakeSessions:
+    """In-memory stand-in for SessionManager: stores messages and serves them back as history"""
+
+    redis = None
+
+    def __init__(self, db=None, history_delay=0.0):
+        self.db = db
+        # Simulated latency of a history read
+        self.history_delay = history_delay
+        self.messages = []
+        self.fetches = 0
+        self.sessions = {}
+
+    async def create_session(self):
+        session_id = f"session-{len(self.sessions) + 1}"
+        self.sessions[session_id] = SimpleNamespace(agent_state={})
+        return session_id
+
+    async def get_session(self, session_id):
+        return self.sessions.setdefault(session_id, SimpleNamespace(agent_state={}))
+
+    async def update_session(self, session_id, updates):
+        session = await self.get_session(session_id)
+        for key, value in updates.items():
+            setattr(session, key, value)
+
+    async def add_message(self, session_id, role, content, metadata=None):
+        self.messages.append({"session_id": session_id, "role": role, "content": content, "metadata": metadata or {}})
+        return len(self.messages)
+
+    async def get_conversation_history(self, session_id, limit=50):
+        self.fetches += 1
+        if self.history_delay:
+            await asyncio.sleep(self.history_delay)
+        history = [
+            {"role": message["role"], "content": message["content"], "metadata": message["metadata"]}
+            for message in self.messages if message["session_id"] == session_id
+        ]
+        return history[-limit:]
+
+
+class FakeWebSockets:
+    """Stand-in for WebSocketManager that records every message sent to a session"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, session_id, message):
+        self.sent.append(message)
+
+
+@pytest.fixture
+def sessions():
+    return FakeSessions()
+
+
+@pytest.fixture
+def websockets():
+    return FakeWebSockets()
@@ -0,0 +1,127 @@
+"""
+Agent prompt material cache tests
+"""
+
+import asyncio
+from datetime import datetime
+
+from core.agent_context import PromptMaterialCache, WarmContext, WarmContextPool
+from core.agent_manager import AgentCapability, AgentConfig, AgentManager, AgentType
+
+
+def _config(**overrides):
+    fields = dict(
+        agent_id="agent",
+        name="Agent",
+        type=AgentType.LLM_AGENT,
+        instructions="Be helpful",
+        tools=["calculator"],
+        capabilities=[AgentCapability(name="math", description="Do sums")]
+    )
+    fields.update(overrides)
+    return AgentConfig(**fields)
+
+
+def test_material_is_compiled_once_per_version():
+    """Repeated lookups reuse the compiled material without listing MCP tools again"""
+    cache = PromptMaterialCache()
+    config = _config()
+    listed = []
+
+    def mcp_tools():
+        listed.append(1)
+        return ["mcp_fetch"]
+
+    first = cache.get(config, 1, mcp_tools)
+    second = cache.get(config, 1, mcp_tools)
+
+    assert first is second
+    assert first.tools == ("calculator", "mcp_fetch")
+    assert first.capabilities[0]["name"] == "math"
+    assert len(listed) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_registry_and_config_changes_recompile():
+    """A new tool registry version, an updated config or a replaced config rebuild the material"""
+    cache = PromptMaterialCache()
+    config = _config()
+    original = cache.get(config, 1, lambda: [])
+
+    assert cache.get(config, 2, lambda: ["mcp_new"]).tools == ("calculator", "mcp_new")
+
+    config.instructions = "Be terse"
+    config.updated_at = datetime(2030, 1, 1)
+    assert cache.get(config, 2, lambda: []).instructions == "Be terse"
+
+    replacement = _config(tools=["web_search"])
+    assert cache.get(replacement, 2, lambda: []).tools == ("web_search",)
+
+    cache.invalidate("agent")
+    assert cache.get(replacement, 2, lambda: []) is not original
+    assert cache.misses == 5
+
+
+def test_material_precompiles_prompt_and_tool_schemas():
+    """The system prompt prefix and tool schemas are built with the material"""
+    cache = PromptMaterialCache()
+    material = cache.get(_config(), 1, lambda: [
+        {"name": "mcp_fetch", "description": "Fetch a URL", "input_schema": {"type": "object", "required": ["url"]}}
+    ])
+
+    assert material.tools == ("calculator", "mcp_fetch")
+    assert material.system_prompt == "Be helpful\n\nCapabilities:\n- math: Do sums"
+    assert material.tool_schemas[1]["parameters"]["required"] == ["url"]
+    assert '"name":"mcp_fetch"' in material.tool_schemas_json
+
+
+def test_warm_context_extends_only_consecutive_turns():
+    """A turn right after the window's last message is appended; a gap needs a reseed"""
+    material = PromptMaterialCache().get(_config(), 1, list)
+    warm = WarmContext(material, _config(), "session", window=3)
+    assert not warm.extends(1)
+
+    warm.reset([{"role": "user", "content": f"m{index}"} for index in range(5)], 5)
+    assert [entry["content"] for entry in warm.history] == ["m2", "m3", "m4"]
+    assert warm.extends(6) and not warm.extends(7)
+
+    warm.append({"role": "user", "content": "m5"})
+    context = warm.build("m5", {"extra": True})
+    assert [message["content"] for message in context["messages"]] == ["m3", "m4", "m5"]
+    assert context["system_prompt"] == material.system_prompt and context["extra"]
+    assert warm.history_length == 6
+
+
+def test_pool_evicts_least_recently_used_over_budget():
+    """Contexts beyond the byte budget are evicted coldest first"""
+    evicted = []
+    pool = WarmContextPool(max_bytes=250, on_evict=evicted.append)
+    pool.touch("a", 100)
+    pool.touch("b", 100)
+    pool.touch("a", 100)
+    pool.touch("c", 100)
+
+    assert evicted == ["b"]
+    assert "a" in pool and "c" in pool
+    assert pool.total_bytes == 200
+
+
+def test_manager_reuses_warm_context_between_turns(sessions, websockets):
+    """Only a session's first turn reads its history; later turns extend the warm window"""
+
+    async def scenario():
+        manager = AgentManager(sessions, None, None, websockets)
+        await manager.initialize()
+        try:
+            for turn in range(3):
+                queued = await manager.process_message(f"turn {turn}", session_id="session", agent_id="general_assistant")
+                assert (await manager.wait_for_result(queued.request_id, 2.0))["status"] == "completed"
+            instance = manager.instances[queued.instance_id]
+            return [message["content"] for message in instance.warm.messages], len(manager.warm_contexts)
+        finally:
+            await manager.cleanup()
+
+    messages, pooled = asyncio.run(scenario())
+    assert sessions.fetches == 1
+    assert messages == ["turn 0", "turn 1", "turn 2"]
+    assert pooled == 1
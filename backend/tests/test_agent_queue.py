@@ -0,0 +1,218 @@
+"""
+Redis Streams agent queue tests
+"""
+
+import asyncio
+
+from core.agent_queue import RedisStreamQueue
+
+
+class _Streams:
+    """In-memory stand-in for the Redis Streams commands the queue uses, with a clock tests advance"""
+
+    def __init__(self):
+        self.now_ms = 0
+        self.entries = {}
+        self.groups = {}
+        self._sequence = 0
+        self._added = asyncio.Event()
+
+    def _group(self, stream, group):
+        return self.groups[(stream, group)]
+
+    def _seen(self, state, consumer):
+        state["consumers"][consumer] = self.now_ms
+
+    async def xgroup_create(self, stream, group, id="0", mkstream=False):
+        if (stream, group) in self.groups:
+            raise Exception("BUSYGROUP Consumer Group name already exists")
+        self.entries.setdefault(stream, {})
+        self.groups[(stream, group)] = {"delivered": 0, "pending": {}, "consumers": {}}
+
+    async def xadd(self, stream, fields, maxlen=None, approximate=True):
+        self._sequence += 1
+        entry_id = f"{self._sequence}-0"
+        self.entries.setdefault(stream, {})[entry_id] = dict(fields)
+        self._added.set()
+        return entry_id
+
+    async def xreadgroup(self, group, consumer, streams, count=1, block=0):
+        (stream, _), = streams.items()
+        state = self._group(stream, group)
+        self._seen(state, consumer)
+        while True:
+            fresh = [
+                entry_id for entry_id in self.entries[stream]
+                if int(entry_id.split("-")[0]) > state["delivered"]
+            ][:count]
+            if fresh:
+                break
+            self._added.clear()
+            try:
+                await asyncio.wait_for(self._added.wait(), block / 1000)
+            except asyncio.TimeoutError:
+                return []
+        for entry_id in fresh:
+            state["delivered"] = int(entry_id.split("-")[0])
+            state["pending"][entry_id] = [consumer, self.now_ms]
+        return [[stream, [(entry_id, self.entries[stream][entry_id]) for entry_id in fresh]]]
+
+    async def xack(self, stream, group, *entry_ids):
+        pending = self._group(stream, group)["pending"]
+        return sum(pending.pop(entry_id, None) is not None for entry_id in entry_ids)
+
+    async def xdel(self, stream, *entry_ids):
+        return sum(self.entries[stream].pop(entry_id, None) is not None for entry_id in entry_ids)
+
+    async def xlen(self, stream):
+        return len(self.entries.get(stream, {}))
+
+    async def xclaim(self, stream, group, consumer, min_idle_time, message_ids, justid=False):
+        self._seen(self._group(stream, group), consumer)
+        pending = self._group(stream, group)["pending"]
+        claimed = []
+        for entry_id in message_ids:
+            if entry_id in pending and self.now_ms - pending[entry_id][1] >= min_idle_time:
+                pending[entry_id] = [consumer, self.now_ms]
+                claimed.append(entry_id)
+        return claimed
+
+    async def xautoclaim(self, stream, group, consumer, min_idle_time, start_id="0-0", count=100):
+        self._seen(self._group(stream, group), consumer)
+        pending = self._group(stream, group)["pending"]
+        claimed = []
+        for entry_id, (_, delivered_at) in sorted(pending.items()):
+            if self.now_ms - delivered_at >= min_idle_time:
+                pending[entry_id] = [consumer, self.now_ms]
+                claimed.append((entry_id, self.entries[stream].get(entry_id)))
+        return ["0-0", claimed]
+
+    async def xinfo_consumers(self, stream, group):
+        state = self._group(stream, group)
+        return [
+            {
+                "name": consumer,
+                "pending": sum(owner == consumer for owner, _ in state["pending"].values()),
+                "idle": self.now_ms - seen
+            }
+            for consumer, seen in state["consumers"].items()
+        ]
+
+    async def xgroup_delconsumer(self, stream, group, consumer):
+        state = self._group(stream, group)
+        del state["consumers"][consumer]
+        dropped = [entry_id for entry_id, (owner, _) in state["pending"].items() if owner == consumer]
+        for entry_id in dropped:
+            del state["pending"][entry_id]
+        return len(dropped)
+
+
+def _queue(streams, consumer):
+    return RedisStreamQueue(streams, "echo_bot", consumer, claim_idle_ms=1000, block_ms=10)
+
+
+def test_requests_are_delivered_in_order_and_deleted_once_acked():
+    """get hands out each request once with its entry id; ack removes it from the stream"""
+    streams = _Streams()
+
+    async def scenario():
+        queue = _queue(streams, "a")
+        await queue.start()
+        try:
+            await queue.put({"request_id": "r1"})
+            await queue.put({"request_id": "r2"})
+            first, receipt = await queue.get()
+            second, _ = await queue.get()
+            depth = queue.qsize()
+            await queue.ack(receipt)
+            return first, second, depth, queue.qsize()
+        finally:
+            await queue.close()
+
+    first, second, depth, after = asyncio.run(scenario())
+    assert (first["request_id"], second["request_id"]) == ("r1", "r2")
+    assert (depth, after) == (2, 1)
+    assert list(streams.entries["agent_queue:echo_bot"]) == ["2-0"]
+    assert list(streams.groups[("agent_queue:echo_bot", "agent-workers")]["pending"]) == ["2-0"]
+
+
+def test_requests_of_a_dead_consumer_are_reclaimed():
+    """Entries a consumer stops heartbeating are taken over; live ones are left alone"""
+    streams = _Streams()
+
+    async def scenario():
+        alive, dead, rescuer = _queue(streams, "alive"), _queue(streams, "dead"), _queue(streams, "rescuer")
+        for queue in (alive, dead, rescuer):
+            await queue.start()
+        try:
+            await alive.put({"request_id": "kept"})
+            await alive.put({"request_id": "orphaned"})
+            await alive.get()
+            await dead.get()
+            streams.now_ms += 1500
+            await alive._heartbeat()
+            await rescuer._reclaim()
+            request, receipt = await rescuer.get()
+            await rescuer.ack(receipt)
+            return request
+        finally:
+            for queue in (alive, dead, rescuer):
+                await queue.close()
+
+    request = asyncio.run(scenario())
+    assert request["request_id"] == "orphaned"
+    assert streams.groups[("agent_queue:echo_bot", "agent-workers")]["pending"]["1-0"][0] == "alive"
+
+
+def test_reclaimed_requests_waiting_for_a_worker_stay_claimed():
+    """A reclaimed entry no worker has taken yet is heartbeated, so it is neither reclaimed again nor stolen"""
+    streams = _Streams()
+
+    async def scenario():
+        dead, busy, other = _queue(streams, "dead"), _queue(streams, "busy"), _queue(streams, "other")
+        for queue in (dead, busy, other):
+            await queue.start()
+        try:
+            await dead.put({"request_id": "r1"})
+            await dead.get()
+            streams.now_ms += 1500
+            await busy._reclaim()
+            # busy's workers are tied up past claim_idle_ms; only its maintenance runs
+            streams.now_ms += 1500
+            await busy._heartbeat()
+            await busy._reclaim()
+            await other._reclaim()
+            return len(busy._reclaimed), len(other._reclaimed)
+        finally:
+            for queue in (dead, busy, other):
+                await queue.close()
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+
+def test_consumers_of_dead_processes_are_removed_once_drained():
+    """Idle consumers leave the group after their entries are reclaimed; busy or recent ones stay"""
+    streams = _Streams()
+
+    async def scenario():
+        dead, idle, live = _queue(streams, "dead"), _queue(streams, "idle"), _queue(streams, "live")
+        for queue in (dead, idle, live):
+            await queue.start()
+        try:
+            await dead.put({"request_id": "r1"})
+            await dead.get()
+            await idle._reclaim()
+            streams.now_ms += 10000
+            # dead still owns r1, so it is kept until live reclaims it
+            await live._prune_consumers()
+            kept = set(streams.groups[("agent_queue:echo_bot", "agent-workers")]["consumers"])
+            await live._reclaim()
+            await live._prune_consumers()
+            return kept, set(streams.groups[("agent_queue:echo_bot", "agent-workers")]["consumers"])
+        finally:
+            for queue in (dead, idle, live):
+                await queue.close()
+
+    kept, remaining = asyncio.run(scenario())
+    assert kept == {"dead"}
+    assert remaining == {"live"}
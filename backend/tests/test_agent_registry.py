@@ -0,0 +1,145 @@
+"""
+Custom agent registry tests
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from core.agent_manager import AgentConfig, AgentManager, AgentType
+
+from conftest import FakeSessions, FakeWebSockets
+
+
+def _matches(document, query):
+    for key, condition in query.items():
+        value = document.get(key)
+        if isinstance(condition, dict):
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+            if "$gt" in condition and not value > condition["$gt"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class _Collection:
+    """Just the Motor calls the registry makes, over a list of documents"""
+
+    def __init__(self):
+        self.documents = []
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+    async def find_one(self, query, projection=None):
+        for document in self.documents:
+            if _matches(document, query):
+                return {k: v for k, v in document.items() if k not in ("_id", "deleted")}
+        return None
+
+    def find(self, query, projection=None):
+        return _Cursor([dict(document) for document in self.documents if _matches(document, query)])
+
+    async def replace_one(self, query, replacement, upsert=False):
+        for index, document in enumerate(self.documents):
+            if _matches(document, query):
+                self.documents[index] = dict(replacement)
+                return SimpleNamespace(matched_count=1)
+        if upsert:
+            self.documents.append(dict(replacement))
+        return SimpleNamespace(matched_count=0)
+
+    async def update_one(self, query, update):
+        for document in self.documents:
+            if _matches(document, query):
+                document.update(update["$set"])
+                return SimpleNamespace(modified_count=1)
+        return SimpleNamespace(modified_count=0)
+
+
+def _manager(db):
+    manager = AgentManager(FakeSessions(db), None, None, FakeWebSockets())
+    manager.custom_agent_idle_timeout = 0.2
+    return manager
+
+
+def _config(instructions="Answer tenant questions"):
+    return AgentConfig(
+        agent_id="tenant_bot",
+        name="Tenant Bot",
+        type=AgentType.LLM_AGENT,
+        instructions=instructions
+    )
+
+
+def test_custom_agent_loads_on_first_use_and_unloads_when_idle():
+    """Created agents get workers only when used and lose them after the idle timeout"""
+
+    async def scenario():
+        manager = _manager(SimpleNamespace(custom_agents=_Collection()))
+        manager.timers.start()
+        await manager.agent_registry.start()
+        try:
+            await manager.create_custom_agent(_config())
+            assert "tenant_bot" not in manager.agents
+            assert "tenant_bot" not in manager.worker_tasks
+
+            queued = await manager.process_message("hello", agent_id="tenant_bot")
+            assert queued.agent_id == "tenant_bot"
+            assert manager.worker_count("tenant_bot") == 1
+
+            record = await manager.wait_for_result(queued.request_id, 2.0)
+            assert record["status"] == "completed"
+
+            await asyncio.sleep(0.4)
+            assert "tenant_bot" not in manager.agents
+            assert "tenant_bot" not in manager.worker_tasks
+            assert "tenant_bot" not in manager.agent_queues
+
+            # The next request loads it again
+            queued = await manager.process_message("again", agent_id="tenant_bot")
+            assert (await manager.wait_for_result(queued.request_id, 2.0))["status"] == "completed"
+        finally:
+            await manager.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_config_changes_reach_other_replicas():
+    """An update or delete on one replica is applied by another that has the agent loaded"""
+
+    async def scenario():
+        db = SimpleNamespace(custom_agents=_Collection())
+        writer, reader = _manager(db), _manager(db)
+        for manager in (writer, reader):
+            await manager.agent_registry.start()
+        try:
+            await writer.create_custom_agent(_config())
+            assert (await reader._ensure_agent("tenant_bot")).instructions == "Answer tenant questions"
+
+            await writer.update_custom_agent(_config("Answer briefly"))
+            await reader.agent_registry.resync()
+            assert reader.agents["tenant_bot"].instructions == "Answer briefly"
+
+            assert await writer.delete_custom_agent("tenant_bot")
+            await reader.agent_registry.resync()
+            assert "tenant_bot" not in reader.agents
+            assert await reader._ensure_agent("tenant_bot") is None
+        finally:
+            await writer.cleanup()
+            await reader.cleanup()
+
+    asyncio.run(scenario())
@@ -0,0 +1,98 @@
+"""
+Worker autoscaler tests
+"""
+
+from types import SimpleNamespace
+
+from core.autoscaler import AutoscalePolicy, WorkerAutoscaler
+from core.latency import StageLatency
+
+
+class _Queue:
+    def __init__(self):
+        self.depth = 0
+
+    def qsize(self):
+        return self.depth
+
+
+class _Manager:
+    """Just the pool surface the autoscaler reads and resizes"""
+
+    def __init__(self):
+        self.agent_queues = {"agent": _Queue()}
+        self.worker_tasks = {"agent": []}
+        self.busy_workers = {"agent": 0}
+        self.workers = 1
+        self.metrics = SimpleNamespace(latency=StageLatency())
+
+    def worker_count(self, agent_id):
+        return self.workers
+
+    def scale_workers(self, agent_id, target):
+        self.workers = target
+
+    def _get_metrics(self, agent_id):
+        return self.metrics
+
+
+def test_backlog_grows_pool_within_bounds_and_cooldown():
+    """Growth is proportional to the backlog, capped at doubling and max_workers"""
+    manager = _Manager()
+    autoscaler = WorkerAutoscaler(manager, AutoscalePolicy(max_workers=6, scale_up_cooldown=1.0))
+    manager.agent_queues["agent"].depth = 40
+    manager.busy_workers["agent"] = 1
+
+    autoscaler.sample(now=0.0)
+    assert manager.workers == 2
+    autoscaler.sample(now=0.5)  # still cooling down
+    assert manager.workers == 2
+    autoscaler.sample(now=1.5)
+    assert manager.workers == 4
+    autoscaler.sample(now=3.0)
+    assert manager.workers == 6
+    autoscaler.sample(now=4.5)
+    assert manager.workers == 6
+
+
+def test_pool_shrinks_only_after_sustained_idleness():
+    """Shrinking needs several idle samples in a row and one worker goes at a time"""
+    manager = _Manager()
+    manager.workers = 4
+    policy = AutoscalePolicy(scale_down_samples=3, scale_down_cooldown=0.0)
+    autoscaler = WorkerAutoscaler(manager, policy)
+
+    autoscaler.sample(now=0.0)
+    autoscaler.sample(now=1.0)
+    manager.busy_workers["agent"] = 3  # a busy sample resets the streak
+    autoscaler.sample(now=2.0)
+    manager.busy_workers["agent"] = 0
+    autoscaler.sample(now=3.0)
+    autoscaler.sample(now=4.0)
+    assert manager.workers == 4
+    autoscaler.sample(now=5.0)
+    assert manager.workers == 3
+
+
+def test_recent_queue_wait_triggers_growth():
+    """Long waits since the last sample grow the pool even with a short queue"""
+    manager = _Manager()
+    manager.workers = 2
+    autoscaler = WorkerAutoscaler(manager, AutoscalePolicy(scale_up_queue_wait=0.5))
+    manager.agent_queues["agent"].depth = 1
+    for _ in range(5):
+        manager.metrics.latency.queue_wait.record(2.0)
+
+    autoscaler.sample(now=0.0)
+    assert manager.workers == 3
+
+
+def test_rate_limited_agent_does_not_grow():
+    """A backlog waiting on provider quota adds no workers"""
+    manager = _Manager()
+    manager.is_rate_limited = lambda agent_id: True
+    autoscaler = WorkerAutoscaler(manager, AutoscalePolicy(max_workers=6))
+    manager.agent_queues["agent"].depth = 40
+
+    autoscaler.sample(now=0.0)
+    assert manager.workers == 1
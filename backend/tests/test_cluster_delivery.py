@@ -0,0 +1,135 @@
+"""
+Cross-replica message delivery tests
+"""
+
+import asyncio
+import json
+
+from core.cluster_delivery import ClusterDelivery
+from core.websocket_manager import WebSocketManager
+
+
+class _Broker:
+    """In-memory stand-in for Redis pub/sub shared by several replicas"""
+
+    def __init__(self):
+        self.subscriptions = []
+        self.published = 0
+
+    async def publish(self, channel, data):
+        self.published += 1
+        for pubsub in list(self.subscriptions):
+            if channel in pubsub.channels:
+                pubsub.messages.put_nowait({"type": "message", "channel": channel, "data": data})
+
+    def pipeline(self, transaction=True):
+        broker = self
+
+        class _Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def publish(self, channel, data):
+                self.calls.append((channel, data))
+
+            async def execute(self):
+                for channel, data in self.calls:
+                    await broker.publish(channel, data)
+        return _Pipeline()
+
+    def pubsub(self):
+        broker = self
+
+        class _PubSub:
+            def __init__(self):
+                self.channels = set()
+                self.messages = asyncio.Queue()
+                broker.subscriptions.append(self)
+
+            async def subscribe(self, *channels):
+                self.channels.update(channels)
+
+            async def unsubscribe(self, *channels):
+                self.channels.difference_update(channels)
+
+            async def listen(self):
+                while True:
+                    yield await self.messages.get()
+
+            async def close(self):
+                broker.subscriptions.remove(self)
+        return _PubSub()
+
+
+class _Socket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+def test_messages_reach_sessions_on_other_replicas():
+    """A replica serves its own connections directly and relays the rest once each"""
+    broker = _Broker()
+    replica_a = WebSocketManager(cluster=ClusterDelivery(broker))
+    replica_b = WebSocketManager(cluster=ClusterDelivery(broker))
+    local, remote, observer = _Socket(), _Socket(), _Socket()
+
+    async def scenario():
+        await replica_a.start()
+        await replica_b.start()
+        try:
+            await replica_a.connect(local, "s1")
+            await replica_b.connect(remote, "s2")
+            watcher = await replica_b.connect(observer, "dashboard", observer=True)
+            await replica_b.handle_message(watcher, json.dumps({
+                "type": "subscribe", "topics": ["session:s2", "agent:general_assistant"]
+            }))
+            await asyncio.sleep(0.01)
+
+            await replica_a.send_message("s1", {"type": "agent_response", "response": "local"})
+            await replica_a.send_message("s2", {
+                "type": "agent_response", "response": "remote", "agent_id": "general_assistant"
+            })
+            # Order across replicas is not guaranteed; let the relayed message land first
+            await asyncio.sleep(0.01)
+            await replica_b.broadcast_message({"type": "notice"}, exclude_sessions=["dashboard"])
+            await asyncio.sleep(0.01)
+        finally:
+            await replica_a.stop()
+            await replica_b.stop()
+
+    asyncio.run(scenario())
+    assert [message.get("response") for message in local.sent[1:]] == ["local", None]
+    assert local.sent[-1]["type"] == "notice"
+    assert [message.get("response") for message in remote.sent[1:]] == ["remote", None]
+    # Subscribed to both the session and the agent topic, the observer still gets one copy
+    responses = [message for message in observer.sent if message["type"] == "agent_response"]
+    assert [message["response"] for message in responses] == ["remote"]
+    assert not any(message["type"] == "notice" for message in observer.sent)
+
+
+def test_replicas_follow_only_topics_with_local_subscribers():
+    """Channels are subscribed while a topic has subscribers here and dropped after"""
+    broker = _Broker()
+    manager = WebSocketManager(cluster=ClusterDelivery(broker))
+
+    async def scenario():
+        await manager.start()
+        try:
+            connection = await manager.connect(_Socket(), "s1")
+            await asyncio.sleep(0.01)
+            subscribed = set(broker.subscriptions[0].channels)
+            manager.disconnect(connection)
+            await asyncio.sleep(0.01)
+            return subscribed, set(broker.subscriptions[0].channels)
+        finally:
+            await manager.stop()
+
+    subscribed, after = asyncio.run(scenario())
+    assert subscribed == {"ws:session:s1", "ws:global"}
+    assert after == {"ws:global"}
@@ -0,0 +1,145 @@
+"""
+CPU offload tests
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from concurrent.futures.process import BrokenProcessPool
+
+from core.cpu_offload import CPUExecutor, CPUExecutorBusy, SharedPayload, _to_shared, is_cpu_bound
+from core.cpu_tasks import html_to_text, summarize_table
+
+
+def _echo_slowly(data: bytes, delay: float) -> bytes:
+    time.sleep(delay)
+    return data
+
+
+def _crash():
+    os._exit(1)
+
+
+def _shm_blocks() -> set:
+    return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+
+def test_cpu_tasks_are_declared_cpu_bound():
+    """Offloadable steps carry the @cpu_bound marker"""
+    assert is_cpu_bound(html_to_text)
+    assert is_cpu_bound(summarize_table)
+    assert not is_cpu_bound(len)
+
+
+def test_summarize_table():
+    """Numeric columns get min/max/mean; text columns are left alone"""
+    summary = summarize_table(b"id,price,name\n1,2.5,a\n2,,b\n3,7.5,c\n")
+    assert summary["rows"] == 3
+    assert summary["columns"]["price"] == {"numeric": 2, "empty": 1, "min": 2.5, "max": 7.5, "mean": 5.0}
+    assert summary["columns"]["name"]["numeric"] == 0
+
+
+def test_large_payloads_round_trip_through_shared_memory():
+    """Payloads above the threshold are handed to workers via shared memory"""
+    html = b"<html><script>ignored()</script><body>" + b"<p>hello</p>" * 50000 + b"</body></html>"
+
+    async def scenario():
+        executor = CPUExecutor(max_workers=1, shm_threshold=1024)
+        await executor.start()
+        try:
+            return await executor.run(html_to_text, html)
+        finally:
+            await executor.shutdown()
+
+    text = asyncio.run(scenario())
+    assert text.startswith("hello hello")
+    assert "ignored" not in text
+
+
+def test_bounded_pending_queue_rejects_overflow():
+    """Submissions beyond max_pending fail fast instead of queueing without bound"""
+
+    async def scenario():
+        executor = CPUExecutor(max_workers=1, max_pending=1)
+        await executor.start()
+        try:
+            calls = [asyncio.ensure_future(executor.run(html_to_text, "<p>x</p>")) for _ in range(3)]
+            results = await asyncio.gather(*calls, return_exceptions=True)
+        finally:
+            await executor.shutdown()
+        return results
+
+    results = asyncio.run(scenario())
+    assert results[0] == "x"
+    assert isinstance(results[2], CPUExecutorBusy)
+
+
+def test_cancelled_calls_free_shared_memory_after_the_worker_finishes():
+    """A cancelled call keeps its input blocks until the worker is done, then frees them and its result"""
+
+    async def scenario():
+        executor = CPUExecutor(max_workers=1, shm_threshold=1024)
+        await executor.start()
+        try:
+            before = _shm_blocks()
+            call = asyncio.ensure_future(executor.run(_echo_slowly, b"x" * 4096, 0.3))
+            await asyncio.sleep(0.1)
+            call.cancel()
+            await asyncio.gather(call, return_exceptions=True)
+            # The worker may still read its input
+            while_running = _shm_blocks() - before
+            while executor.running:
+                await asyncio.sleep(0.05)
+            after = _shm_blocks() - before
+            # The freed slot is usable again
+            again = await executor.run(_echo_slowly, b"y" * 4096, 0)
+            return while_running, after, again
+        finally:
+            await executor.shutdown()
+
+    while_running, after, again = asyncio.run(scenario())
+    assert len(while_running) == 1
+    assert after == set()
+    assert again == b"y" * 4096
+
+
+def test_large_text_payloads_go_through_shared_memory():
+    """Page HTML arrives as str; large text is shared like bytes and comes back as str"""
+    html = "<html><body>" + "<p>héllo</p>" * 50000 + "</body></html>"
+    shared = _to_shared(html, 1024)
+    try:
+        assert isinstance(shared, SharedPayload)
+        assert shared.read() == html
+    finally:
+        shared.unlink()
+
+    async def scenario():
+        executor = CPUExecutor(max_workers=1, shm_threshold=1024)
+        await executor.start()
+        try:
+            return await executor.run(html_to_text, html)
+        finally:
+            await executor.shutdown()
+
+    text = asyncio.run(scenario())
+    assert isinstance(text, str)
+    assert text.startswith("héllo héllo")
+
+
+def test_a_crashed_worker_does_not_disable_offload():
+    """The call whose worker died fails; the pool is recreated for the calls after it"""
+
+    async def scenario():
+        executor = CPUExecutor(max_workers=1)
+        await executor.start()
+        try:
+            with pytest.raises(BrokenProcessPool):
+                await executor.run(_crash)
+            return await executor.run(html_to_text, "<p>x</p>"), executor.running
+        finally:
+            await executor.shutdown()
+
+    assert asyncio.run(scenario()) == ("x", 0)
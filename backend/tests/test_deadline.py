@@ -0,0 +1,65 @@
+"""
+Request deadline tests
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from core.deadline import (
+    DeadlineExceeded, bounded_timeout, current_deadline, deadline_scope, remaining, with_deadline
+)
+
+
+def test_nested_scopes_keep_the_earliest_deadline():
+    """An inner scope can shorten but never extend the enclosing deadline"""
+    now = time.time()
+    assert current_deadline() is None
+    with deadline_scope(now + 10):
+        with deadline_scope(now + 60) as inner:
+            assert inner == now + 10
+        with deadline_scope(now + 1) as inner:
+            assert inner == now + 1
+            assert bounded_timeout(30) <= 1
+    assert current_deadline() is None
+    assert remaining() is None
+
+
+def test_expired_work_is_cancelled_and_deadline_flows_into_tasks():
+    """Work outliving the deadline is cancelled; spawned tasks inherit the deadline"""
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def child():
+        return current_deadline()
+
+    async def scenario():
+        with deadline_scope(time.time() + 0.05) as deadline:
+            assert await asyncio.create_task(child()) == deadline
+            started = time.perf_counter()
+            with pytest.raises(DeadlineExceeded):
+                await with_deadline(slow())
+            return time.perf_counter() - started
+
+    elapsed = asyncio.run(scenario())
+    assert elapsed < 0.5
+    assert cancelled == [True]
+
+
+def test_plain_timeouts_are_not_reported_as_deadlines():
+    """A local timeout shorter than the deadline stays an ordinary TimeoutError"""
+
+    async def scenario():
+        with deadline_scope(time.time() + 10):
+            await with_deadline(asyncio.sleep(1), timeout=0.01)
+
+    with pytest.raises(asyncio.TimeoutError) as raised:
+        asyncio.run(scenario())
+    assert not isinstance(raised.value, DeadlineExceeded)
@@ -0,0 +1,89 @@
+"""
+Hedged request tests
+"""
+
+import asyncio
+
+from core.hedging import HedgePolicy, Hedger
+
+
+def _call(delay, result, log=None):
+    async def call():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(result)
+            raise
+        return result
+    return call
+
+
+def test_slow_primary_is_raced_and_loser_cancelled():
+    """A backup starts after the threshold, wins, and the primary is cancelled"""
+    hedger = Hedger(HedgePolicy(min_delay=0.0))
+    cancelled = []
+
+    async def scenario():
+        return await hedger.run(
+            "primary", _call(1.0, "primary", cancelled), "backup", _call(0.01, "backup"), threshold=0.02
+        )
+
+    assert asyncio.run(scenario()) == "backup"
+    assert cancelled == ["primary"]
+
+
+def test_fast_primary_never_hedges():
+    """A primary answering before the threshold does not start a backup"""
+    hedger = Hedger(HedgePolicy(min_delay=0.0))
+    started = []
+
+    async def backup():
+        started.append(1)
+        return "backup"
+
+    async def scenario():
+        return await hedger.run("primary", _call(0.001, "primary"), "backup", backup, threshold=0.2)
+
+    assert asyncio.run(scenario()) == "primary"
+    assert started == []
+
+
+def test_failed_backup_falls_back_to_primary():
+    """If the backup fails the primary's result is still used"""
+    hedger = Hedger(HedgePolicy(min_delay=0.0))
+
+    async def failing():
+        raise RuntimeError("backup down")
+
+    async def scenario():
+        return await hedger.run("primary", _call(0.05, "primary"), "backup", failing, threshold=0.01)
+
+    assert asyncio.run(scenario()) == "primary"
+
+
+def test_budget_caps_hedge_rate():
+    """Hedges stay within max_hedge_ratio of requests plus the burst"""
+    hedger = Hedger(HedgePolicy(min_delay=0.0, max_hedge_ratio=0.1, burst=1.0))
+    hedged = []
+
+    async def backup():
+        hedged.append(1)
+        return "backup"
+
+    async def scenario():
+        for _ in range(30):
+            await hedger.run("primary", _call(0.01, "primary"), "backup", backup, threshold=0.001)
+
+    asyncio.run(scenario())
+    assert 1 <= len(hedged) <= 4
+
+
+def test_delay_follows_observed_quantile():
+    """Without a threshold the delay is the primary's recent p90, once there are enough samples"""
+    hedger = Hedger(HedgePolicy(min_samples=10, quantile=90, refresh_interval=0.0))
+    assert hedger.hedge_delay("primary") is None
+
+    for index in range(100):
+        hedger.observe("primary", 0.1 if index < 90 else 2.0)
+    assert 0.09 <= hedger.hedge_delay("primary") <= 0.11
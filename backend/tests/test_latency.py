@@ -0,0 +1,50 @@
+"""
+Latency histogram tests
+"""
+
+import random
+
+from core.latency import LatencyHistogram, WindowedHistogram
+
+
+def test_percentiles_within_relative_error():
+    """Reported percentiles stay within the bucket precision of the exact values"""
+    rng = random.Random(7)
+    values = [rng.lognormvariate(-3, 1) for _ in range(20000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    values.sort()
+    for q in (50, 95, 99):
+        exact = values[int(q / 100 * len(values)) - 1]
+        assert abs(histogram.percentile(q) - exact) / exact < 0.05
+
+
+def test_merge_combines_counts_and_extremes():
+    """Merging histograms is equivalent to recording into one"""
+    left, right, combined = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for value in (0.001, 0.002, 0.5):
+        left.record(value)
+        combined.record(value)
+    for value in (0.01, 2.0):
+        right.record(value)
+        combined.record(value)
+
+    left.merge(right)
+    assert left.count == combined.count == 5
+    assert left.min == 0.001 and left.max == 2.0
+    assert left.counts == combined.counts
+
+
+def test_window_drops_expired_slots():
+    """Observations older than the window no longer affect percentiles"""
+    window = WindowedHistogram(window_seconds=60, slots=6)
+    window.record(5.0, now=0.0)
+    window.record(0.01, now=30.0)
+    assert window.window(now=30.0).max == 5.0
+
+    summary = window.window(now=65.0).summary()
+    assert summary["count"] == 1
+    assert summary["p99"] == 0.01
+    assert window.total_count == 2
@@ -0,0 +1,112 @@
+"""
+LLM provider tests
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from core.llm_providers import (
+    AnthropicProvider, CompletionRequest, OpenAIProvider, ProviderConfig, ProviderError,
+    ProviderRegistry, backoff_delay
+)
+
+
+def _request():
+    return CompletionRequest(model="gpt-4", messages=[{"role": "user", "content": "hi"}], system="Be brief")
+
+
+def _config(**overrides):
+    fields = dict(name="test", base_url="http://provider.test/v1", api_key="key", backoff_base=0.001, backoff_max=0.01)
+    fields.update(overrides)
+    return ProviderConfig(**fields)
+
+
+def test_transient_errors_are_retried_on_one_client():
+    """5xx and 429 responses are retried with backoff over the same pooled client"""
+    responses = [
+        httpx.Response(503),
+        httpx.Response(429, headers={"retry-after": "0"}),
+        httpx.Response(200, json={
+            "choices": [{"message": {"content": "hello"}}],
+            "usage": {"prompt_tokens": 3, "completion_tokens": 1}
+        }),
+    ]
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return responses[len(seen) - 1]
+
+    async def scenario():
+        provider = OpenAIProvider(_config(), transport=httpx.MockTransport(handler))
+        client = provider.client
+        result = await provider.complete(_request())
+        assert provider.client is client
+        await provider.close()
+        return result
+
+    result = asyncio.run(scenario())
+    assert (result.text, result.attempts, result.input_tokens) == ("hello", 3, 3)
+    assert seen[0].headers["authorization"] == "Bearer key"
+    assert b'"role":"system"' in seen[0].content.replace(b" ", b"")
+
+
+def test_client_errors_are_not_retried():
+    """A 400 fails immediately"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, text="bad request")
+
+    async def scenario():
+        provider = OpenAIProvider(_config(), transport=httpx.MockTransport(handler))
+        try:
+            await provider.complete(_request())
+        finally:
+            await provider.close()
+
+    with pytest.raises(ProviderError) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 400
+    assert len(calls) == 1
+
+
+def test_anthropic_format_and_model_routing():
+    """Anthropic requests carry the system prompt separately; models route by prefix"""
+
+    def handler(request):
+        assert request.url.path == "/v1/messages"
+        assert request.headers["x-api-key"] == "key"
+        return httpx.Response(200, json={
+            "content": [{"type": "text", "text": "hi there"}],
+            "usage": {"input_tokens": 5, "output_tokens": 2}
+        })
+
+    registry = ProviderRegistry(default="mock")
+    registry.add(_config(name="mock"))
+    anthropic = registry.add(
+        _config(name="anthropic", kind="anthropic", base_url="http://provider.test", models=["claude"]),
+        transport=httpx.MockTransport(handler)
+    )
+    assert registry.for_model("claude-3-haiku") is anthropic
+    assert registry.for_model("gpt-4").name == "mock"
+
+    async def scenario():
+        try:
+            return await anthropic.complete(_request())
+        finally:
+            await registry.close()
+
+    result = asyncio.run(scenario())
+    assert (result.text, result.output_tokens) == ("hi there", 2)
+    assert isinstance(anthropic, AnthropicProvider)
+
+
+def test_backoff_is_jittered_and_capped():
+    """Full jitter stays within the exponential envelope and the cap"""
+    delays = [backoff_delay(attempt, 0.1, 1.0) for attempt in range(8) for _ in range(20)]
+    assert all(0.0 <= delay <= 1.0 for delay in delays)
+    assert len(set(delays)) > 100
@@ -0,0 +1,55 @@
+"""
+Metrics registry tests
+"""
+
+from core.metrics import OVERFLOW_LABEL_VALUE, MetricFamily, MetricsRegistry
+
+
+def test_render_text_exposition_format():
+    """Counters, gauges and histograms render in the Prometheus text format"""
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests", ["route"]).labels("/chat").inc(3)
+    registry.gauge("connections", "Connections").set(2)
+    histogram = registry.histogram("call_seconds", "Call latency", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/chat"} 3' in text
+    assert "connections 2" in text
+    assert 'call_seconds_bucket{le="0.1"} 1' in text
+    assert 'call_seconds_bucket{le="+Inf"} 2' in text
+    assert "call_seconds_count 2" in text
+
+
+def test_label_cardinality_is_bounded():
+    """New label values past max_series fold into a single overflow series"""
+    registry = MetricsRegistry()
+    counter = registry.counter("per_session_total", "Per-session events", ["session_id"], max_series=3)
+    for index in range(100):
+        counter.labels(f"session-{index}").inc()
+
+    assert len(counter._series) == 4
+    assert counter.labels(OVERFLOW_LABEL_VALUE).value == 97
+
+
+def test_collectors_are_rendered_and_isolated():
+    """Scrape-time collectors are rendered, and a failing collector does not break the scrape"""
+    registry = MetricsRegistry()
+
+    def queue_depth():
+        family = MetricFamily("queue_depth", "gauge", "Queue depth", max_series=2)
+        for agent_id in ("a", "b", "c"):
+            family.add({"agent_id": agent_id}, 1)
+        return [family]
+
+    def broken():
+        raise RuntimeError("boom")
+
+    registry.register_collector("queues", queue_depth)
+    registry.register_collector("broken", broken)
+
+    text = registry.render()
+    assert 'queue_depth{agent_id="a"} 1' in text
+    assert 'agent_id="c"' not in text
@@ -0,0 +1,168 @@
+"""
+Provider rate limiter tests
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from core.deadline import DeadlineExceeded, deadline_scope
+from core.llm_providers import CompletionRequest, ProviderConfig, ProviderRegistry
+from core.rate_limiter import ProviderRateLimiter, parse_reset
+
+
+def _ok(headers=None, tokens=(10, 5)):
+    return httpx.Response(200, headers=headers or {}, json={
+        "choices": [{"message": {"content": "ok"}}],
+        "usage": {"prompt_tokens": tokens[0], "completion_tokens": tokens[1]}
+    })
+
+
+def _request(model="gpt-4"):
+    return CompletionRequest(model=model, messages=[{"role": "user", "content": "hi"}], max_tokens=10)
+
+
+def test_reset_formats():
+    """OpenAI durations, plain seconds and Anthropic timestamps all parse"""
+    assert parse_reset("6m0s") == 360.0
+    assert parse_reset("1s") == 1.0
+    assert abs(parse_reset("20ms") - 0.02) < 1e-9
+    assert parse_reset("2.5") == 2.5
+    assert parse_reset("2024-01-01T00:00:10Z", now=1704067200.0) == 10.0
+    assert parse_reset("soon") is None
+
+
+def test_requests_queue_for_quota_in_order():
+    """Calls beyond the request budget wait for refill, first come first served"""
+    limiter = ProviderRateLimiter("test", requests_per_minute=600)  # 10 per second
+    limiter.requests.tokens = 1
+    order = []
+
+    async def call(index):
+        await limiter.acquire(1)
+        order.append(index)
+
+    async def scenario():
+        start = time.monotonic()
+        await asyncio.gather(*(call(index) for index in range(3)))
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(scenario())
+    assert order == [0, 1, 2]
+    assert 0.15 <= elapsed < 0.5
+    assert limiter.waiting == 0
+
+
+def test_wait_past_deadline_fails_fast():
+    """A call that cannot get quota before its deadline raises without waiting"""
+    limiter = ProviderRateLimiter("test", tokens_per_minute=60)
+    limiter.tokens.tokens = 0
+
+    async def scenario():
+        with deadline_scope(time.time() + 0.5):
+            start = time.monotonic()
+            try:
+                await limiter.acquire(30)
+            finally:
+                assert time.monotonic() - start < 0.1
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+
+
+def test_headers_teach_limits_and_actual_usage_settles_estimate():
+    """Rate-limit headers create buckets; reservations are corrected by reported usage"""
+    headers = {
+        "x-ratelimit-limit-requests": "100",
+        "x-ratelimit-remaining-requests": "40",
+        "x-ratelimit-reset-requests": "36s",
+        "x-ratelimit-limit-tokens": "10000",
+        "x-ratelimit-remaining-tokens": "9000",
+        "x-ratelimit-reset-tokens": "6s",
+    }
+    registry = ProviderRegistry(default="test")
+    provider = registry.add(
+        ProviderConfig(name="test", base_url="http://provider.test/v1"),
+        transport=httpx.MockTransport(lambda request: _ok(headers))
+    )
+
+    async def scenario():
+        try:
+            await registry.complete(_request())
+        finally:
+            await registry.close()
+
+    asyncio.run(scenario())
+    limiter = provider.limiter
+    assert limiter.requests.capacity == 100
+    assert 40 <= limiter.requests.tokens < 41
+    assert limiter.tokens.capacity == 10000
+    # The provider refills 1000 tokens in 6s, slower than 10000 per minute would suggest
+    assert abs(limiter.tokens.rate - 1000 / 6) < 1e-6
+
+    before = limiter.tokens.tokens
+    limiter.settle(estimated=100, actual=40)
+    assert abs(limiter.tokens.tokens - before - 60) < 1
+
+
+def test_rate_limited_response_holds_back_the_key():
+    """A 429 blocks further dispatch for its Retry-After instead of retrying into it"""
+    sent = []
+
+    def handler(request):
+        sent.append(time.monotonic())
+        if len(sent) == 1:
+            return httpx.Response(429, headers={"retry-after": "0.2"})
+        return _ok()
+
+    registry = ProviderRegistry(default="test")
+    registry.add(
+        ProviderConfig(name="test", base_url="http://provider.test/v1", backoff_base=0.001, backoff_max=1.0),
+        transport=httpx.MockTransport(handler)
+    )
+
+    async def scenario():
+        try:
+            return await asyncio.gather(registry.complete(_request()), registry.complete(_request()))
+        finally:
+            await registry.close()
+
+    results = asyncio.run(scenario())
+    assert [result.text for result in results] == ["ok", "ok"]
+    assert len(sent) == 3
+    assert sent[2] - sent[0] >= 0.19
+
+
+def test_quota_bound_calls_overflow_to_another_provider():
+    """Calls that would wait too long for quota go to the overflow provider and model"""
+    models = []
+
+    def handler(request):
+        models.append((request.url.host, request.read()))
+        return _ok()
+
+    registry = ProviderRegistry(default="primary")
+    primary = registry.add(
+        ProviderConfig(
+            name="primary", base_url="http://primary.test/v1", requests_per_minute=60,
+            overflow_provider="secondary", overflow_model="small", max_queue_wait=0.5
+        ),
+        transport=httpx.MockTransport(handler)
+    )
+    registry.add(ProviderConfig(name="secondary", base_url="http://secondary.test/v1"),
+                 transport=httpx.MockTransport(handler))
+    primary.limiter.requests.tokens = 1
+
+    async def scenario():
+        try:
+            await registry.complete(_request())
+            assert registry.is_saturated("gpt-4") is False
+            await registry.complete(_request())
+        finally:
+            await registry.close()
+
+    asyncio.run(scenario())
+    assert [host for host, _ in models] == ["primary.test", "secondary.test"]
+    assert b'"model":"small"' in models[1][1].replace(b" ", b"")
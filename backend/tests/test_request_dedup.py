@@ -0,0 +1,147 @@
+"""
+In-flight request deduplication tests
+"""
+
+import asyncio
+
+from core.agent_manager import AgentConfig, AgentManager, AgentType
+
+
+def _manager(sessions, websockets, runs):
+    manager = AgentManager(sessions, None, None, websockets)
+
+    async def slow_logic(agent_config, message, *args, **kwargs):
+        runs.append(message)
+        await asyncio.sleep(0.05)
+        return f"reply to {message}"
+    manager._execute_agent_logic = slow_logic
+    return manager
+
+
+async def _setup(manager):
+    await manager.create_custom_agent(AgentConfig(
+        agent_id="echo_bot", name="Echo Bot", type=AgentType.LLM_AGENT, instructions="Echo"
+    ))
+
+
+def test_identical_messages_share_one_request(sessions, websockets):
+    """Concurrent resends to a session run once and every waiter gets the same result"""
+    runs = []
+
+    async def scenario():
+        manager = _manager(sessions, websockets, runs)
+        await _setup(manager)
+        try:
+            submissions = await asyncio.gather(*(
+                manager.process_message("hello", session_id="s1", agent_id="echo_bot") for _ in range(3)
+            ))
+            records = await asyncio.gather(*(
+                manager.wait_for_result(queued.request_id, 2.0) for queued in submissions
+            ))
+            # The same text as a separate request once the window has passed
+            manager.dedup_window = 0
+            later = await manager.process_message("hello", session_id="s1", agent_id="echo_bot")
+            await manager.wait_for_result(later.request_id, 2.0)
+            return submissions, records, later
+        finally:
+            await manager.cleanup()
+
+    submissions, records, later = asyncio.run(scenario())
+    assert len({queued.request_id for queued in submissions}) == 1
+    assert [queued.metadata.get("deduplicated", False) for queued in submissions] == [False, True, True]
+    assert all(record["response"] == "reply to hello" for record in records)
+    assert later.request_id != submissions[0].request_id
+    assert runs == ["hello", "hello"]
+    assert len(sessions.messages) == 2
+    assert len([payload for payload in websockets.sent if payload["type"] == "agent_response"]) == 2
+
+
+def test_client_request_id_is_idempotent(sessions, websockets):
+    """A retry with the same request id gets the finished result; other ids and sessions run"""
+    runs = []
+
+    async def scenario():
+        manager = _manager(sessions, websockets, runs)
+        await _setup(manager)
+        try:
+            first = await manager.process_message("one", session_id="s1", agent_id="echo_bot", client_request_id="r1")
+            await manager.wait_for_result(first.request_id, 2.0)
+            retry = await manager.process_message("one", session_id="s1", agent_id="echo_bot", client_request_id="r1")
+            other = await manager.process_message("one", session_id="s1", agent_id="echo_bot", client_request_id="r2")
+            elsewhere = await manager.process_message(
+                "one", session_id="s2", agent_id="echo_bot", client_request_id="r1"
+            )
+            await asyncio.gather(*(
+                manager.wait_for_result(queued.request_id, 2.0) for queued in (other, elsewhere)
+            ))
+            return first, retry, other, elsewhere
+        finally:
+            await manager.cleanup()
+
+    first, retry, other, elsewhere = asyncio.run(scenario())
+    assert retry.request_id == first.request_id
+    assert retry.metadata["status"] == "completed"
+    assert len({first.request_id, other.request_id, elsewhere.request_id}) == 3
+    assert runs == ["one", "one", "one"]
+
+
+def test_cancelled_submission_releases_its_request_id(sessions, websockets):
+    """A caller cancelled before its request is queued leaves waiting duplicates and retries free to submit"""
+    runs = []
+    stalled = asyncio.Event()
+    add_message = sessions.add_message
+
+    async def stalling_add_message(session_id, role, content, metadata=None):
+        if not stalled.is_set():
+            stalled.set()
+            await asyncio.sleep(10)
+        return await add_message(session_id, role, content, metadata)
+    sessions.add_message = stalling_add_message
+
+    async def scenario():
+        manager = _manager(sessions, websockets, runs)
+        await _setup(manager)
+        try:
+            first = asyncio.ensure_future(
+                manager.process_message("one", session_id="s", agent_id="echo_bot", client_request_id="r1")
+            )
+            await stalled.wait()
+            duplicate = asyncio.ensure_future(
+                manager.process_message("one", session_id="s", agent_id="echo_bot", client_request_id="r1")
+            )
+            await asyncio.sleep(0)
+            first.cancel()
+            queued = await asyncio.wait_for(duplicate, 1.0)
+            retry = await asyncio.wait_for(
+                manager.process_message("one", session_id="s", agent_id="echo_bot", client_request_id="r1"), 1.0
+            )
+            await manager.wait_for_result(queued.request_id, 2.0)
+            return first, queued, retry
+        finally:
+            await manager.cleanup()
+
+    first, queued, retry = asyncio.run(scenario())
+    assert first.cancelled()
+    assert "deduplicated" not in queued.metadata
+    assert retry.request_id == queued.request_id
+    assert runs == ["one"]
+
+
+def test_client_request_ids_without_a_session_are_not_shared(sessions, websockets):
+    """Unrelated callers reusing an id like "1" without a session each get their own request"""
+    runs = []
+
+    async def scenario():
+        manager = _manager(sessions, websockets, runs)
+        await _setup(manager)
+        try:
+            first = await manager.process_message("one", agent_id="echo_bot", client_request_id="1")
+            second = await manager.process_message("two", agent_id="echo_bot", client_request_id="1")
+            await asyncio.gather(*(manager.wait_for_result(queued.request_id, 2.0) for queued in (first, second)))
+            return first, second
+        finally:
+            await manager.cleanup()
+
+    first, second = asyncio.run(scenario())
+    assert first.request_id != second.request_id
+    assert sorted(runs) == ["one", "two"]
@@ -0,0 +1,151 @@
+"""
+Cross-replica request outcome tests
+"""
+
+import asyncio
+
+from core.agent_manager import AgentManager
+from core.agent_queue import LocalAgentQueue
+from core.deadline import DeadlineExceeded
+from core.result_relay import ResultRelay
+
+from conftest import FakeSessions, FakeWebSockets
+
+
+class _Broker:
+    """In-memory stand-in for Redis pub/sub shared by several replicas"""
+
+    def __init__(self):
+        self.subscriptions = []
+
+    async def publish(self, channel, data):
+        for pubsub in list(self.subscriptions):
+            if channel in pubsub.channels:
+                pubsub.messages.put_nowait({"type": "message", "channel": channel, "data": data})
+
+    def pubsub(self):
+        broker = self
+
+        class _PubSub:
+            def __init__(self):
+                self.channels = set()
+                self.messages = asyncio.Queue()
+                broker.subscriptions.append(self)
+
+            async def subscribe(self, *channels):
+                self.channels.update(channels)
+
+            async def listen(self):
+                while True:
+                    yield await self.messages.get()
+
+            async def close(self):
+                broker.subscriptions.remove(self)
+        return _PubSub()
+
+
+def _replicas(logic):
+    """Two managers sharing their agents' queues and a broker; only the second runs workers"""
+    broker, queues = _Broker(), {}
+    replicas = []
+    for _ in range(2):
+        manager = AgentManager(
+            FakeSessions(), None, None, FakeWebSockets(),
+            queue_factory=lambda agent_id: queues.setdefault(agent_id, LocalAgentQueue()),
+            result_relay=ResultRelay(broker)
+        )
+        manager._execute_agent_logic = logic
+        replicas.append(manager)
+    return replicas
+
+
+async def _start(accepting, working):
+    for manager in (accepting, working):
+        await manager.result_relay.start(manager._apply_remote_outcome)
+    working.scale_workers("general_assistant", 1)
+
+
+async def _stop(*managers):
+    for manager in managers:
+        await manager.cleanup()
+
+
+def test_results_of_requests_processed_elsewhere_reach_the_accepting_replica():
+    """Waiting and polling on the accepting replica see the other replica's worker finish the request"""
+    statuses = []
+
+    async def logic(agent_config, message, *args, **kwargs):
+        statuses.append(accepting.results[queued.request_id]["status"])
+        return f"reply to {message}"
+
+    accepting, working = _replicas(logic)
+
+    async def scenario():
+        nonlocal queued
+        await _start(accepting, working)
+        try:
+            queued = await accepting.process_message("hello", session_id="s1", agent_id="general_assistant")
+            return await accepting.wait_for_result(queued.request_id, 2.0)
+        finally:
+            await _stop(accepting, working)
+
+    queued = None
+    record = asyncio.run(scenario())
+    assert record["status"] == "completed"
+    assert record["response"] == "reply to hello"
+    assert record["timings"]["stages"]["execution"] >= 0
+    # The worker's replica has no record of its own; the accepting one saw the request start
+    assert statuses == ["running"]
+    assert not working.results
+
+
+def test_failures_processed_elsewhere_are_reported():
+    """A request failing on another replica's worker resolves as failed, not queued until it expires"""
+    async def logic(agent_config, message, *args, **kwargs):
+        raise RuntimeError("model unavailable")
+
+    accepting, working = _replicas(logic)
+
+    async def scenario():
+        await _start(accepting, working)
+        try:
+            queued = await accepting.process_message("hello", session_id="s1", agent_id="general_assistant")
+            return await accepting.wait_for_result(queued.request_id, 2.0)
+        finally:
+            await _stop(accepting, working)
+
+    record = asyncio.run(scenario())
+    assert record["status"] == "failed"
+
+
+def test_internal_requests_processed_elsewhere_resolve_the_dispatcher():
+    """A workflow node taken by another replica's worker returns its response to the dispatching orchestrator"""
+    async def logic(agent_config, message, *args, **kwargs):
+        return f"reply to {message}"
+
+    dispatching, working = _replicas(logic)
+
+    async def scenario():
+        await _start(dispatching, working)
+        try:
+            return await dispatching.dispatch_request("general_assistant", "step 1", "s1", timeout=2.0)
+        finally:
+            await _stop(dispatching, working)
+
+    assert asyncio.run(scenario()) == "reply to step 1"
+
+
+def test_relayed_expiry_of_an_internal_request_raises_deadline_exceeded():
+    """The dispatcher tells an expired delegation from a failed one, as when its own worker ran it"""
+    dispatching, _ = _replicas(None)
+
+    async def scenario():
+        futures = {}
+        for request_id in ("expired", "failed"):
+            futures[request_id] = dispatching._pending_results[request_id] = asyncio.get_event_loop().create_future()
+            await dispatching._apply_remote_outcome({
+                "request_id": request_id, "internal": True, "status": request_id, "error": "boom"
+            })
+        return {request_id: type(future.exception()) for request_id, future in futures.items()}
+
+    assert asyncio.run(scenario()) == {"expired": DeadlineExceeded, "failed": RuntimeError}
@@ -0,0 +1,83 @@
+"""
+Request stage span tests
+"""
+
+import asyncio
+
+from core.agent_manager import AgentConfig, AgentManager, AgentType
+from core.latency import StageLatency
+from core.metrics import OVERFLOW_LABEL_VALUE
+from core.spans import RequestTimings, current_timings, span, timed, timings_scope
+
+from conftest import FakeSessions
+
+
+def test_spans_accumulate_and_follow_tasks():
+    """Spans add up per stage, also from tasks started inside the scope, and are no-ops outside one"""
+    timings = RequestTimings()
+
+    async def scenario():
+        with span("ignored"):
+            pass
+        with timings_scope(timings):
+            with span("stage"):
+                await asyncio.sleep(0.01)
+            with span("stage"):
+                await asyncio.sleep(0.01)
+            await asyncio.ensure_future(timed("background", asyncio.sleep(0.01)))
+        assert current_timings() is None
+
+    asyncio.run(scenario())
+    assert set(timings.stages) == {"stage", "background"}
+    assert timings.stages["stage"] >= 0.02
+
+
+def test_agent_response_carries_stage_breakdown(websockets):
+    """Results, the WebSocket payload and metrics all get the per-stage timings"""
+
+    async def scenario():
+        manager = AgentManager(FakeSessions(history_delay=0.01), None, None, websockets)
+        await manager.create_custom_agent(AgentConfig(
+            agent_id="timed_bot", name="Timed Bot", type=AgentType.LLM_AGENT, instructions="Be brief"
+        ))
+        try:
+            queued = await manager.process_message(
+                "hello", agent_id="timed_bot", context={"tool_calls": [{"call_id": "a", "tool": "missing.tool"}]}
+            )
+            record = await manager.wait_for_result(queued.request_id, 2.0)
+            await asyncio.sleep(0.01)
+            return record, manager.collect_metrics()
+        finally:
+            await manager.cleanup()
+
+    record, families = asyncio.run(scenario())
+    assert record["status"] == "completed"
+    stages = record["timings"]["stages"]
+    for stage in ("queue_wait", "tool_resolution", "history_fetch", "tool_calls", "generation", "execution", "delivery"):
+        assert stage in stages
+    assert stages["execution"] >= stages["history_fetch"] >= 0.01
+    assert record["timings"]["tool_calls"][0] == {
+        "call_id": "a", "tool": "missing.tool", "status": "unavailable", "duration": 0.0
+    }
+
+    payload = websockets.sent[-1]
+    assert payload["type"] == "agent_response"
+    assert "generation" in payload["timings"]["stages"]
+
+    tool_latency = next(family for family in families if family.name == "agent_tool_latency_seconds")
+    # Unresolved tools get no histogram
+    assert not any(sample[1].get("tool") == "missing.tool" for sample in tool_latency.samples)
+
+
+def test_tool_histograms_are_bounded():
+    """Unknown tool names are not recorded, and past max_tools new names share one overflow histogram"""
+    latency = StageLatency(max_tools=8)
+    timings = RequestTimings()
+    for index in range(100):
+        timings.add_tool_call(f"u{index}", f"made.up.{index}", "unavailable", 0.0)
+        timings.add_tool_call(f"r{index}", f"tool.{index}", "success", 0.01)
+    AgentManager._record_timings(latency, timings)
+
+    assert len(latency.tools) == 9
+    assert not any(tool.startswith("made.up") for tool in latency.tools)
+    assert latency.tools[OVERFLOW_LABEL_VALUE].total_count == 92
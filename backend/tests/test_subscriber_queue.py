@@ -0,0 +1,70 @@
+"""
+Bounded SSE subscriber queue tests
+"""
+
+import asyncio
+
+import pytest
+
+from core.subscriber_queue import OverflowPolicy, SubscriberOverflow, SubscriberQueue
+from core.websocket_manager import WebSocketManager
+
+
+def _drain(queue):
+    return [queue.get_nowait() for _ in range(queue.qsize())]
+
+
+def test_drop_oldest_keeps_the_newest_messages():
+    """A full buffer discards its oldest message for each new one"""
+    queue = SubscriberQueue(3, OverflowPolicy.DROP_OLDEST)
+    for index in range(5):
+        assert queue.put_nowait({"type": "event", "n": index})
+    assert [message["n"] for message in _drain(queue)] == [2, 3, 4]
+    assert queue.dropped == 2
+
+
+def test_coalesce_replaces_same_type():
+    """A full buffer replaces the buffered message of the same type, else drops the oldest"""
+    queue = SubscriberQueue(3, OverflowPolicy.COALESCE)
+    queue.put_nowait({"type": "status", "n": 0})
+    queue.put_nowait({"type": "agent_response", "n": 1})
+    queue.put_nowait({"type": "progress", "n": 2})
+    queue.put_nowait({"type": "status", "n": 3})
+    queue.put_nowait({"type": "log", "n": 4})
+    assert [message["n"] for message in _drain(queue)] == [1, 2, 4]
+
+    queue.put_nowait({"type": "status", "n": 5})
+    queue.put_nowait({"type": "progress", "n": 6})
+    queue.put_nowait({"type": "status", "n": 7})
+    queue.put_nowait({"type": "status", "n": 8})
+    assert [message["n"] for message in _drain(queue)] == [5, 6, 8]
+
+
+def test_disconnect_ends_the_subscription():
+    """A full buffer with the disconnect policy closes, and its consumer gets SubscriberOverflow"""
+    queue = SubscriberQueue(2, OverflowPolicy.DISCONNECT)
+    assert queue.put_nowait({"type": "event"})
+    assert queue.put_nowait({"type": "event"})
+    assert not queue.put_nowait({"type": "event"})
+    assert not queue.put_nowait({"type": "event"})
+    with pytest.raises(SubscriberOverflow):
+        asyncio.run(queue.get())
+
+
+def test_publishing_never_waits_on_a_stalled_subscriber():
+    """Publishing to a subscriber nobody reads stays bounded; disconnected ones are removed"""
+    manager = WebSocketManager(sse_queue_size=4, sse_overflow="disconnect")
+
+    async def scenario():
+        stalled = manager.subscribe("s1")
+        reader = manager.subscribe("s1")
+        for index in range(10):
+            await asyncio.wait_for(manager.send_message("s1", {"type": "event", "n": index}), 0.1)
+            await reader.get()
+        return stalled, reader
+
+    stalled, reader = asyncio.run(scenario())
+    assert stalled.closed
+    assert manager.sse_subscribers == {reader}
+    families = {family.name: family for family in manager.collect_metrics()}
+    assert families["sse_subscribers"].samples[0][2] == 1
@@ -0,0 +1,81 @@
+"""
+Timer heap tests
+"""
+
+import asyncio
+
+from core.timer_heap import TimerHeap
+
+
+def test_timers_fire_in_deadline_order():
+    """Timers fire individually in deadline order"""
+    fired = []
+
+    async def scenario():
+        timers = TimerHeap()
+        timers.start()
+        timers.schedule("b", 0.04, fired.append, "b")
+        timers.schedule("a", 0.01, fired.append, "a")
+        timers.schedule("c", 0.07, fired.append, "c")
+        await asyncio.sleep(0.03)
+        assert fired == ["a"]
+        await asyncio.sleep(0.08)
+        await timers.stop()
+
+    asyncio.run(scenario())
+    assert fired == ["a", "b", "c"]
+
+
+def test_reschedule_replaces_existing_timer():
+    """Rescheduling a key pushes its deadline back instead of adding a second timer"""
+    fired = []
+
+    async def scenario():
+        timers = TimerHeap()
+        timers.start()
+        timers.schedule("instance", 0.02, fired.append, "first")
+        await asyncio.sleep(0.01)
+        timers.schedule("instance", 0.05, fired.append, "second")
+        assert len(timers) == 1
+        await asyncio.sleep(0.03)
+        assert fired == []
+        await asyncio.sleep(0.05)
+        await timers.stop()
+
+    asyncio.run(scenario())
+    assert fired == ["second"]
+
+
+def test_cancel_and_coroutine_callbacks():
+    """Cancelled timers never fire and coroutine callbacks are awaited"""
+    fired = []
+
+    async def record(value):
+        fired.append(value)
+
+    async def scenario():
+        timers = TimerHeap()
+        timers.start()
+        timers.schedule("cancelled", 0.01, record, "cancelled")
+        timers.schedule("kept", 0.02, record, "kept")
+        assert timers.cancel("cancelled")
+        assert not timers.cancel("missing")
+        await asyncio.sleep(0.05)
+        await timers.stop()
+        assert len(timers) == 0
+
+    asyncio.run(scenario())
+    assert fired == ["kept"]
+
+
+def test_stale_entries_are_compacted():
+    """Heavy rescheduling does not grow the heap without bound"""
+
+    async def scenario():
+        timers = TimerHeap()
+        for _ in range(1000):
+            timers.schedule("hot", 60, lambda: None)
+        assert len(timers) == 1
+        assert len(timers._heap) <= 128
+
+    asyncio.run(scenario())
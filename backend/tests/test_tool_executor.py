@@ -0,0 +1,181 @@
+"""
+Tool executor tests
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from core.deadline import DeadlineExceeded, deadline_scope, with_deadline
+from core.tool_executor import ToolExecutor, ToolInvocation
+
+
+def _executor(tools, max_concurrency=4):
+    return ToolExecutor(lambda invocation: tools.get(invocation.tool), max_concurrency)
+
+
+def test_independent_calls_overlap_and_results_flow_to_dependents():
+    """Independent calls run concurrently; dependents receive their inputs' results"""
+
+    async def fetch(url):
+        await asyncio.sleep(0.05)
+        return f"<{url}>"
+
+    async def join(parts):
+        return "".join(parts)
+
+    invocations = [
+        ToolInvocation(call_id="a", tool="fetch", arguments={"url": "a"}),
+        ToolInvocation(call_id="b", tool="fetch", arguments={"url": "b"}),
+        ToolInvocation(call_id="c", tool="fetch", arguments={"url": "c"}),
+        ToolInvocation(
+            call_id="joined", tool="join", depends_on=["a", "b", "c"],
+            arguments={"parts": [{"$result": "a"}, {"$result": "b"}, {"$result": "c"}]}
+        ),
+    ]
+    report = asyncio.run(_executor({"fetch": fetch, "join": join}).execute(invocations))
+
+    assert report.succeeded
+    assert report.results["joined"].result == "<a><b><c>"
+    assert report.elapsed < 0.12
+
+
+def test_failures_skip_dependents_but_not_independent_calls():
+    """A failing call only takes down the calls that depend on it"""
+
+    async def ok():
+        return "ok"
+
+    async def boom():
+        raise RuntimeError("boom")
+
+    async def wrapped_error():
+        return {"success": False, "error": "server down"}
+
+    invocations = [
+        ToolInvocation(call_id="bad", tool="boom"),
+        ToolInvocation(call_id="after_bad", tool="ok", depends_on=["bad"]),
+        ToolInvocation(call_id="wrapped", tool="wrapped_error"),
+        ToolInvocation(call_id="fine", tool="ok"),
+        ToolInvocation(call_id="missing", tool="nope"),
+    ]
+    report = asyncio.run(_executor({"ok": ok, "boom": boom, "wrapped_error": wrapped_error}).execute(invocations))
+
+    statuses = {call_id: result.status for call_id, result in report.results.items()}
+    assert statuses == {
+        "bad": "failed", "after_bad": "skipped", "wrapped": "failed", "fine": "success", "missing": "failed"
+    }
+    assert report.results["wrapped"].error == "server down"
+
+
+def test_concurrency_limit_and_shared_resources():
+    """The per-turn limit and resource keys bound how many calls run together"""
+    active = {"all": 0, "peak": 0, "page": 0, "page_peak": 0}
+
+    async def work(page=False):
+        active["all"] += 1
+        active["peak"] = max(active["peak"], active["all"])
+        if page:
+            active["page"] += 1
+            active["page_peak"] = max(active["page_peak"], active["page"])
+        await asyncio.sleep(0.01)
+        active["all"] -= 1
+        if page:
+            active["page"] -= 1
+        return True
+
+    invocations = [ToolInvocation(call_id=f"w{i}", tool="work") for i in range(6)] + [
+        ToolInvocation(call_id=f"p{i}", tool="work", arguments={"page": True}, resource="browser:default")
+        for i in range(3)
+    ]
+    report = asyncio.run(_executor({"work": work}, max_concurrency=3).execute(invocations))
+
+    assert report.succeeded
+    assert active["peak"] == 3
+    assert active["page_peak"] == 1
+
+
+def test_calls_waiting_for_a_resource_leave_slots_to_others():
+    """A call queued behind a busy resource does not hold one of the turn's slots"""
+    started = {}
+
+    async def work(delay):
+        started[delay] = asyncio.get_event_loop().time()
+        await asyncio.sleep(delay)
+        return True
+
+    invocations = [
+        ToolInvocation(call_id="p1", tool="work", arguments={"delay": 0.1}, resource="browser:default"),
+        ToolInvocation(call_id="p2", tool="work", arguments={"delay": 0.11}, resource="browser:default"),
+        ToolInvocation(call_id="other", tool="work", arguments={"delay": 0.01}),
+    ]
+
+    async def scenario():
+        began = asyncio.get_event_loop().time()
+        report = await _executor({"work": work}, max_concurrency=2).execute(invocations)
+        return report, started[0.01] - began
+
+    report, other_wait = asyncio.run(scenario())
+    assert report.succeeded
+    assert other_wait < 0.05
+
+
+def test_the_turn_deadline_ends_the_turn():
+    """Passing the turn's deadline raises and cancels the calls still running, instead of failing one call"""
+    cancelled = []
+
+    async def slow():
+        await with_deadline(asyncio.sleep(1))
+
+    async def other():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append("other")
+            raise
+
+    async def scenario():
+        with deadline_scope(time.time() + 0.05):
+            await _executor({"slow": slow, "other": other}).execute([
+                ToolInvocation(call_id="slow", tool="slow"),
+                ToolInvocation(call_id="other", tool="other"),
+            ])
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+    assert cancelled == ["other"]
+
+
+def test_a_calls_own_deadline_only_fails_that_call():
+    """A call timing out under its own narrower deadline is a failed result like any other error"""
+
+    async def bounded():
+        with deadline_scope(time.time() + 0.02):
+            await with_deadline(asyncio.sleep(1))
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        with deadline_scope(time.time() + 5):
+            return await _executor({"bounded": bounded, "ok": ok}).execute([
+                ToolInvocation(call_id="bounded", tool="bounded"),
+                ToolInvocation(call_id="fine", tool="ok"),
+            ])
+
+    report = asyncio.run(scenario())
+    assert report.results["bounded"].status == "failed"
+    assert report.results["fine"].status == "success"
+
+
+def test_cycles_are_rejected_before_running():
+    """Cyclic or dangling dependencies are a ValueError"""
+    executor = _executor({})
+    with pytest.raises(ValueError, match="cycle"):
+        asyncio.run(executor.execute([
+            ToolInvocation(call_id="a", tool="t", depends_on=["b"]),
+            ToolInvocation(call_id="b", tool="t", depends_on=["a"]),
+        ]))
+    with pytest.raises(ValueError, match="unknown"):
+        asyncio.run(executor.execute([ToolInvocation(call_id="a", tool="t", depends_on=["zzz"])]))
@@ -0,0 +1,273 @@
+"""
+WebSocket manager delivery tests
+"""
+
+import asyncio
+import base64
+import json
+import time
+
+import msgpack
+
+from core.websocket_manager import SLOW_CONSUMER_CLOSE_CODE, WebSocketManager, topic_allowed
+
+
+class _Socket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        self.sent.append(text)
+
+    async def send_bytes(self, data):
+        await asyncio.sleep(self.delay)
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=None):
+        self.closed = code
+
+
+def test_broadcast_is_concurrent_and_encoded_once():
+    """Every connection gets the same encoded text, in the time of one send rather than all of them"""
+    manager = WebSocketManager()
+    sockets = {f"s{index}": _Socket(delay=0.05) for index in range(20)}
+
+    async def scenario():
+        for session_id, socket in sockets.items():
+            await manager.connect(socket, session_id)
+        queue = manager.subscribe("s0")
+        start = time.monotonic()
+        delivered = await manager.broadcast_message({"type": "notice"}, exclude_sessions=["s1"])
+        await manager.flush()
+        return delivered, time.monotonic() - start, queue
+
+    delivered, elapsed, queue = asyncio.run(scenario())
+    assert delivered == 19
+    assert elapsed < 0.5
+    texts = [socket.sent[-1] for session_id, socket in sockets.items() if session_id != "s1"]
+    assert all(text is texts[0] for text in texts)
+    assert len(sockets["s1"].sent) == 1
+    # Sessions with both a WebSocket and SSE subscribers get the broadcast once on each
+    assert queue.qsize() == 1
+
+
+def test_slow_consumer_is_evicted():
+    """A send past send_timeout drops and closes that connection without holding up the broadcast"""
+    manager = WebSocketManager()
+    manager.send_timeout = 0.1
+    fast, slow = _Socket(), _Socket()
+
+    async def scenario():
+        await manager.connect(fast, "fast")
+        await manager.connect(slow, "slow")
+        slow.delay = 10
+        start = time.monotonic()
+        delivered = await manager.broadcast_message({"type": "notice"})
+        elapsed = time.monotonic() - start
+        await asyncio.sleep(0.2)
+        return delivered, elapsed
+
+    delivered, elapsed = asyncio.run(scenario())
+    assert delivered == 2
+    assert elapsed < 0.1
+    assert len(fast.sent) == 2
+    assert manager.list_active_sessions() == ["fast"]
+    assert slow.closed == SLOW_CONSUMER_CLOSE_CODE
+
+
+def test_sessions_keep_every_connection():
+    """A second tab adds a connection instead of replacing the first; both get session messages"""
+    manager = WebSocketManager()
+    first, second = _Socket(), _Socket()
+
+    async def scenario():
+        tab1 = await manager.connect(first, "s1")
+        await manager.connect(second, "s1")
+        await manager.send_message("s1", {"type": "agent_response", "response": "hi"})
+        await manager.flush()
+        manager.disconnect(tab1)
+        await manager.send_message("s1", {"type": "agent_response", "response": "again"})
+        await manager.flush()
+
+    asyncio.run(scenario())
+    assert [json.loads(text)["type"] for text in first.sent] == ["connection", "agent_response"]
+    assert [json.loads(text)["type"] for text in second.sent] == ["connection", "agent_response", "agent_response"]
+    assert manager.get_connection_count() == 1
+    assert len(manager.get_connection_info("s1")["connections"]) == 1
+
+
+def test_observers_follow_agent_and_session_topics():
+    """Observers receive each matching message once, over WebSocket and SSE, with one shared encoding"""
+    manager = WebSocketManager()
+    user, observer = _Socket(), _Socket()
+
+    async def scenario():
+        await manager.connect(user, "s1")
+        watcher = await manager.connect(observer, "dashboard", observer=True)
+        await manager.handle_message(watcher, json.dumps({
+            "type": "subscribe", "topics": ["agent:general_assistant", "session:s1"]
+        }))
+        await manager.handle_message(watcher, json.dumps({"type": "subscribe", "topics": ["nonsense"]}))
+        stream = manager.subscribe_topics(["agent:general_assistant"])
+        await manager.send_message("s1", {"type": "agent_response", "agent_id": "general_assistant"})
+        await manager.send_message("s2", {"type": "agent_response", "agent_id": "general_assistant"})
+        await manager.send_message("s2", {"type": "agent_response", "agent_id": "browser_agent"})
+        await manager.flush()
+        return stream
+
+    stream = asyncio.run(scenario())
+    replies = [json.loads(text) for text in observer.sent]
+    assert replies[1] == {
+        "type": "subscriptions", "topics": ["agent:general_assistant", "global", "session:dashboard", "session:s1"]
+    }
+    assert replies[2]["type"] == "error"
+    assert len(replies) == 5
+    assert len(user.sent) == 2
+    assert observer.sent[3] is user.sent[1]
+    events = [stream.get_nowait() for _ in range(stream.qsize())]
+    assert len(events) == 2
+    assert events[0].data is user.sent[1]
+
+
+def test_only_observers_follow_other_topics():
+    """Without the observer role a connection may only follow its own session; other agents' replies stay private"""
+    manager = WebSocketManager()
+    user, snooper = _Socket(), _Socket()
+
+    async def scenario():
+        await manager.connect(user, "s1")
+        connection = await manager.connect(snooper, "s2")
+        for topics in (["agent:general_assistant"], ["global"], ["session:s1"], ["session:s2", "session:s1"]):
+            await manager.handle_message(connection, json.dumps({"type": "subscribe", "topics": topics}))
+        await manager.handle_message(connection, json.dumps({"type": "subscribe", "topics": ["session:s2"]}))
+        await manager.send_message("s1", {"type": "agent_response", "agent_id": "general_assistant"})
+        await manager.flush()
+        return connection
+
+    connection = asyncio.run(scenario())
+    replies = [json.loads(text) for text in snooper.sent]
+    assert [reply["type"] for reply in replies] == ["connection"] + ["error"] * 4 + ["subscriptions"]
+    assert replies[1]["message"] == "Not authorized for topics: ['agent:general_assistant']"
+    assert connection.topics == {"session:s2", "global"}
+    assert len(user.sent) == 2
+    # /sse?topics= listeners have no session of their own
+    assert not topic_allowed("session:s1", None)
+    assert topic_allowed("agent:general_assistant", None, observer=True)
+
+
+def test_producers_do_not_wait_for_the_client():
+    """send_message only queues; the connection's writer sends in order behind it"""
+    manager = WebSocketManager()
+    socket = _Socket(delay=0.05)
+
+    async def scenario():
+        await manager.connect(socket, "s1")
+        start = time.monotonic()
+        for index in range(5):
+            await manager.send_message("s1", {"type": "agent_response", "index": index})
+        elapsed = time.monotonic() - start
+        await manager.flush()
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+    assert elapsed < 0.05
+    assert [json.loads(text).get("index") for text in socket.sent] == [None, 0, 1, 2, 3, 4]
+
+
+def test_batching_connections_get_queued_messages_in_one_frame():
+    """Messages queued behind an in-flight send arrive together as a JSON array once the client opts in"""
+    manager = WebSocketManager()
+    socket = _Socket(delay=0.02)
+
+    async def scenario():
+        connection = await manager.connect(socket, "s1")
+        await manager.flush()
+        await manager.handle_message(connection, json.dumps({"type": "options", "batch": True}))
+        await asyncio.sleep(0.005)
+        # The options reply is being sent; these queue up behind it
+        for index in range(4):
+            await manager.send_message("s1", {"type": "progress", "index": index})
+        await manager.flush()
+        return connection
+
+    connection = asyncio.run(scenario())
+    frames = [json.loads(text) for text in socket.sent]
+    assert frames[1] == {"type": "options", "batch": True, "encoding": "json"}
+    assert [message["index"] for message in frames[2]] == [0, 1, 2, 3]
+    assert len(frames) == 3
+    assert connection.message_count == 6
+
+
+def test_connections_that_fall_behind_are_evicted():
+    """A connection whose outbound queue fills up is closed instead of buffering without bound"""
+    manager = WebSocketManager()
+    manager.max_outbound_messages = 3
+    fast, stuck = _Socket(), _Socket()
+
+    async def scenario():
+        await manager.connect(fast, "fast")
+        await manager.connect(stuck, "stuck")
+        await manager.flush()
+        stuck.delay = 10
+        delivered = []
+        for _ in range(5):
+            delivered.append(await manager.broadcast_message({"type": "notice"}))
+            await asyncio.sleep(0.01)
+        await manager.flush()
+        return delivered
+
+    delivered = asyncio.run(scenario())
+    # One send in flight and three queued fill the stuck connection; the next broadcast evicts it
+    assert delivered == [2, 2, 2, 2, 1]
+    assert manager.list_active_sessions() == ["fast"]
+    assert stuck.closed == SLOW_CONSUMER_CLOSE_CODE
+    assert len(fast.sent) == 6
+
+
+def test_msgpack_connections_get_binary_frames():
+    """Bytes go out raw to msgpack connections, packed once for all of them, and tagged for JSON ones"""
+    manager = WebSocketManager()
+    text_socket, binary_sockets = _Socket(), [_Socket(), _Socket()]
+    screenshot = b"\x89PNG" + bytes(range(256))
+
+    async def scenario():
+        await manager.connect(text_socket, "s1")
+        for socket in binary_sockets:
+            await manager.connect(socket, "s1", encoding="msgpack")
+        await manager.send_message("s1", {"type": "browser_response", "screenshot": screenshot})
+        await manager.flush()
+
+    asyncio.run(scenario())
+    assert json.loads(text_socket.sent[1])["screenshot"] == {"$base64": base64.b64encode(screenshot).decode()}
+    first, second = (socket.sent for socket in binary_sockets)
+    assert msgpack.unpackb(first[0])["type"] == "connection"
+    assert msgpack.unpackb(first[1])["screenshot"] == screenshot
+    assert first[1] is second[1]
+
+
+def test_batched_msgpack_frames_are_arrays():
+    """A batching msgpack connection gets queued messages as one msgpack array"""
+    manager = WebSocketManager()
+    socket = _Socket(delay=0.02)
+
+    async def scenario():
+        connection = await manager.connect(socket, "s1")
+        await manager.flush()
+        await manager.handle_message(connection, json.dumps({"type": "options", "batch": True, "encoding": "msgpack"}))
+        await asyncio.sleep(0.005)
+        for index in range(3):
+            await manager.send_message("s1", {"type": "progress", "index": index})
+        await manager.handle_message(connection, json.dumps({"type": "options", "encoding": "base85"}))
+        await manager.flush()
+
+    asyncio.run(scenario())
+    assert msgpack.unpackb(socket.sent[1]) == {"type": "options", "batch": True, "encoding": "msgpack"}
+    frames = msgpack.unpackb(socket.sent[2])
+    assert [message.get("index") for message in frames] == [0, 1, 2, None]
+    assert frames[3]["type"] == "error"
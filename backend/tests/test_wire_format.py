@@ -0,0 +1,26 @@
+"""
+Message encoding tests
+"""
+
+import msgpack
+
+from core.wire_format import dumps, loads, pack_array, packb
+
+
+def test_bytes_survive_json_and_msgpack():
+    """Bytes values round-trip through both encodings, as raw bin data in msgpack"""
+    screenshot = bytes(range(256)) * 4
+    message = {"type": "browser_response", "result": {"screenshot": screenshot, "size": len(screenshot)}}
+
+    assert loads(dumps(message)) == message
+    packed = packb(message)
+    assert msgpack.unpackb(packed) == message
+    # A bin header plus the bytes, where hex would double them
+    assert len(packed) < len(screenshot) + 64
+
+
+def test_packed_messages_join_into_an_array():
+    """Joining packed messages gives the same bytes as packing the list, across array header sizes"""
+    for count in (2, 15, 16, 300):
+        messages = [{"type": "progress", "index": index} for index in range(count)]
+        assert pack_array([packb(message) for message in messages]) == packb(messages)
@@ -0,0 +1,74 @@
+"""
+Workflow engine tests
+"""
+
+import asyncio
+
+from core.workflow_engine import WorkflowEngine, WorkflowNode, WorkflowPlan, plan_workflow
+
+
+def test_plan_splits_stages_and_parallel_steps():
+    """"then" starts a new stage; ";" fans out within a stage"""
+
+    async def route(step):
+        return "data_analyst" if "analyze" in step else "browser_specialist"
+
+    plan = asyncio.run(plan_workflow(
+        "scrape site A; scrape site B then analyze both", "s1", route
+    ))
+    assert [(node.node_id, node.agent_id, node.depends_on) for node in plan.nodes] == [
+        ("step1", "browser_specialist", []),
+        ("step2", "browser_specialist", []),
+        ("step3", "data_analyst", ["step1", "step2"]),
+    ]
+
+
+def test_nodes_run_concurrently_and_pass_results(sessions, websockets):
+    """Independent nodes overlap and fan-in nodes receive upstream results"""
+    received = {}
+
+    async def dispatch(agent_id, message, session_id, context, timeout):
+        await asyncio.sleep(0.05)
+        received[message] = context["inputs"]
+        return f"{agent_id}:{message}"
+
+    plan = WorkflowPlan(workflow_id="wf", nodes=[
+        WorkflowNode(node_id="a", agent_id="browser_specialist", message="fetch a"),
+        WorkflowNode(node_id="b", agent_id="browser_specialist", message="fetch b"),
+        WorkflowNode(node_id="c", agent_id="data_analyst", message="merge", depends_on=["a", "b"]),
+    ])
+    report = asyncio.run(WorkflowEngine(dispatch, sessions, websockets).run(plan, "s1"))
+
+    assert report.succeeded
+    assert report.elapsed < 0.14
+    assert received["merge"] == {"a": "browser_specialist:fetch a", "b": "browser_specialist:fetch b"}
+    assert websockets.sent[-1]["type"] == "workflow_complete"
+    assert any(message["type"] == "workflow_progress" for message in websockets.sent)
+
+
+def test_retry_resumes_from_checkpoint(sessions, websockets):
+    """Nodes that succeeded in a failed attempt are not run again"""
+    calls = []
+    fail = {"b": True}
+
+    async def dispatch(agent_id, message, session_id, context, timeout):
+        calls.append(message)
+        if fail.get(message):
+            raise RuntimeError("agent crashed")
+        return message.upper()
+
+    plan = WorkflowPlan(workflow_id="wf", nodes=[
+        WorkflowNode(node_id="a", agent_id="x", message="a"),
+        WorkflowNode(node_id="b", agent_id="x", message="b", depends_on=["a"]),
+    ])
+    engine = WorkflowEngine(dispatch, sessions, websockets)
+
+    first = asyncio.run(engine.run(plan, "s1"))
+    assert [result.status for result in first.results.values()] == ["success", "failed"]
+    assert sessions.sessions["s1"].agent_state["workflows"]["wf"]["status"] == "failed"
+
+    fail["b"] = False
+    second = asyncio.run(engine.run(plan, "s1"))
+    assert second.succeeded
+    assert calls == ["a", "b", "b"]
+    assert sessions.sessions["s1"].agent_state["workflows"]["wf"]["status"] == "completed"
@@ -3,13 +3,18 @@ Mock server for Agentic AI Agent System testing
 Provides mock endpoints for development and testing
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import uvicorn
+import asyncio
 import json
+import os
+import random
 import time
+import uuid
 from datetime import datetime
 
 app = FastAPI(
@@ -117,6 +122,177 @@ async def list_agents():
     """List all agents"""
     return {"agents": mock_agents}
 
+# Mock LLM provider
+#
+# OpenAI-compatible /v1/chat/completions and Anthropic-compatible /v1/messages
+# endpoints whose response latency is drawn from a configurable distribution,
+# so provider-facing code can be load tested offline. The distribution is set
+# with MOCK_LLM_LATENCY, POST /mock/llm/config, or per request with the
+# X-Mock-Latency header, as "<name>:<param>=<value>,...", e.g.
+#   fixed:seconds=0.2
+#   uniform:low=0.05,high=0.5
+#   normal:mean=0.3,stddev=0.05
+#   lognormal:median=0.2,sigma=0.8    (heavy tail)
+#   exponential:mean=0.2
+#   pareto:scale=0.1,alpha=1.5        (very heavy tail)
+# Any distribution also accepts max=<seconds> to cap the sample.
+
+def _sample_fixed(seconds=0.1):
+    return seconds
+
+def _sample_uniform(low=0.05, high=0.5):
+    return random.uniform(low, high)
+
+def _sample_normal(mean=0.2, stddev=0.05):
+    return random.gauss(mean, stddev)
+
+def _sample_lognormal(median=0.2, sigma=0.8):
+    return random.lognormvariate(0.0, sigma) * median
+
+def _sample_exponential(mean=0.2):
+    return random.expovariate(1.0 / mean)
+
+def _sample_pareto(scale=0.1, alpha=1.5):
+    return scale * random.paretovariate(alpha)
+
+LATENCY_DISTRIBUTIONS = {
+    "fixed": _sample_fixed,
+    "uniform": _sample_uniform,
+    "normal": _sample_normal,
+    "lognormal": _sample_lognormal,
+    "exponential": _sample_exponential,
+    "pareto": _sample_pareto,
+}
+
+def parse_latency_spec(spec: str) -> Dict[str, Any]:
+    """Parse "<name>:<param>=<value>,..." into a distribution name and parameters"""
+    name, _, raw_params = spec.strip().partition(":")
+    if name not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"Unknown latency distribution: {name}")
+    params = {}
+    for item in filter(None, raw_params.split(",")):
+        key, _, value = item.partition("=")
+        params[key.strip()] = float(value)
+    return {"name": name, "params": params}
+
+def sample_latency(distribution: Dict[str, Any]) -> float:
+    params = dict(distribution["params"])
+    cap = params.pop("max", None)
+    value = max(LATENCY_DISTRIBUTIONS[distribution["name"]](**params), 0.0)
+    return min(value, cap) if cap is not None else value
+
+class MockLLMConfig(BaseModel):
+    latency: str = "lognormal:median=0.2,sigma=0.8"
+    # Fraction of requests answered with error_status instead of a completion
+    error_rate: float = 0.0
+    error_status: int = 503
+    retry_after: Optional[float] = None
+    # Added latency per output token, on top of the sampled latency
+    seconds_per_token: float = 0.0
+    output_tokens: int = 32
+
+mock_llm_config = MockLLMConfig(
+    latency=os.getenv("MOCK_LLM_LATENCY", MockLLMConfig().latency),
+    error_rate=float(os.getenv("MOCK_LLM_ERROR_RATE", "0")),
+)
+mock_llm_latency = parse_latency_spec(mock_llm_config.latency)
+mock_llm_stats = {"requests": 0, "errors": 0, "in_flight": 0}
+
+@app.get("/mock/llm/config")
+async def get_mock_llm_config():
+    """Current mock LLM behaviour and request counters"""
+    return {"config": mock_llm_config.dict(), "stats": mock_llm_stats}
+
+@app.post("/mock/llm/config")
+async def set_mock_llm_config(config: MockLLMConfig):
+    """Change the mock LLM latency distribution and error injection"""
+    global mock_llm_config, mock_llm_latency
+    try:
+        latency = parse_latency_spec(config.latency)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    mock_llm_config, mock_llm_latency = config, latency
+    return {"config": mock_llm_config.dict()}
+
+async def _simulate_llm(x_mock_latency: Optional[str]) -> Optional[JSONResponse]:
+    """Wait out a sampled latency; returns an error response when one is injected"""
+    distribution = mock_llm_latency
+    if x_mock_latency:
+        try:
+            distribution = parse_latency_spec(x_mock_latency)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    mock_llm_stats["requests"] += 1
+    mock_llm_stats["in_flight"] += 1
+    try:
+        delay = sample_latency(distribution) + mock_llm_config.seconds_per_token * mock_llm_config.output_tokens
+        await asyncio.sleep(delay)
+    finally:
+        mock_llm_stats["in_flight"] -= 1
+
+    if random.random() < mock_llm_config.error_rate:
+        mock_llm_stats["errors"] += 1
+        headers = {}
+        if mock_llm_config.retry_after is not None:
+            headers["retry-after"] = str(mock_llm_config.retry_after)
+        return JSONResponse(
+            status_code=mock_llm_config.error_status,
+            content={"error": {"message": "Injected mock error", "type": "mock_error"}},
+            headers=headers
+        )
+    return None
+
+def _mock_completion_text(messages: List[Dict[str, Any]]) -> str:
+    last = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    if isinstance(last, list):
+        last = " ".join(block.get("text", "") for block in last if isinstance(block, dict))
+    return f"Mock completion for: {str(last)[:200]}"
+
+def _estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(len(str(m.get("content", ""))) for m in messages) // 4 + 1
+
+@app.post("/v1/chat/completions")
+async def mock_chat_completions(body: Dict[str, Any], x_mock_latency: Optional[str] = Header(default=None)):
+    """OpenAI-compatible chat completion with simulated latency"""
+    error = await _simulate_llm(x_mock_latency)
+    if error:
+        return error
+    messages = body.get("messages", [])
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": _mock_completion_text(messages)},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": _estimate_tokens(messages),
+            "completion_tokens": mock_llm_config.output_tokens,
+            "total_tokens": _estimate_tokens(messages) + mock_llm_config.output_tokens
+        }
+    }
+
+@app.post("/v1/messages")
+async def mock_messages(body: Dict[str, Any], x_mock_latency: Optional[str] = Header(default=None)):
+    """Anthropic-compatible message with simulated latency"""
+    error = await _simulate_llm(x_mock_latency)
+    if error:
+        return error
+    messages = body.get("messages", [])
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:12]}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "mock"),
+        "content": [{"type": "text", "text": _mock_completion_text(messages)}],
+        "stop_reason": "end_turn",
+        "usage": {"input_tokens": _estimate_tokens(messages), "output_tokens": mock_llm_config.output_tokens}
+    }
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""